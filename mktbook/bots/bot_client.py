@@ -1,52 +1,115 @@
-"""Per-student Discord bot client."""
+"""Per-student Discord bot client.
+
+In the default ``full`` fleet mode each :class:`SingleBot` holds a gateway
+connection of its own. In ``shared`` mode one :class:`MarketplaceListener`
+receives the marketplace's messages for the whole fleet and every bot logs
+in over HTTP only (:meth:`SingleBot.start_sender`) to post with its own token.
+"""
 from __future__ import annotations
 
 import asyncio
 import logging
-from typing import TYPE_CHECKING
+import re
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
 
 import discord
-from openai import AsyncOpenAI
 
 from mktbook.bots.conversation import build_reply_messages
 from mktbook.config import settings
 from mktbook.db import queries
 from mktbook.db.models import Bot
+from mktbook.llm.gateway import LLMGateway, Priority
 
 if TYPE_CHECKING:
     from mktbook.web.websocket import WSManager
 
 log = logging.getLogger(__name__)
 
+# Called by every client that sees a human marketplace message (see BotFleet).
+HumanMessageHandler = Callable[[discord.Message], Awaitable[None]]
+
+# A sender-only bot has a channel stub rather than the cached channel.
+MarketplaceChannel = discord.TextChannel | discord.PartialMessageable
+
+# End of a sentence once the next word has begun, e.g. "Hi there. W".
+_SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*(?=\s)")
+
+
+def _complete_sentences(text: str) -> str:
+    """The part of ``text`` up to its last finished sentence ('' if none)."""
+    end = 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.end()
+    return text[:end].strip()
+
+
+def client_options() -> dict[str, Any]:
+    """Gateway settings trimmed to what the marketplace needs.
+
+    Guild channels and message events with their content; no member list,
+    presences or message cache. Message and author data arrive with each
+    event, so nothing is lost.
+    """
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.message_content = True
+    return {
+        "intents": intents,
+        "max_messages": None,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+        "chunk_guilds_at_startup": False,
+    }
+
+
+def _find_marketplace(client: discord.Client) -> discord.TextChannel | None:
+    guild = client.get_guild(settings.discord_guild_id)
+    if guild is None:
+        return None
+    return discord.utils.get(guild.text_channels, name=settings.marketplace_channel_name)
+
 
 class SingleBot(discord.Client):
     """A Discord client for one student's bot."""
 
-    def __init__(self, bot_row: Bot, openai_client: AsyncOpenAI, ws: WSManager | None = None) -> None:
-        intents = discord.Intents.default()
-        intents.message_content = True
-        intents.guilds = True
-        super().__init__(intents=intents)
+    def __init__(
+        self,
+        bot_row: Bot,
+        llm: LLMGateway,
+        ws: WSManager | None = None,
+        on_human_message: HumanMessageHandler | None = None,
+    ) -> None:
+        super().__init__(**client_options())
 
         self.bot_row = bot_row
-        self.openai = openai_client
-        self.ws = ws
-        self._guild: discord.Guild | None = None
-        self._channel: discord.TextChannel | None = None
+        self.llm = llm
+        self.dashboard = ws  # discord.Client keeps its gateway socket in ``ws``
+        self._channel: MarketplaceChannel | None = None
         self._ready_event = asyncio.Event()
+        self._on_human_message = on_human_message
 
     @property
-    def marketplace_channel(self) -> discord.TextChannel | None:
+    def marketplace_channel(self) -> MarketplaceChannel | None:
         return self._channel
 
     async def on_ready(self) -> None:
         log.info("Bot %s (%s) is online", self.bot_row.bot_name, self.user)
-        self._guild = self.get_guild(settings.discord_guild_id)
-        if self._guild:
-            for ch in self._guild.text_channels:
-                if ch.name == settings.marketplace_channel_name:
-                    self._channel = ch
-                    break
+        self._channel = _find_marketplace(self)
+        self._ready_event.set()
+
+    async def start_sender(self, token: str, channel_id: int | None) -> None:
+        """Log in over HTTP only, without a gateway connection, to post in the marketplace.
+
+        ``channel_id`` comes from the fleet's :class:`MarketplaceListener`;
+        with None the bot stays online but cannot post.
+        """
+        await self.login(token)
+        if channel_id is not None:
+            self._channel = self.get_partial_messageable(
+                channel_id, guild_id=settings.discord_guild_id, type=discord.ChannelType.text
+            )
+        log.info("Bot %s (%s) is online (sending only)", self.bot_row.bot_name, self.user)
         self._ready_event.set()
 
     async def wait_until_marketplace_ready(self) -> None:
@@ -58,66 +121,127 @@ class SingleBot(discord.Client):
         if self._channel is None or message.channel.id != self._channel.id:
             return
 
-        # Human message in marketplace — respond
-        await self._handle_human_message(message)
+        # Every client in the fleet sees each human message; the fleet picks who answers
+        if self._on_human_message is not None:
+            await self._on_human_message(message)
 
-    async def _handle_human_message(self, message: discord.Message) -> None:
+    def is_mentioned_in(self, message: discord.Message) -> bool:
+        """Whether ``message`` @-mentions this bot or names it."""
+        if self.user is not None and any(u.id == self.user.id for u in message.mentions):
+            return True
+        return re.search(rf"\b{re.escape(self.bot_row.bot_name)}\b", message.content, re.IGNORECASE) is not None
+
+    async def reply_to_human(self, message: discord.Message) -> tuple[str, discord.Message] | None:
+        """Generate and post this bot's reply to a human message.
+
+        Returns the reply text and the sent message, or None if the LLM call
+        failed. Recording the exchange is up to the caller.
+        """
+        if self._channel is None:
+            return None
+        received = time.monotonic()
         human_name = message.author.display_name
 
-        # Get recent history for context
-        recent = await queries.get_messages(limit=10, bot_id=self.bot_row.id)
+        # Recent history for context; what the memory summary already covers is left out
+        recent, memory = await asyncio.gather(
+            queries.get_messages(limit=10, bot_id=self.bot_row.id),
+            queries.get_bot_memory(self.bot_row.id),
+        )
         recent.reverse()
+        if memory:
+            recent = [m for m in recent if (m.conversation_id or 0) > memory.last_conversation_id]
 
-        llm_messages = build_reply_messages(self.bot_row, human_name, message.content, recent)
+        llm_messages = build_reply_messages(
+            self.bot_row, human_name, message.content, recent, memory.summary if memory else ""
+        )
+        reply_id = f"{message.id}-{self.bot_row.id}"
 
+        sent: discord.Message | None = None
         try:
-            resp = await self.openai.chat.completions.create(
-                model=settings.openai_model,
-                messages=llm_messages,  # type: ignore[arg-type]
-                max_tokens=256,
-                temperature=0.8,
-            )
-            reply_text = resp.choices[0].message.content or "(no response)"
+            if settings.reply_streaming:
+                reply_text, sent, shown_at = await self._stream_reply(self._channel, llm_messages, reply_id)
+            else:
+                resp = await self.llm.chat(Priority.HUMAN, llm_messages, max_tokens=256, temperature=0.8)
+                reply_text = resp.choices[0].message.content or "(no response)"
         except Exception:
             log.exception("OpenAI error for bot %s", self.bot_row.bot_name)
-            return
+            return None
 
-        # Record the human message
-        conv = await queries.create_conversation(
-            channel_id=str(message.channel.id),
-            conv_type="bot-human",
-            initiator_bot_id=None,
-            responder_bot_id=self.bot_row.id,
-        )
-        await queries.create_message(
-            conversation_id=conv.id,
-            bot_id=None,
-            author_type="human",
-            author_name=human_name,
-            content=message.content,
-            discord_msg_id=str(message.id),
+        if sent is None:
+            sent = await self._channel.send(reply_text)
+            shown_at = time.monotonic()
+        log.info(
+            "Bot %s replied to %s: first text after %.2fs, complete after %.2fs",
+            self.bot_row.bot_name, human_name, shown_at - received, time.monotonic() - received,
         )
 
-        # Send and record the bot reply
-        if self._channel:
-            sent = await self._channel.send(reply_text)
-            await queries.create_message(
-                conversation_id=conv.id,
-                bot_id=self.bot_row.id,
-                author_type="bot",
-                author_name=self.bot_row.bot_name,
-                content=reply_text,
-                discord_msg_id=str(sent.id),
-            )
-            await queries.end_conversation(conv.id, 1)
+        if self.dashboard:
+            await self.dashboard.broadcast({
+                "type": "message",
+                "bot": self.bot_row.bot_name,
+                "content": reply_text,
+                "conversation_type": "bot-human",
+                "reply_id": reply_id,
+            })
+        return reply_text, sent
+
+    async def _stream_reply(
+        self, channel: MarketplaceChannel, llm_messages: list[dict[str, str]], reply_id: str
+    ) -> tuple[str, discord.Message, float]:
+        """Stream a reply into ``channel``; returns its text, the message and when it first showed.
+
+        Typing shows at once. The message is sent as soon as its first sentence is
+        complete, then edited as further sentences finish, at most once every
+        ``reply_edit_interval`` seconds so the bot stays inside Discord's edit
+        rate limit. Each chunk also goes to the dashboard as a ``message_delta``.
+        """
+        text = shown = ""
+        sent: discord.Message | None = None
+        shown_at = last_edit = 0.0
+        stream = self.llm.stream_chat(Priority.HUMAN, llm_messages, max_tokens=256, temperature=0.8)
+        async with channel.typing():
+            try:
+                async for delta in stream:
+                    text += delta
+                    if self.dashboard:
+                        await self.dashboard.broadcast({
+                            "type": "message_delta", "bot": self.bot_row.bot_name,
+                            "reply_id": reply_id, "delta": delta,
+                        })
+                    ready = _complete_sentences(text)
+                    if not ready or ready == shown:
+                        continue
+                    if sent is None:
+                        sent = await channel.send(ready)
+                        shown, shown_at = ready, time.monotonic()
+                        last_edit = shown_at
+                    elif time.monotonic() - last_edit >= settings.reply_edit_interval:
+                        if await self._edit_reply(sent, ready):
+                            shown = ready
+                        last_edit = time.monotonic()
+            except Exception:
+                if sent is None:
+                    raise
+                log.exception("Reply stream for bot %s broke off; keeping the partial reply", self.bot_row.bot_name)
+            finally:
+                await stream.aclose()
 
-            if self.ws:
-                await self.ws.broadcast({
-                    "type": "message",
-                    "bot": self.bot_row.bot_name,
-                    "content": reply_text,
-                    "conversation_type": "bot-human",
-                })
+        text = text.strip() or "(no response)"
+        if sent is None:
+            sent = await channel.send(text)
+            shown_at = time.monotonic()
+        elif text != shown:
+            await self._edit_reply(sent, text)
+        return text, sent, shown_at
+
+    async def _edit_reply(self, sent: discord.Message, content: str) -> bool:
+        # discord.py waits out 429s itself; anything else leaves the older text up.
+        try:
+            await sent.edit(content=content)
+        except discord.HTTPException as exc:
+            log.warning("Could not update reply %s for bot %s: %s", sent.id, self.bot_row.bot_name, exc)
+            return False
+        return True
 
     async def send_to_marketplace(self, content: str) -> discord.Message | None:
         """Send a message to the marketplace channel. Used by the scheduler."""
@@ -128,13 +252,44 @@ class SingleBot(discord.Client):
     async def generate_response(self, llm_messages: list[dict[str, str]]) -> str:
         """Generate an LLM response given prebuilt messages."""
         try:
-            resp = await self.openai.chat.completions.create(
-                model=settings.openai_model,
-                messages=llm_messages,  # type: ignore[arg-type]
-                max_tokens=256,
-                temperature=0.8,
-            )
+            resp = await self.llm.chat(Priority.CONVERSATION, llm_messages, max_tokens=256, temperature=0.8)
             return resp.choices[0].message.content or "(no response)"
         except Exception:
             log.exception("OpenAI error for bot %s", self.bot_row.bot_name)
             return "(error generating response)"
+
+
+class MarketplaceListener(discord.Client):
+    """The one gateway connection of a ``shared`` fleet.
+
+    It finds the marketplace channel and passes every human message posted
+    there to the fleet; the bots themselves only send.
+    """
+
+    def __init__(self, on_human_message: HumanMessageHandler) -> None:
+        super().__init__(**client_options())
+        self.channel_id: int | None = None
+        self._ready_event = asyncio.Event()
+        self._on_human_message = on_human_message
+
+    async def on_ready(self) -> None:
+        channel = _find_marketplace(self)
+        self.channel_id = channel.id if channel else None
+        if channel is None:
+            log.warning("Listener %s cannot see #%s", self.user, settings.marketplace_channel_name)
+        log.info("Marketplace listener %s is online", self.user)
+        self._ready_event.set()
+
+    def give_up(self) -> None:
+        """Release waiting senders after the listener failed to connect."""
+        self._ready_event.set()
+
+    async def wait_for_channel(self) -> int | None:
+        """The marketplace channel id once the listener is ready (None if it is missing)."""
+        await self._ready_event.wait()
+        return self.channel_id
+
+    async def on_message(self, message: discord.Message) -> None:
+        if message.author.bot or self.channel_id is None or message.channel.id != self.channel_id:
+            return
+        await self._on_human_message(message)
@@ -1,7 +1,33 @@
-"""Helpers for building LLM prompts from bot config and conversation history."""
+"""Helpers for building LLM prompts from bot config and conversation history.
+
+Every prompt opens with the bot's system prompt, compiled once per bot
+configuration and cached, so the start of each request is byte-identical
+from call to call and the provider's prompt cache can reuse it. History
+follows oldest first; when the whole prompt would exceed
+``prompt_token_budget`` the oldest history is left out.
+"""
 from __future__ import annotations
 
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from mktbook.config import settings
 from mktbook.db.models import Bot, Message
+from mktbook.llm.gateway import message_tokens
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class _Prefix:
+    config: tuple[str, str, str, str]
+    message: dict[str, str]
+    tokens: int
+
+
+_prefixes: dict[int, _Prefix] = {}
+_stats = {"prompts": 0, "prefix_builds": 0, "tokens": 0, "tokens_saved": 0, "messages_dropped": 0}
 
 
 def build_system_prompt(bot: Bot) -> str:
@@ -16,39 +42,96 @@ def build_system_prompt(bot: Bot) -> str:
     return "\n".join(p for p in parts if p)
 
 
+def _prefix(bot: Bot) -> _Prefix:
+    """The bot's cached system message, rebuilt when its configuration changes."""
+    config = (bot.bot_name, bot.personality, bot.objective, bot.behavior_rules)
+    cached = _prefixes.get(bot.id)
+    if cached is None or cached.config != config:
+        message = {"role": "system", "content": build_system_prompt(bot)}
+        cached = _prefixes[bot.id] = _Prefix(config, message, message_tokens(message))
+        _stats["prefix_builds"] += 1
+    return cached
+
+
+def forget_bot(bot_id: int) -> None:
+    """Drop a stopped bot's cached prefix."""
+    _prefixes.pop(bot_id, None)
+
+
+def prompt_stats() -> dict[str, Any]:
+    """Totals since startup: prompts built, tokens sent and tokens saved by trimming history."""
+    return {**_stats, "cached_prefixes": len(_prefixes), "token_budget": settings.prompt_token_budget}
+
+
+def _history_messages(bot: Bot, history: list[Message]) -> list[dict[str, str]]:
+    messages = []
+    for msg in history:
+        if msg.bot_id == bot.id:
+            messages.append({"role": "assistant", "content": msg.content})
+        else:
+            messages.append({"role": "user", "content": f"{msg.author_name}: {msg.content}"})
+    return messages
+
+
+def _assemble(
+    bot: Bot,
+    history: list[dict[str, str]],
+    head: list[dict[str, str]] | None = None,
+    tail: list[dict[str, str]] | None = None,
+) -> list[dict[str, str]]:
+    """Prefix, ``head``, as much recent history as the budget allows, then ``tail``."""
+    prefix = _prefix(bot)
+    head = head or []
+    tail = tail or []
+    fixed = prefix.tokens + sum(message_tokens(m) for m in head + tail)
+
+    kept = len(history)
+    used = sum(message_tokens(m) for m in history)
+    saved = 0
+    if settings.prompt_token_budget > 0:
+        # Drop from the oldest end; the newest history matters most.
+        while kept and fixed + used > settings.prompt_token_budget:
+            dropped = message_tokens(history[len(history) - kept])
+            used -= dropped
+            saved += dropped
+            kept -= 1
+
+    _stats["prompts"] += 1
+    _stats["tokens"] += fixed + used
+    _stats["tokens_saved"] += saved
+    _stats["messages_dropped"] += len(history) - kept
+    if saved:
+        log.debug("Prompt for %s: %d tokens, %d saved by leaving out %d older messages",
+                  bot.bot_name, fixed + used, saved, len(history) - kept)
+    return [prefix.message, *head, *history[len(history) - kept:], *tail]
+
+
+def _memory_messages(memory: str) -> list[dict[str, str]]:
+    if not memory:
+        return []
+    return [{"role": "system", "content": f"What you remember from earlier conversations:\n{memory}"}]
+
+
 def build_conversation_messages(
     bot: Bot,
     history: list[Message],
     opener: bool = False,
     partner_name: str | None = None,
+    memory: str = "",
 ) -> list[dict[str, str]]:
     """Build the OpenAI messages list for a conversation turn."""
-    messages: list[dict[str, str]] = [{"role": "system", "content": build_system_prompt(bot)}]
-
+    head = _memory_messages(memory)
     if opener and partner_name:
-        messages.append({
+        head.append({
             "role": "system",
             "content": f"Start a conversation with {partner_name}. Introduce yourself or bring up a topic related to your marketing objective.",
         })
+    return _assemble(bot, _history_messages(bot, history), head=head)
 
-    for msg in history:
-        if msg.bot_id == bot.id:
-            messages.append({"role": "assistant", "content": msg.content})
-        else:
-            messages.append({"role": "user", "content": f"{msg.author_name}: {msg.content}"})
 
-    return messages
-
-
-def build_reply_messages(bot: Bot, human_name: str, human_message: str, recent_history: list[Message]) -> list[dict[str, str]]:
+def build_reply_messages(
+    bot: Bot, human_name: str, human_message: str, recent_history: list[Message], memory: str = ""
+) -> list[dict[str, str]]:
     """Build messages for replying to a human."""
-    messages: list[dict[str, str]] = [{"role": "system", "content": build_system_prompt(bot)}]
-
-    for msg in recent_history:
-        if msg.bot_id == bot.id:
-            messages.append({"role": "assistant", "content": msg.content})
-        else:
-            messages.append({"role": "user", "content": f"{msg.author_name}: {msg.content}"})
-
-    messages.append({"role": "user", "content": f"{human_name}: {human_message}"})
-    return messages
+    tail = [{"role": "user", "content": f"{human_name}: {human_message}"}]
+    return _assemble(bot, _history_messages(bot, recent_history), head=_memory_messages(memory), tail=tail)
@@ -1,30 +1,75 @@
-"""Manages the fleet of Discord bot clients."""
+"""Manages the fleet of Discord bot clients.
+
+With ``fleet_mode`` 'full' every bot keeps its own gateway connection and
+receives every message in the marketplace channel. With 'shared' a single
+:class:`MarketplaceListener` connection receives them and the bots only post
+over HTTP, so a larger fleet costs little more than its tokens. Either way
+the fleet handles each human message once, whichever client reports it
+first. It picks the bots that answer under ``reply_policy``,
+``reply_max_bots`` and ``reply_cooldown``, and records the exchange as a
+single conversation that all of their replies share.
+"""
 from __future__ import annotations
 
 import asyncio
 import logging
-from typing import TYPE_CHECKING
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
 
-from openai import AsyncOpenAI
+import discord
 
-from mktbook.bots.bot_client import SingleBot
+from mktbook.bots.bot_client import MarketplaceListener, SingleBot
+from mktbook.bots.conversation import forget_bot
+from mktbook.bots.memory import conversation_ended
+from mktbook.config import settings
 from mktbook.db import queries
 from mktbook.db.models import Bot
+from mktbook.llm.gateway import LLMGateway
 
 if TYPE_CHECKING:
     from mktbook.web.websocket import WSManager
 
 log = logging.getLogger(__name__)
 
+# Human message ids remembered for de-duplication.
+SEEN_MESSAGES = 1024
+
+# How long start-up reporting waits for the last bot to come online.
+STARTUP_TIMEOUT = 120.0
+
+
+def _rss_bytes() -> int | None:
+    """This process's current resident memory, or None where /proc is missing.
+
+    getrusage() only has the peak (in KiB on Linux, bytes on macOS), which
+    would make the per-bot figure meaningless, so it is not used.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
 
 class BotFleet:
     """Manages all active Discord bot instances."""
 
-    def __init__(self, openai_client: AsyncOpenAI, ws: WSManager | None = None) -> None:
-        self.openai = openai_client
+    def __init__(self, llm: LLMGateway, ws: WSManager | None = None) -> None:
+        self.llm = llm
         self.ws = ws
         self._bots: dict[int, SingleBot] = {}  # bot_id -> SingleBot
         self._tasks: dict[int, asyncio.Task[None]] = {}
+        self._seen_messages: OrderedDict[int, None] = OrderedDict()
+        self._last_reply: dict[int, float] = {}  # bot_id -> monotonic time it was picked
+        self._listener: MarketplaceListener | None = None
+        self._listener_task: asyncio.Task[None] | None = None
+        self._listener_bot_id: int | None = None  # whose token the listener borrowed, if not its own
+        self._startup_task: asyncio.Task[None] | None = None
+        self._baseline_rss = _rss_bytes()
+        self._startup: dict[str, Any] | None = None
 
     @property
     def active_bots(self) -> dict[int, SingleBot]:
@@ -38,39 +83,99 @@ class BotFleet:
             log.warning("Bot %s already running", bot_row.bot_name)
             return
 
-        client = SingleBot(bot_row, self.openai, self.ws)
+        client = SingleBot(bot_row, self.llm, self.ws, on_human_message=self._on_human_message)
         self._bots[bot_row.id] = client
+        listener = self._ensure_listener(bot_row) if settings.fleet_mode == "shared" else None
 
         async def _run() -> None:
             try:
+                if listener is not None:
+                    # Nothing to run after the login; the listener brings the messages in
+                    await client.start_sender(bot_row.discord_token, await listener.wait_for_channel())
+                    return
                 await client.start(bot_row.discord_token)
             except Exception:
                 log.exception("Bot %s crashed", bot_row.bot_name)
-            finally:
-                self._bots.pop(bot_row.id, None)
-                self._tasks.pop(bot_row.id, None)
+            self._bots.pop(bot_row.id, None)
+            self._tasks.pop(bot_row.id, None)
 
         self._tasks[bot_row.id] = asyncio.create_task(_run())
         log.info("Launched bot %s (id=%d)", bot_row.bot_name, bot_row.id)
 
+    def _ensure_listener(self, bot_row: Bot) -> MarketplaceListener:
+        """Start the shared gateway connection unless it is running.
+
+        It logs in with ``discord_listener_token``, or else borrows the token
+        of ``bot_row``; stopping that bot moves the listener to another one.
+        """
+        if self._listener is not None:
+            return self._listener
+        token = settings.discord_listener_token or bot_row.discord_token
+        self._listener_bot_id = None if settings.discord_listener_token else bot_row.id
+        listener = self._listener = MarketplaceListener(self._on_human_message)
+
+        async def _listen() -> None:
+            try:
+                await listener.start(token)
+            except Exception:
+                log.exception("Marketplace listener crashed")
+                await listener.close()  # a failed login leaves the HTTP session open
+            finally:
+                listener.give_up()
+                if self._listener is listener:
+                    # Gone for good; the next start_bot brings up a new one
+                    self._listener = None
+                    self._listener_bot_id = None
+
+        self._listener_task = asyncio.create_task(_listen())
+        log.info("Launched the marketplace listener")
+        return listener
+
     async def stop_bot(self, bot_id: int) -> None:
         client = self._bots.pop(bot_id, None)
         task = self._tasks.pop(bot_id, None)
+        forget_bot(bot_id)
         if client:
             await client.close()
             log.info("Stopped bot id=%d", bot_id)
         if task and not task.done():
             task.cancel()
+        if bot_id == self._listener_bot_id:
+            await self._move_listener()
+
+    async def _close_listener(self) -> None:
+        listener, task = self._listener, self._listener_task
+        self._listener = self._listener_task = self._listener_bot_id = None
+        if listener is not None:
+            await listener.close()
+        if task is not None and not task.done():
+            task.cancel()
+
+    async def _move_listener(self) -> None:
+        """Log the listener in again with a running bot's token once the lender is gone."""
+        await self._close_listener()
+        if self._bots:
+            successor = next(iter(self._bots.values())).bot_row
+            self._ensure_listener(successor)
+            log.info("Marketplace listener now logs in as %s", successor.bot_name)
+        else:
+            log.info("Marketplace listener stopped: no bot left to lend it a token")
 
     async def start_all(self) -> None:
+        started = time.monotonic()
+        self._baseline_rss = _rss_bytes()
         bots = await queries.get_active_bots()
         for bot in bots:
             await self.start_bot(bot)
+        self._startup_task = asyncio.create_task(self._report_startup(started))
 
     async def stop_all(self) -> None:
+        await self._close_listener()
         bot_ids = list(self._bots.keys())
         for bid in bot_ids:
             await self.stop_bot(bid)
+        if self._startup_task is not None:
+            self._startup_task.cancel()
 
     async def reload_bot(self, bot_id: int) -> None:
         """Stop and restart a bot with fresh config from DB."""
@@ -78,3 +183,129 @@ class BotFleet:
         bot_row = await queries.get_bot(bot_id)
         if bot_row and bot_row.is_active:
             await self.start_bot(bot_row)
+
+    # ── Start-up and memory ──
+
+    async def _report_startup(self, started: float) -> None:
+        """Log how long the fleet took to come online and what it costs in memory."""
+        clients = list(self._bots.values())
+        waits = {bot_id: asyncio.ensure_future(c.wait_until_marketplace_ready()) for bot_id, c in self._bots.items()}
+        # A bot whose login fails never gets ready; its task ending is enough
+        pending = [asyncio.wait([w, self._tasks[bot_id]], return_when=asyncio.FIRST_COMPLETED)
+                   for bot_id, w in waits.items() if bot_id in self._tasks]
+        try:
+            await asyncio.wait_for(asyncio.gather(*pending), STARTUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            log.warning("Not every bot was online %.0fs after start-up", STARTUP_TIMEOUT)
+        finally:
+            for w in waits.values():
+                w.cancel()
+        ready = sum(c.marketplace_channel is not None for c in clients)
+        self._startup = {"seconds": round(time.monotonic() - started, 2), "bots": len(clients), "ready": ready}
+        stats = self.stats()
+        memory = ("memory use unavailable on this platform" if stats["fleet_mb"] is None
+                  else f"{stats['fleet_mb']:.1f} MB for the fleet, {stats['mb_per_bot']:.2f} MB per bot")
+        log.info(
+            "Fleet online in %.1fs (%s mode): %d/%d bots in the marketplace, %s",
+            self._startup["seconds"], settings.fleet_mode, ready, len(clients), memory,
+        )
+
+    def stats(self) -> dict[str, Any]:
+        """Mode, gateway connections, start-up time and resident memory per bot.
+
+        Memory is the process's growth since the fleet started, so it also
+        counts anything else the app allocated in the meantime. The memory
+        figures are None where the current resident size cannot be read.
+        """
+        rss = _rss_bytes()
+        fleet_mb = None if rss is None or self._baseline_rss is None else max(rss - self._baseline_rss, 0) / 2**20
+        if settings.fleet_mode == "shared":
+            connections = int(self._listener is not None and self._listener.is_ready())
+        else:
+            connections = sum(c.is_ready() for c in self._bots.values())
+        return {
+            "mode": settings.fleet_mode,
+            "bots": len(self._bots),
+            "gateway_connections": connections,
+            "rss_mb": None if rss is None else round(rss / 2**20, 1),
+            "fleet_mb": None if fleet_mb is None else round(fleet_mb, 1),
+            "mb_per_bot": None if fleet_mb is None else round(fleet_mb / len(self._bots), 2) if self._bots else 0.0,
+            "startup": self._startup,
+        }
+
+    # ── Human messages ──
+
+    async def _on_human_message(self, message: discord.Message) -> None:
+        if message.id in self._seen_messages:
+            return  # another client got here first
+        self._seen_messages[message.id] = None
+        if len(self._seen_messages) > SEEN_MESSAGES:
+            self._seen_messages.popitem(last=False)
+
+        responders = self.select_responders(message)
+        if not responders:
+            log.info("No bot answers message %s from %s", message.id, message.author.display_name)
+            return
+        await self._answer(message, responders)
+
+    def select_responders(self, message: discord.Message) -> list[SingleBot]:
+        """The bots that should answer a human message, mentioned ones first.
+
+        Mentioned bots always answer. With ``reply_policy`` 'any', bots that
+        are not cooling down fill the remaining places at random, up to
+        ``reply_max_bots``.
+        """
+        ready = [b for b in self._bots.values() if b.marketplace_channel is not None]
+        limit = settings.reply_max_bots if settings.reply_max_bots > 0 else len(ready)
+        chosen = [b for b in ready if b.is_mentioned_in(message)][:limit]
+        if settings.reply_policy == "any" and len(chosen) < limit:
+            cooled = time.monotonic() - settings.reply_cooldown
+            idle = [b for b in ready if b not in chosen and self._last_reply.get(b.bot_row.id, cooled) <= cooled]
+            chosen += random.sample(idle, min(limit - len(chosen), len(idle)))
+        return chosen
+
+    async def _answer(self, message: discord.Message, responders: list[SingleBot]) -> None:
+        """Post the responders' replies concurrently and record them in one conversation."""
+        now = time.monotonic()
+        for bot in responders:
+            self._last_reply[bot.bot_row.id] = now
+
+        results = await asyncio.gather(*(b.reply_to_human(message) for b in responders), return_exceptions=True)
+        replies: list[tuple[SingleBot, str, discord.Message]] = []
+        for bot, result in zip(responders, results):
+            if isinstance(result, BaseException):
+                log.error("Bot %s could not reply to message %s: %r", bot.bot_row.bot_name, message.id, result)
+            elif result is not None:
+                replies.append((bot, *result))
+        if not replies:
+            return
+
+        # Record the human message and every reply; writes go through the group-commit buffer
+        conv = await queries.queue_conversation(
+            channel_id=str(message.channel.id),
+            conv_type="bot-human",
+            initiator_bot_id=None,
+            responder_bot_id=replies[0][0].bot_row.id,
+        )
+        pending = [queries.queue_message(
+            conversation_id=conv.id,
+            bot_id=None,
+            author_type="human",
+            author_name=message.author.display_name,
+            content=message.content,
+            discord_msg_id=str(message.id),
+        )]
+        for bot, text, sent in replies:
+            pending.append(queries.queue_message(
+                conversation_id=conv.id,
+                bot_id=bot.bot_row.id,
+                author_type="bot",
+                author_name=bot.bot_row.bot_name,
+                content=text,
+                discord_msg_id=str(sent.id),
+            ))
+        pending.append(queries.queue_end_conversation(conv.id, len(replies)))
+
+        # Resolves once the whole exchange is durably committed
+        await asyncio.gather(*pending)
+        conversation_ended(*(bot.bot_row.id for bot, _, _ in replies))
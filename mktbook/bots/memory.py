@@ -0,0 +1,118 @@
+"""Long-term memory: a rolling summary per bot.
+
+When a conversation ends, :func:`conversation_ended` flags its bots.
+:func:`run_memory_updater` (started by main.py) waits ``memory_update_delay``
+seconds so that several conversations go in together. It then folds each
+flagged bot's newly finished conversations into its summary, one LLM call
+per bot, at the lowest gateway priority. Prompts carry the summary instead of
+older raw history (see bots/conversation.py). Their size stays flat however
+long the term runs.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING
+
+from mktbook.config import settings
+from mktbook.db import queries
+from mktbook.db.models import Bot, BotMemory, Conversation, Message
+from mktbook.llm.gateway import Priority
+
+if TYPE_CHECKING:
+    from mktbook.llm.gateway import LLMGateway
+
+log = logging.getLogger(__name__)
+
+# Conversations folded in per LLM call; a bot with more waiting takes several.
+MEMORY_CONVERSATIONS_PER_UPDATE = 20
+
+MEMORY_SYSTEM_PROMPT = """You keep the long-term memory of a bot in a classroom Discord marketplace.
+You get the bot's current memory and transcripts of conversations it has finished since.
+Rewrite the memory so that it also covers the new conversations. Keep what the bot would want
+to remember: who it talked to, what they cared about, what it offered or promised, and what worked.
+Drop small talk. Write short notes in the third person, under 200 words. Reply with the memory only."""
+
+_pending: set[int] = set()
+_wakeup = asyncio.Event()
+
+
+def conversation_ended(*bot_ids: int | None) -> None:
+    """Flag bots whose conversation just ended for a memory update."""
+    _pending.update(b for b in bot_ids if b is not None)
+    _wakeup.set()
+
+
+def _transcript(conv: Conversation, messages: list[Message]) -> str:
+    lines = [f"Conversation #{conv.id} ({conv.type}, {conv.started_at}):"]
+    lines.extend(f"{m.author_name}: {m.content}" for m in messages)
+    return "\n".join(lines)
+
+
+async def update_memory(llm: LLMGateway, bot: Bot) -> BotMemory | None:
+    """Fold the bot's finished conversations since its last update into its summary."""
+    memory = await queries.get_bot_memory(bot.id)
+    while True:
+        after = memory.last_conversation_id if memory else 0
+        convs = await queries.get_conversations_since(bot.id, after, limit=MEMORY_CONVERSATIONS_PER_UPDATE)
+        stale_ms = int(time.time() * 1000) - int(settings.memory_open_conversation_timeout * 1000)
+        done: list[Conversation] = []
+        covered = 0  # conversations summarised or skipped, in order
+        for conv in convs:
+            if conv.ended_ms is None:
+                if conv.started_ms > stale_ms:
+                    break  # still running; it goes in next time, in order
+                # Open long past any real conversation, e.g. the app stopped
+                # mid-conversation: skip it rather than wait for it forever.
+                log.info("Memory of %s skips conversation #%d, open since %s",
+                         bot.bot_name, conv.id, conv.started_at)
+            else:
+                done.append(conv)
+            covered += 1
+        if not covered:
+            return memory
+
+        by_conv = await queries.get_messages_for_conversations([c.id for c in done])
+        transcripts = "\n\n".join(_transcript(c, by_conv[c.id]) for c in done if by_conv[c.id])
+        summary = memory.summary if memory else ""
+        if transcripts:
+            resp = await llm.chat(
+                Priority.MEMORY,
+                [
+                    {"role": "system", "content": MEMORY_SYSTEM_PROMPT},
+                    {"role": "user", "content": (
+                        f"Bot: {bot.bot_name}\n\nCurrent memory:\n{summary or '(nothing yet)'}\n\n"
+                        f"New conversations:\n\n{transcripts}"
+                    )},
+                ],
+                max_tokens=settings.memory_summary_max_tokens,
+                temperature=0.3,
+            )
+            summary = (resp.choices[0].message.content or "").strip() or summary
+        last = convs[covered - 1]
+        memory = await queries.save_bot_memory(bot.id, summary, last.id)
+        log.info("Memory of %s now covers conversation #%d (%d added)", bot.bot_name, last.id, len(done))
+        if covered < len(convs) or len(convs) < MEMORY_CONVERSATIONS_PER_UPDATE:
+            return memory
+
+
+async def run_memory_updater(llm: LLMGateway) -> None:
+    """Keep every bot's memory current until cancelled."""
+    # Catch up on whatever finished while the app was down.
+    _pending.update(b.id for b in await queries.get_active_bots())
+    while True:
+        if not _pending:
+            _wakeup.clear()
+            await _wakeup.wait()
+        await asyncio.sleep(settings.memory_update_delay)
+        bot_ids = sorted(_pending)
+        _pending.clear()
+        for bot_id in bot_ids:
+            bot = await queries.get_bot(bot_id)
+            if bot is None:
+                continue
+            try:
+                await update_memory(llm, bot)
+            except Exception:
+                log.exception("Memory update failed for bot %s", bot.bot_name)
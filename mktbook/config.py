@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import pathlib
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -16,15 +17,59 @@ class Settings(BaseSettings):
     openai_api_key: str
     discord_guild_id: int
     marketplace_channel_name: str = "the-marketplace"
+    storage_backend: Literal["sqlite", "memory"] = "sqlite"
     database_path: str = "mktbook.db"
+    db_read_pool_size: int = 4
+    db_cache_size_kib: int = 16384
+    db_mmap_size_mb: int = 256
+    db_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    db_maintenance_interval: float = 60.0
+    wal_checkpoint_mb: float = 16.0
+    wal_truncate_mb: float = 64.0
+    db_vacuum_pages: int = 1024
+    db_optimize_interval: float = 3600.0
+    group_commit_max_delay_ms: int = 10
+    group_commit_max_batch: int = 64
+    search_index_interval: float = 5.0
+    query_cache_ttl: float = 300.0
+    query_cache_max_entries: int = 1024
+    archive_dir: str = "archive"
+    archive_after_days: int = 90
+    archive_period: Literal["month", "quarter", "year"] = "quarter"
+    archive_interval: float = 86400.0
+    snapshot_dir: str = "snapshots"
+    snapshot_keep: int = 7
+    snapshot_step_pages: int = 1024
+    snapshot_step_sleep_ms: int = 10
     host: str = "0.0.0.0"
     port: int = 8000
 
     conversation_min_interval: int = 30
     conversation_max_interval: int = 120
     conversation_turns: int = 4
+    fleet_mode: Literal["full", "shared"] = "full"
+    discord_listener_token: str = ""  # shared mode's gateway login; empty = the first bot's token
+    reply_policy: Literal["any", "mentioned"] = "any"
+    reply_max_bots: int = 3  # bots answering one human message; 0 = no limit
+    reply_cooldown: float = 60.0  # seconds before a bot may answer an unaddressed message again
+    reply_streaming: bool = True
+    reply_edit_interval: float = 1.0  # seconds between edits of a streaming reply
+    prompt_token_budget: int = 1500  # per bot prompt, before the reply; 0 = no limit
+    memory_enabled: bool = True
+    memory_update_delay: float = 60.0  # seconds to gather finished conversations before summarising
+    memory_summary_max_tokens: int = 300
+    memory_open_conversation_timeout: float = 3600.0  # seconds before a still-open conversation is skipped
 
     openai_model: str = "gpt-4o-mini"
+    llm_requests_per_minute: int = 500
+    llm_tokens_per_minute: int = 200000
+    llm_max_concurrency: int = 8
+    llm_timeout: float = 60.0
+    grading_concurrency: int = 4
+    grading_schedule: str = ""  # cron expression, e.g. "0 3 * * *"; empty = manual runs only
+    grading_batch_client: Literal["openai", "local", "manual"] = "openai"
+    grading_batch_dir: str = "batches"
+    grading_batch_poll_interval: float = 60.0
 
 
 settings = Settings()  # type: ignore[call-arg]
@@ -0,0 +1,222 @@
+"""Hot/cold tiering for conversation history.
+
+Ended conversations that started more than ``archive_after_days`` ago move,
+together with their messages, out of the live database into one SQLite file
+per period under ``archive_dir`` (``mktbook-2025-q3.db`` and so on). Queries
+that need the full history attach those files read-only through
+``connection.archive_reader`` and ``UNION ALL`` across the tiers.
+
+``bot_stats`` and ``conversation_pairs`` are not touched, so they keep
+counting the whole history. Archived messages drop out of full-text search.
+"""
+from __future__ import annotations
+
+import logging
+import pathlib
+import time
+
+import aiosqlite
+
+from mktbook.config import settings
+from mktbook.db.connection import archive_paths, reader, writer
+
+log = logging.getLogger(__name__)
+
+# Bumped (via PRAGMA user_version) whenever the archive layout changes;
+# older files are brought up to date by _UPGRADES.
+ARCHIVE_FORMAT = 2
+
+# Same columns, in the same order, as the live tables so rows copy with
+# ``SELECT *``; no foreign keys because bots stay in the live database.
+_ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {schema}.conversations (
+    id              INTEGER PRIMARY KEY,
+    channel_id      TEXT,
+    type            TEXT    NOT NULL DEFAULT 'bot-bot',
+    initiator_bot_id INTEGER,
+    responder_bot_id INTEGER,
+    turn_count      INTEGER NOT NULL DEFAULT 0,
+    started_ms      INTEGER NOT NULL,
+    ended_ms        INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS {schema}.messages (
+    id              INTEGER PRIMARY KEY,
+    conversation_id INTEGER,
+    bot_id          INTEGER,
+    author_type     TEXT    NOT NULL DEFAULT 'bot',
+    author_name     TEXT    NOT NULL,
+    content         TEXT    NOT NULL,
+    discord_msg_id  TEXT,
+    created_ms      INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS {schema}.idx_conversations_started_at ON conversations (started_ms);
+CREATE INDEX IF NOT EXISTS {schema}.idx_conversations_initiator ON conversations (initiator_bot_id, started_ms);
+CREATE INDEX IF NOT EXISTS {schema}.idx_conversations_responder ON conversations (responder_bot_id, started_ms);
+CREATE INDEX IF NOT EXISTS {schema}.idx_messages_created_at ON messages (created_ms);
+CREATE INDEX IF NOT EXISTS {schema}.idx_messages_bot ON messages (bot_id, created_ms);
+CREATE INDEX IF NOT EXISTS {schema}.idx_messages_conversation ON messages (conversation_id, created_ms);
+
+PRAGMA {schema}.user_version = {version};
+"""
+
+# Steps that bring an archive from version N-1 to N. _ARCHIVE_SCHEMA runs
+# afterwards to recreate indexes and record the new version.
+_UPGRADES = {
+    # Format 1 stored TEXT datetime('now') timestamps; format 2 stores epoch
+    # milliseconds like the live database (migration 005).
+    2: """
+DROP INDEX IF EXISTS {schema}.idx_conversations_started_at;
+DROP INDEX IF EXISTS {schema}.idx_conversations_initiator;
+DROP INDEX IF EXISTS {schema}.idx_conversations_responder;
+DROP INDEX IF EXISTS {schema}.idx_messages_created_at;
+DROP INDEX IF EXISTS {schema}.idx_messages_bot;
+DROP INDEX IF EXISTS {schema}.idx_messages_conversation;
+ALTER TABLE {schema}.conversations RENAME TO conversations_v1;
+ALTER TABLE {schema}.messages RENAME TO messages_v1;
+
+CREATE TABLE {schema}.conversations (
+    id              INTEGER PRIMARY KEY,
+    channel_id      TEXT,
+    type            TEXT    NOT NULL DEFAULT 'bot-bot',
+    initiator_bot_id INTEGER,
+    responder_bot_id INTEGER,
+    turn_count      INTEGER NOT NULL DEFAULT 0,
+    started_ms      INTEGER NOT NULL,
+    ended_ms        INTEGER
+);
+INSERT INTO {schema}.conversations
+SELECT id, channel_id, type, initiator_bot_id, responder_bot_id, turn_count,
+       CAST(strftime('%s', started_at) AS INTEGER) * 1000,
+       CAST(strftime('%s', ended_at) AS INTEGER) * 1000
+FROM {schema}.conversations_v1;
+
+CREATE TABLE {schema}.messages (
+    id              INTEGER PRIMARY KEY,
+    conversation_id INTEGER,
+    bot_id          INTEGER,
+    author_type     TEXT    NOT NULL DEFAULT 'bot',
+    author_name     TEXT    NOT NULL,
+    content         TEXT    NOT NULL,
+    discord_msg_id  TEXT,
+    created_ms      INTEGER NOT NULL
+);
+INSERT INTO {schema}.messages
+SELECT id, conversation_id, bot_id, author_type, author_name, content, discord_msg_id,
+       CAST(strftime('%s', created_at) AS INTEGER) * 1000
+FROM {schema}.messages_v1;
+
+DROP TABLE {schema}.conversations_v1;
+DROP TABLE {schema}.messages_v1;
+""",
+}
+
+_PERIOD_SQL = {
+    "month": "strftime('%Y-%m', started_ms / 1000, 'unixepoch')",
+    "quarter": "strftime('%Y', started_ms / 1000, 'unixepoch') || '-q' "
+               "|| ((CAST(strftime('%m', started_ms / 1000, 'unixepoch') AS INTEGER) + 2) / 3)",
+    "year": "strftime('%Y', started_ms / 1000, 'unixepoch')",
+}
+
+_BATCH_SIZE = 500
+
+
+def archive_path(period: str) -> pathlib.Path:
+    return pathlib.Path(settings.archive_dir) / f"mktbook-{period}.db"
+
+
+async def _prepare(db: aiosqlite.Connection) -> None:
+    """Create or upgrade the file attached to ``db`` as ``archive``."""
+    version = (await (await db.execute("PRAGMA archive.user_version")).fetchone())[0]
+    if version == ARCHIVE_FORMAT:
+        return
+    # A brand-new file (version 0) gets the current layout directly.
+    steps = "".join(_UPGRADES[v] for v in range(version + 1, ARCHIVE_FORMAT + 1)) if version else ""
+    script = (steps + _ARCHIVE_SCHEMA).format(schema="archive", version=ARCHIVE_FORMAT)
+    try:
+        await db.executescript(f"BEGIN;\n{script}\nCOMMIT;")
+    except Exception:
+        await db.rollback()
+        raise
+    if version:
+        log.info("Upgraded archive from format %d to %d", version, ARCHIVE_FORMAT)
+
+
+async def upgrade_archives() -> None:
+    """Bring every archive file up to ``ARCHIVE_FORMAT``; run once at startup."""
+    for path in archive_paths():
+        async with writer() as db:
+            await db.execute("ATTACH DATABASE ? AS archive", (str(path),))
+            try:
+                await _prepare(db)
+            finally:
+                await db.execute("DETACH DATABASE archive")
+
+
+async def archive_conversations(older_than_days: int | None = None, batch_size: int = _BATCH_SIZE) -> int:
+    """Move ended conversations older than the cutoff into their period's archive file.
+
+    Works in batches of ``batch_size`` conversations so the writer is never
+    held for long. Returns the number of conversations archived.
+    """
+    days = settings.archive_after_days if older_than_days is None else older_than_days
+    cutoff_ms = int(time.time() * 1000) - days * 86_400_000
+    async with reader() as db:
+        rows = await (await db.execute(
+            f"""SELECT {_PERIOD_SQL[settings.archive_period]} AS period, id FROM conversations
+                WHERE ended_ms IS NOT NULL AND started_ms < ?
+                ORDER BY id""",
+            (cutoff_ms,),
+        )).fetchall()
+
+    by_period: dict[str, list[int]] = {}
+    for period, conv_id in rows:
+        by_period.setdefault(period, []).append(conv_id)
+
+    if by_period:
+        pathlib.Path(settings.archive_dir).mkdir(parents=True, exist_ok=True)
+    for period, conv_ids in sorted(by_period.items()):
+        path = archive_path(period)
+        for i in range(0, len(conv_ids), batch_size):
+            await _move(path, conv_ids[i:i + batch_size])
+        log.info("Archived %d conversations to %s", len(conv_ids), path)
+    return len(rows)
+
+
+async def _move(path: pathlib.Path, conv_ids: list[int]) -> None:
+    marks = ", ".join("?" * len(conv_ids))
+    async with writer() as db:
+        # With WAL a transaction spanning two files is atomic per file only,
+        # so copy and commit first: a crash then leaves a duplicate (which
+        # INSERT OR REPLACE absorbs on the next run), never a gap.
+        await db.execute("ATTACH DATABASE ? AS archive", (str(path),))
+        try:
+            await _prepare(db)
+            await db.execute(
+                f"INSERT OR REPLACE INTO archive.conversations SELECT * FROM main.conversations WHERE id IN ({marks})",
+                conv_ids,
+            )
+            await db.execute(
+                f"""INSERT OR REPLACE INTO archive.messages
+                    SELECT * FROM main.messages WHERE conversation_id IN ({marks})""",
+                conv_ids,
+            )
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+        finally:
+            await db.execute("DETACH DATABASE archive")
+
+        # The FTS index is external-content: rows it has already indexed
+        # must be removed with their original text before the rows go.
+        await db.execute(
+            f"""INSERT INTO messages_fts (messages_fts, rowid, content)
+                SELECT 'delete', id, content FROM messages
+                WHERE conversation_id IN ({marks})
+                  AND id <= (SELECT last_message_id FROM search_index_state WHERE id = 1)""",
+            conv_ids,
+        )
+        await db.execute(f"DELETE FROM messages WHERE conversation_id IN ({marks})", conv_ids)
+        await db.execute(f"DELETE FROM conversations WHERE id IN ({marks})", conv_ids)
@@ -0,0 +1,132 @@
+"""Microbenchmark for row mapping in sqlite_storage.py.
+
+Compares the old mapping (``sqlite3.Row`` plus a copy by column name into a
+regular dataclass) with the current one (a plain tuple from an explicit
+column list, unpacked positionally into a slotted dataclass). Reports
+rows/sec for fetch-and-map and the bytes allocated per model object.
+
+Usage::
+
+    python -m mktbook.db.benchmark [--rows 20000] [--repeat 5]
+"""
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import time
+import tracemalloc
+from dataclasses import dataclass, fields
+from typing import Any, Callable
+
+from mktbook.db.models import Message
+
+_MESSAGE_COLUMNS = ", ".join(f.name for f in fields(Message))
+
+
+@dataclass
+class _DictMessage:
+    """``Message`` as it was before slots: one ``__dict__`` per instance."""
+    id: int
+    conversation_id: int | None
+    bot_id: int | None
+    author_type: str
+    author_name: str
+    content: str
+    discord_msg_id: str | None
+    created_ms: int
+
+
+def _named(row: Any) -> _DictMessage:
+    return _DictMessage(
+        id=row["id"],
+        conversation_id=row["conversation_id"],
+        bot_id=row["bot_id"],
+        author_type=row["author_type"],
+        author_name=row["author_name"],
+        content=row["content"],
+        discord_msg_id=row["discord_msg_id"],
+        created_ms=row["created_ms"],
+    )
+
+
+def _seed(rows: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        """CREATE TABLE messages (
+               id              INTEGER PRIMARY KEY,
+               conversation_id INTEGER,
+               bot_id          INTEGER,
+               author_type     TEXT NOT NULL,
+               author_name     TEXT NOT NULL,
+               content         TEXT NOT NULL,
+               discord_msg_id  TEXT,
+               created_ms      INTEGER NOT NULL
+           )"""
+    )
+    conn.executemany(
+        "INSERT INTO messages VALUES (?, ?, ?, 'bot', ?, ?, NULL, 1735732800000)",
+        ((i, i // 8, i % 40, f"bot{i % 40}", f"message body {i} " * 4) for i in range(rows)),
+    )
+    return conn
+
+
+def _rows_per_sec(conn: sqlite3.Connection, sql: str, build: Callable[[Any], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        objs = [build(r) for r in conn.execute(sql).fetchall()]
+        best = min(best, time.perf_counter() - start)
+    return len(objs) / best
+
+
+def _bytes_per_object(rows: list[Any], build: Callable[[Any], Any]) -> float:
+    # Field values already live in the fetched rows, so this counts only
+    # what constructing the model adds.
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [build(r) for r in rows]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return (used - (len(objs) * 8)) / len(objs)  # less the list's pointer slots
+
+
+def run(rows: int, repeat: int) -> list[tuple[str, float, float]]:
+    conn = _seed(rows)
+    results = []
+
+    conn.row_factory = sqlite3.Row
+    sql = "SELECT * FROM messages ORDER BY id"
+    fetched = conn.execute(sql).fetchall()
+    results.append((
+        "Row + named copy, dict dataclass",
+        _rows_per_sec(conn, sql, _named, repeat),
+        _bytes_per_object(fetched, _named),
+    ))
+
+    conn.row_factory = None
+    sql = f"SELECT {_MESSAGE_COLUMNS} FROM messages ORDER BY id"
+    fetched = conn.execute(sql).fetchall()
+    results.append((
+        "tuple + positional, slotted dataclass",
+        _rows_per_sec(conn, sql, lambda r: Message(*r), repeat),
+        _bytes_per_object(fetched, lambda r: Message(*r)),
+    ))
+
+    conn.close()
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m mktbook.db.benchmark")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{args.rows} messages, best of {args.repeat}")
+    print(f"{'mapping':<40}{'rows/sec':>12}{'bytes/object':>15}")
+    for name, rate, size in run(args.rows, args.repeat):
+        print(f"{name:<40}{rate:>12,.0f}{size:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,382 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import pathlib
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
 import aiosqlite
 
 from mktbook.config import settings
 
-_db: aiosqlite.Connection | None = None
+log = logging.getLogger(__name__)
+
+_db: Database | None = None
+_init_lock = asyncio.Lock()
 _SCHEMA = (pathlib.Path(__file__).parent / "schema.sql").read_text()
+_MIGRATIONS_DIR = pathlib.Path(__file__).parent / "migrations"
+# SQLite's default SQLITE_MAX_ATTACHED; ``main`` does not count against it.
+_MAX_ATTACHED = 10
+
+
+def load_migrations() -> list[tuple[int, str, str]]:
+    """Return ``(version, name, sql)`` for every file in ``migrations/``, in order.
+
+    Files are named ``NNN_description.sql``; the numeric prefix is the
+    ``PRAGMA user_version`` the database reaches once the file is applied.
+    """
+    migrations: list[tuple[int, str, str]] = []
+    for path in sorted(_MIGRATIONS_DIR.glob("*.sql")):
+        version = int(path.name.split("_", 1)[0])
+        migrations.append((version, path.stem, path.read_text()))
+    versions = [v for v, _, _ in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Duplicate migration versions in {_MIGRATIONS_DIR}")
+    return migrations
+
+
+async def apply_migrations(db: aiosqlite.Connection) -> int:
+    """Apply every pending migration, each in its own transaction.
+
+    Returns the resulting schema version.
+    """
+    current = (await (await db.execute("PRAGMA user_version")).fetchone())[0]
+    for version, name, sql in load_migrations():
+        if version <= current:
+            continue
+        try:
+            await db.executescript(f"BEGIN;\n{sql}\nPRAGMA user_version = {version};\nCOMMIT;")
+        except Exception:
+            await db.rollback()
+            log.exception("Migration %s failed; database left at version %d", name, current)
+            raise
+        log.info("Applied migration %s", name)
+        current = version
+    return current
+
+
+def _connection_pragmas() -> str:
+    """Per-connection tuning from settings; SQLite does not persist these."""
+    return f"""
+        PRAGMA cache_size = -{settings.db_cache_size_kib};
+        PRAGMA mmap_size = {settings.db_mmap_size_mb * 1024 * 1024};
+        PRAGMA synchronous = {settings.db_synchronous};
+    """
+
+
+async def _enable_incremental_vacuum(conn: aiosqlite.Connection) -> None:
+    """Switch the database to incremental auto-vacuum so maintenance can shrink it.
+
+    A new database only needs the pragma; an existing one has to be rebuilt
+    once with VACUUM, which can take a while on a large file.
+    """
+    if (await (await conn.execute("PRAGMA auto_vacuum")).fetchone())[0] == 2:
+        return
+    await conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    if (await (await conn.execute("SELECT COUNT(*) FROM sqlite_master")).fetchone())[0]:
+        log.info("Rebuilding the database for incremental vacuum (one-time VACUUM)")
+        start = time.perf_counter()
+        await conn.execute("VACUUM")
+        log.info("VACUUM took %.1fs", time.perf_counter() - start)
+
+
+class Database:
+    """A pool of read-only connections plus one writer connection.
+
+    WAL mode lets readers run concurrently with each other and with the
+    writer, so reads borrow any idle reader. Writes are funnelled through a
+    queue served by a single task that hands the writer connection to one
+    transaction at a time; the transaction commits when its block exits.
+    """
+
+    def __init__(self, path: str, read_pool_size: int) -> None:
+        self.path = path
+        # An in-memory database cannot be shared, so everything goes to the writer.
+        self.read_pool_size = 0 if path == ":memory:" else max(read_pool_size, 0)
+        self._writer: aiosqlite.Connection | None = None
+        self._readers: list[aiosqlite.Connection] = []
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._write_queue: asyncio.Queue[asyncio.Future[asyncio.Event]] = asyncio.Queue()
+        self._writer_task: asyncio.Task[None] | None = None
+        self._pending: list[tuple[str, tuple[Any, ...], asyncio.Future[list[Any]]]] = []
+        self._has_pending = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._flush_task: asyncio.Task[None] | None = None
+        self._inflight: asyncio.Future[None] | None = None
+        self._waiting_reads = 0
+        self._counters: dict[str, float] = {
+            "reads": 0,
+            "writes": 0,
+            "read_wait_seconds": 0.0,
+            "write_wait_seconds": 0.0,
+            "max_read_wait_seconds": 0.0,
+            "max_write_wait_seconds": 0.0,
+            "group_commits": 0,
+            "group_commit_statements": 0,
+        }
+
+    async def open(self) -> None:
+        # Opened as a URI so that archives can be attached with ``?mode=ro``.
+        uri = "file::memory:" if self.path == ":memory:" else pathlib.Path(self.path).resolve().as_uri()
+        self._writer = await aiosqlite.connect(uri, uri=True)
+        # Before WAL mode, which writes the header of a new file and would fix
+        # its auto_vacuum setting.
+        if settings.db_vacuum_pages > 0:
+            await _enable_incremental_vacuum(self._writer)
+        await self._writer.execute("PRAGMA journal_mode=WAL")
+        await self._writer.executescript(_connection_pragmas())
+        await self._writer.executescript(_SCHEMA)
+        await self._writer.commit()
+        # Foreign keys are enforced only after migrating, so that migrations
+        # can rebuild tables that other tables reference.
+        await apply_migrations(self._writer)
+        await self._writer.execute("PRAGMA foreign_keys=ON")
+
+        for _ in range(self.read_pool_size):
+            conn = await aiosqlite.connect(uri + "?mode=ro", uri=True)
+            await conn.executescript(_connection_pragmas())
+            self._readers.append(conn)
+            self._idle.put_nowait(conn)
+
+        self._writer_task = asyncio.create_task(self._serve_writes())
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+            if self._inflight is not None:
+                await self._inflight
+            if self._pending:
+                batch, self._pending = self._pending, []
+                await self._flush(batch)
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            self._writer_task = None
+        for conn in self._readers:
+            await conn.close()
+        self._readers.clear()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    async def _serve_writes(self) -> None:
+        while True:
+            grant = await self._write_queue.get()
+            if grant.done():  # requester gave up while queued
+                continue
+            released = asyncio.Event()
+            grant.set_result(released)
+            await released.wait()
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection for the duration of the block."""
+        if not self._readers:
+            async with self.write() as conn:
+                yield conn
+            return
+
+        start = time.perf_counter()
+        self._waiting_reads += 1
+        try:
+            conn = await self._idle.get()
+        finally:
+            self._waiting_reads -= 1
+        self._record_wait("read", time.perf_counter() - start)
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
 
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Run the block as one transaction on the writer connection.
 
-async def get_db() -> aiosqlite.Connection:
+        Commits on normal exit and rolls back if the block raises.
+        """
+        assert self._writer is not None, "Database is not open"
+        start = time.perf_counter()
+        grant: asyncio.Future[asyncio.Event] = asyncio.get_running_loop().create_future()
+        self._write_queue.put_nowait(grant)
+        try:
+            released = await grant
+        except asyncio.CancelledError:
+            if grant.done() and not grant.cancelled():
+                grant.result().set()
+            raise
+        self._record_wait("write", time.perf_counter() - start)
+        try:
+            yield self._writer
+            if self._writer.in_transaction:
+                await self._writer.commit()
+        except BaseException:
+            await self._writer.rollback()
+            raise
+        finally:
+            released.set()
+
+    def submit(self, sql: str, params: tuple[Any, ...] = ()) -> asyncio.Future[list[Any]]:
+        """Queue one write statement for the next group commit.
+
+        Statements arriving within ``group_commit_max_delay_ms`` of each other
+        share a single transaction. The returned future resolves to the rows
+        the statement produced (use ``RETURNING`` to get the inserted row)
+        once that transaction has committed, or fails with the statement's
+        own error; a failing statement does not affect the rest of the batch.
+        """
+        fut: asyncio.Future[list[Any]] = asyncio.get_running_loop().create_future()
+        self._pending.append((sql, params, fut))
+        self._has_pending.set()
+        if len(self._pending) >= settings.group_commit_max_batch:
+            self._batch_full.set()
+        return fut
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._has_pending.wait()
+            try:
+                await asyncio.wait_for(
+                    self._batch_full.wait(), timeout=settings.group_commit_max_delay_ms / 1000
+                )
+            except asyncio.TimeoutError:
+                pass
+            batch, self._pending = self._pending, []
+            self._has_pending.clear()
+            self._batch_full.clear()
+            # Shielded so that shutdown never abandons a half-written batch.
+            self._inflight = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._inflight)
+            self._inflight = None
+
+    async def _flush(self, batch: list[tuple[str, tuple[Any, ...], asyncio.Future[list[Any]]]]) -> None:
+        outcomes: list[tuple[asyncio.Future[list[Any]], list[Any] | None, BaseException | None]] = []
+        try:
+            async with self.write() as conn:
+                await conn.execute("BEGIN")
+                for sql, params, fut in batch:
+                    await conn.execute("SAVEPOINT group_commit")
+                    try:
+                        rows = await (await conn.execute(sql, params)).fetchall()
+                    except Exception as exc:
+                        await conn.execute("ROLLBACK TO group_commit")
+                        outcomes.append((fut, None, exc))
+                    else:
+                        outcomes.append((fut, list(rows), None))
+                    await conn.execute("RELEASE group_commit")
+        except Exception as exc:
+            log.exception("Group commit of %d statements failed", len(batch))
+            outcomes = [(fut, None, exc) for _, _, fut in batch]
+        else:
+            self._counters["group_commits"] += 1
+            self._counters["group_commit_statements"] += len(batch)
+
+        for fut, rows, exc in outcomes:
+            if fut.done():
+                continue
+            if exc is not None:
+                fut.set_exception(exc)
+            else:
+                fut.set_result(rows)  # type: ignore[arg-type]
+
+    def _record_wait(self, kind: str, waited: float) -> None:
+        self._counters[f"{kind}s"] += 1
+        self._counters[f"{kind}_wait_seconds"] += waited
+        key = f"max_{kind}_wait_seconds"
+        self._counters[key] = max(self._counters[key], waited)
+
+    def stats(self) -> dict[str, Any]:
+        """Pool sizing, current queue depth and cumulative wait times."""
+        return {
+            "read_pool_size": self.read_pool_size,
+            "readers_idle": self._idle.qsize(),
+            "read_queue_depth": self._waiting_reads,
+            "write_queue_depth": self._write_queue.qsize(),
+            "group_commit_pending": len(self._pending),
+            **self._counters,
+        }
+
+
+async def get_db() -> Database:
     global _db
     if _db is None:
-        _db = await aiosqlite.connect(settings.database_path)
-        _db.row_factory = aiosqlite.Row
-        await _db.execute("PRAGMA journal_mode=WAL")
-        await _db.execute("PRAGMA foreign_keys=ON")
-        await _db.executescript(_SCHEMA)
-        await _db.commit()
+        async with _init_lock:
+            if _db is None:
+                db = Database(settings.database_path, settings.db_read_pool_size)
+                await db.open()
+                _db = db
     return _db
 
 
+@asynccontextmanager
+async def reader() -> AsyncIterator[aiosqlite.Connection]:
+    """Borrow a pooled read-only connection."""
+    db = await get_db()
+    async with db.read() as conn:
+        yield conn
+
+
+@asynccontextmanager
+async def writer() -> AsyncIterator[aiosqlite.Connection]:
+    """Queue for the writer connection and run the block as one transaction."""
+    db = await get_db()
+    async with db.write() as conn:
+        yield conn
+
+
+def archive_paths() -> list[pathlib.Path]:
+    """Archive files under ``archive_dir``, newest period first."""
+    return sorted(pathlib.Path(settings.archive_dir).glob("mktbook-*.db"), reverse=True)
+
+
+@asynccontextmanager
+async def attached_archives(conn: aiosqlite.Connection) -> AsyncIterator[list[str]]:
+    """Attach every archive file to ``conn`` read-only for the duration of the block.
+
+    Yields the schema names to query, ``"main"`` first. SQLite cannot detach
+    inside a transaction, so whatever the block leaves open is committed (or
+    rolled back if the block raises) before the archives are detached.
+    """
+    paths = archive_paths()
+    if len(paths) > _MAX_ATTACHED:
+        log.warning(
+            "%d archive files but only %d can be attached; the oldest are skipped "
+            "(use a longer archive_period)", len(paths), _MAX_ATTACHED,
+        )
+        paths = paths[:_MAX_ATTACHED]
+    schemas = ["main"]
+    try:
+        for i, path in enumerate(paths):
+            await conn.execute("ATTACH DATABASE ? AS ?", (path.resolve().as_uri() + "?mode=ro", f"archive_{i}"))
+            schemas.append(f"archive_{i}")
+        yield schemas
+        if conn.in_transaction:
+            await conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            await conn.rollback()
+        raise
+    finally:
+        for schema in schemas[1:]:
+            await conn.execute("DETACH DATABASE ?", (schema,))
+
+
+@asynccontextmanager
+async def archive_reader() -> AsyncIterator[tuple[aiosqlite.Connection, list[str]]]:
+    """Borrow a pooled reader with the archives attached; yields it and the schema names."""
+    async with reader() as conn:
+        async with attached_archives(conn) as schemas:
+            yield conn, schemas
+
+
+async def submit_write(sql: str, params: tuple[Any, ...] = ()) -> list[Any]:
+    """Run one write statement through the group-commit buffer and wait for it."""
+    db = await get_db()
+    return await db.submit(sql, params)
+
+
 async def close_db() -> None:
     global _db
     if _db is not None:
@@ -0,0 +1,120 @@
+"""Background upkeep for the live database.
+
+One pass of :func:`run_maintenance` (main.py runs one every
+``db_maintenance_interval`` seconds):
+
+- checkpoints the WAL once it outgrows ``wal_checkpoint_mb`` (PASSIVE, which
+  never waits) or ``wal_truncate_mb`` (TRUNCATE, which waits for readers to
+  move on and then shrinks the file back to zero);
+- frees up to ``db_vacuum_pages`` pages from the freelist with an
+  incremental vacuum, e.g. after archiving has deleted rows;
+- runs ``PRAGMA optimize`` every ``db_optimize_interval`` seconds so the
+  query planner's statistics follow the data.
+
+Every action runs on the writer connection, queued behind application
+writes, and is logged and counted with its duration in
+:func:`maintenance_stats`.
+"""
+from __future__ import annotations
+
+import logging
+import pathlib
+import time
+from typing import Any, Literal
+
+from mktbook.config import settings
+from mktbook.db.connection import reader, writer
+
+log = logging.getLogger(__name__)
+
+_MB = 1024 * 1024
+
+_metrics: dict[str, dict[str, float]] = {}
+_gauges: dict[str, int] = {"wal_bytes": 0, "freelist_pages": 0}
+_next_optimize = 0.0
+
+
+def _record(action: str, elapsed: float) -> None:
+    m = _metrics.setdefault(action, {"runs": 0, "total_seconds": 0.0, "last_seconds": 0.0, "last_run_ms": 0})
+    m["runs"] += 1
+    m["total_seconds"] += elapsed
+    m["last_seconds"] = elapsed
+    m["last_run_ms"] = int(time.time() * 1000)
+
+
+def maintenance_stats() -> dict[str, Any]:
+    """Last observed WAL size and freelist length, plus run counts and durations per action."""
+    return {**_gauges, **{action: dict(m) for action, m in _metrics.items()}}
+
+
+def wal_bytes() -> int:
+    """Current size of the ``-wal`` file; 0 if there is none (e.g. ``:memory:``)."""
+    try:
+        return pathlib.Path(settings.database_path + "-wal").stat().st_size
+    except OSError:
+        return 0
+
+
+async def checkpoint(mode: Literal["PASSIVE", "TRUNCATE"]) -> tuple[int, int, int]:
+    """Checkpoint the WAL. Returns SQLite's ``(busy, log frames, checkpointed frames)``."""
+    start = time.perf_counter()
+    async with writer() as db:
+        busy, frames, done = await (await db.execute(f"PRAGMA wal_checkpoint({mode})")).fetchone()
+    elapsed = time.perf_counter() - start
+    _record(f"checkpoint_{mode.lower()}", elapsed)
+    log.info(
+        "WAL checkpoint (%s) took %.3fs: %d of %d frames checkpointed%s",
+        mode, elapsed, done, frames, ", blocked by readers" if busy else "",
+    )
+    return busy, frames, done
+
+
+async def incremental_vacuum(max_pages: int) -> int:
+    """Return up to ``max_pages`` free pages to the filesystem. Returns how many were freed."""
+    start = time.perf_counter()
+    async with writer() as db:
+        before = (await (await db.execute("PRAGMA freelist_count")).fetchone())[0]
+        # executescript steps the pragma to completion; execute() would
+        # stop after the first page.
+        await db.executescript(f"PRAGMA incremental_vacuum({int(max_pages)})")
+        after = (await (await db.execute("PRAGMA freelist_count")).fetchone())[0]
+    elapsed = time.perf_counter() - start
+    _record("incremental_vacuum", elapsed)
+    _gauges["freelist_pages"] = after
+    log.info("Incremental vacuum took %.3fs: freed %d pages, %d still free", elapsed, before - after, after)
+    return before - after
+
+
+async def optimize() -> None:
+    """Refresh planner statistics where SQLite thinks they are stale."""
+    start = time.perf_counter()
+    async with writer() as db:
+        # Bounded sampling keeps ANALYZE quick on large tables.
+        await db.execute("PRAGMA analysis_limit = 400")
+        await db.execute("PRAGMA optimize")
+    elapsed = time.perf_counter() - start
+    _record("optimize", elapsed)
+    log.info("PRAGMA optimize took %.3fs", elapsed)
+
+
+async def run_maintenance() -> None:
+    """One maintenance pass; each action runs only if it is due."""
+    global _next_optimize
+
+    size = _gauges["wal_bytes"] = wal_bytes()
+    if size >= settings.wal_truncate_mb * _MB:
+        await checkpoint("TRUNCATE")
+        _gauges["wal_bytes"] = wal_bytes()
+    elif size >= settings.wal_checkpoint_mb * _MB:
+        await checkpoint("PASSIVE")
+
+    if settings.db_vacuum_pages > 0:
+        async with reader() as db:
+            free = (await (await db.execute("PRAGMA freelist_count")).fetchone())[0]
+        _gauges["freelist_pages"] = free
+        if free:
+            await incremental_vacuum(settings.db_vacuum_pages)
+
+    if settings.db_optimize_interval > 0 and time.monotonic() >= _next_optimize:
+        await optimize()
+        _next_optimize = time.monotonic() + settings.db_optimize_interval
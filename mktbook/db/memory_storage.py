@@ -0,0 +1,609 @@
+"""In-memory storage backend.
+
+Rows live in dicts keyed by id. Sorted ``(ms, id)`` key lists stand in for
+the SQLite indexes, so pages and streams come back in the same order as
+from the database. Every write completes before the call returns, which
+makes the ``queue_*`` futures already resolved and search indexing
+immediate. Nothing survives a restart and there are no archive tiers.
+
+Stored models are replaced, never mutated, on update; as with the SQLite
+result cache, callers must treat returned models as read-only.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import dataclasses
+import itertools
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, TypeVar
+
+from mktbook.db.models import Bot, BotMemory, Conversation, Grade, GradingRun, GradingRunBot, Message, SearchHit
+from mktbook.db.storage import PageKey
+
+_T = TypeVar("_T")
+
+_BOT_FIELDS = {"student_name", "bot_name", "discord_token", "personality", "objective", "behavior_rules", "is_active"}
+_STAT_KEYS = ("messages", "conversations", "human_interactions")
+_WORD = re.compile(r"\w+")
+# Terms in a search query; a trailing * matches by prefix
+_TERM = re.compile(r"(\w+)(\*?)")
+_SNIPPET_WORDS = 16
+
+
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def _resolved(value: _T) -> asyncio.Future[_T]:
+    future: asyncio.Future[_T] = asyncio.get_running_loop().create_future()
+    future.set_result(value)
+    return future
+
+
+def _unique_violation(column: str) -> sqlite3.IntegrityError:
+    # Same error the SQLite backend raises, so callers handle both alike
+    return sqlite3.IntegrityError(f"UNIQUE constraint failed: {column}")
+
+
+def _parse_utc_ms(value: str) -> int | None:
+    """Epoch ms of a ``2025-03-01`` / ``2025-03-01 14:00:00`` UTC string, None if unparsable."""
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class _KeyIndex:
+    """Row ids ordered by ``(ms, id)``, for keyset pages and streams."""
+
+    __slots__ = ("_keys",)
+
+    def __init__(self) -> None:
+        self._keys: list[PageKey] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: PageKey) -> None:
+        if not self._keys or key > self._keys[-1]:
+            self._keys.append(key)
+        else:
+            bisect.insort(self._keys, key)
+
+    def newest(self, limit: int, before: PageKey | None = None) -> list[int]:
+        end = len(self._keys) if before is None else bisect.bisect_left(self._keys, tuple(before))
+        return [row_id for _, row_id in reversed(self._keys[max(end - limit, 0):end])]
+
+    def oldest(self, after: PageKey | None = None) -> list[int]:
+        start = 0 if after is None else bisect.bisect_right(self._keys, tuple(after))
+        return [row_id for _, row_id in self._keys[start:]]
+
+
+class MemoryStorage:
+    """Indexed dicts implementing :class:`mktbook.db.storage.Storage`."""
+
+    def __init__(self) -> None:
+        self._ids: dict[str, Iterator[int]] = {
+            table: itertools.count(1) for table in ("bots", "conversations", "messages", "grades")
+        }
+        self._bots: dict[int, Bot] = {}
+        self._bot_ids_by_name: dict[str, int] = {}
+
+        self._conversations: dict[int, Conversation] = {}
+        self._conversations_by_time = _KeyIndex()
+        self._conversations_by_bot: defaultdict[int, _KeyIndex] = defaultdict(_KeyIndex)
+        self._conversation_bots: dict[int, set[int]] = {}  # conversation id -> bots taking part
+
+        self._messages: dict[int, Message] = {}
+        self._messages_by_time = _KeyIndex()
+        self._messages_by_bot: defaultdict[int, _KeyIndex] = defaultdict(_KeyIndex)
+        self._messages_by_conversation: defaultdict[int, _KeyIndex] = defaultdict(_KeyIndex)
+        self._message_ids_by_word: defaultdict[str, set[int]] = defaultdict(set)
+
+        self._pair_counts: dict[tuple[int, int], int] = {}
+
+        self._grades: dict[int, Grade] = {}
+        self._grades_by_time = _KeyIndex()
+        self._grades_by_bot: defaultdict[int, _KeyIndex] = defaultdict(_KeyIndex)
+        self._grade_ids_by_run: defaultdict[str, list[int]] = defaultdict(list)
+        self._latest_grade_ids: dict[int, int] = {}  # bot id -> grade id
+        self._grade_ids_by_hash: dict[str, int] = {}  # input hash -> newest grade id
+        self._runs: dict[str, GradingRun] = {}
+        self._run_bots: dict[str, dict[int, GradingRunBot]] = {}
+        self._memories: dict[int, BotMemory] = {}
+
+        self._stats: dict[int, dict[str, int]] = {}
+        self._human_conversation_ids: set[int] = set()
+
+    def _next_id(self, table: str) -> int:
+        return next(self._ids[table])
+
+    def cache_stats(self) -> dict[str, int]:
+        """Always empty: reads are dict lookups and need no cache."""
+        return {}
+
+    # ── Bots ──────────────────────────────────────────────────────────
+
+    async def create_bot(
+        self,
+        student_name: str,
+        bot_name: str,
+        discord_token: str,
+        personality: str = "",
+        objective: str = "",
+        behavior_rules: str = "",
+    ) -> Bot:
+        if bot_name in self._bot_ids_by_name:
+            raise _unique_violation("bots.bot_name")
+        bot = Bot(
+            self._next_id("bots"), student_name, bot_name, discord_token,
+            personality, objective, behavior_rules, True, _now_ms(),
+        )
+        self._bots[bot.id] = bot
+        self._bot_ids_by_name[bot_name] = bot.id
+        return bot
+
+    async def get_bot(self, bot_id: int) -> Bot | None:
+        return self._bots.get(bot_id)
+
+    async def get_bot_by_name(self, bot_name: str) -> Bot | None:
+        bot_id = self._bot_ids_by_name.get(bot_name)
+        return self._bots[bot_id] if bot_id is not None else None
+
+    async def get_bots_by_ids(self, bot_ids: Iterable[int]) -> dict[int, Bot]:
+        return {bid: self._bots[bid] for bid in bot_ids if bid in self._bots}
+
+    async def get_all_bots(self) -> list[Bot]:
+        return sorted(self._bots.values(), key=lambda b: (b.created_ms, b.id), reverse=True)
+
+    async def get_active_bots(self) -> list[Bot]:
+        return sorted((b for b in self._bots.values() if b.is_active), key=lambda b: b.bot_name)
+
+    async def update_bot(self, bot_id: int, **fields: Any) -> Bot | None:
+        bot = self._bots.get(bot_id)
+        filtered = {k: v for k, v in fields.items() if k in _BOT_FIELDS}
+        if bot is None or not filtered:
+            return bot
+        if "is_active" in filtered:
+            filtered["is_active"] = bool(filtered["is_active"])
+        new_name = filtered.get("bot_name", bot.bot_name)
+        if new_name != bot.bot_name:
+            if new_name in self._bot_ids_by_name:
+                raise _unique_violation("bots.bot_name")
+            del self._bot_ids_by_name[bot.bot_name]
+            self._bot_ids_by_name[new_name] = bot_id
+        updated = dataclasses.replace(bot, **filtered)
+        self._bots[bot_id] = updated
+        return updated
+
+    async def delete_bot(self, bot_id: int) -> None:
+        bot = self._bots.pop(bot_id, None)
+        if bot is not None:
+            del self._bot_ids_by_name[bot.bot_name]
+        self._stats.pop(bot_id, None)
+        self._memories.pop(bot_id, None)
+
+    # ── Conversations ─────────────────────────────────────────────────
+
+    def _insert_conversation(
+        self,
+        channel_id: str | None,
+        conv_type: str,
+        initiator_bot_id: int | None,
+        responder_bot_id: int | None,
+    ) -> Conversation:
+        conv = Conversation(
+            self._next_id("conversations"), channel_id, conv_type,
+            initiator_bot_id, responder_bot_id, 0, _now_ms(), None,
+        )
+        key = (conv.started_ms, conv.id)
+        self._conversations[conv.id] = conv
+        self._conversations_by_time.add(key)
+        self._conversation_bots[conv.id] = set()
+        for bot_id in (initiator_bot_id, responder_bot_id):
+            if bot_id is not None:
+                self._join(conv, bot_id)
+        return conv
+
+    def _join(self, conv: Conversation, bot_id: int) -> None:
+        """Count ``bot_id`` as taking part in ``conv`` (no-op if it already does)."""
+        bots = self._conversation_bots[conv.id]
+        if bot_id in bots:
+            return
+        bots.add(bot_id)
+        self._conversations_by_bot[bot_id].add((conv.started_ms, conv.id))
+        self._bump(bot_id, "conversations")
+        if conv.id in self._human_conversation_ids:
+            self._bump(bot_id, "human_interactions")
+
+    def _end_conversation(self, conv_id: int, turn_count: int) -> None:
+        conv = self._conversations.get(conv_id)
+        if conv is not None:
+            self._conversations[conv_id] = dataclasses.replace(conv, turn_count=turn_count, ended_ms=_now_ms())
+
+    async def create_conversation(
+        self,
+        channel_id: str | None,
+        conv_type: str,
+        initiator_bot_id: int | None,
+        responder_bot_id: int | None,
+    ) -> Conversation:
+        return self._insert_conversation(channel_id, conv_type, initiator_bot_id, responder_bot_id)
+
+    def queue_conversation(
+        self,
+        channel_id: str | None,
+        conv_type: str,
+        initiator_bot_id: int | None,
+        responder_bot_id: int | None,
+    ) -> asyncio.Future[Conversation]:
+        return _resolved(self._insert_conversation(channel_id, conv_type, initiator_bot_id, responder_bot_id))
+
+    async def end_conversation(self, conv_id: int, turn_count: int) -> None:
+        self._end_conversation(conv_id, turn_count)
+
+    def queue_end_conversation(self, conv_id: int, turn_count: int) -> asyncio.Future[None]:
+        return _resolved(self._end_conversation(conv_id, turn_count))
+
+    async def get_conversations(self, limit: int = 50, before: PageKey | None = None) -> list[Conversation]:
+        return [self._conversations[i] for i in self._conversations_by_time.newest(limit, before)]
+
+    async def iter_conversations(
+        self, after: PageKey | None = None, include_archive: bool = False
+    ) -> AsyncIterator[Conversation]:
+        for conv_id in self._conversations_by_time.oldest(after):
+            yield self._conversations[conv_id]
+
+    async def get_bot_conversations(self, bot_id: int, limit: int = 50) -> list[Conversation]:
+        index = self._conversations_by_bot.get(bot_id)
+        return [self._conversations[i] for i in index.newest(limit)] if index else []
+
+    async def get_recent_conversations_for_bots(
+        self, bot_ids: Iterable[int], per_bot: int = 5, include_archive: bool = False
+    ) -> dict[int, list[Conversation]]:
+        return {bid: await self.get_bot_conversations(bid, per_bot) for bid in dict.fromkeys(bot_ids)}
+
+    async def get_conversations_since(self, bot_id: int, after_id: int, limit: int = 20) -> list[Conversation]:
+        index = self._conversations_by_bot.get(bot_id)
+        ids = sorted(i for i in index.oldest() if i > after_id)[:limit] if index else []
+        return [self._conversations[i] for i in ids]
+
+    # ── Messages ──────────────────────────────────────────────────────
+
+    def _insert_message(
+        self,
+        conversation_id: int | None,
+        bot_id: int | None,
+        author_type: str,
+        author_name: str,
+        content: str,
+        discord_msg_id: str | None,
+    ) -> Message:
+        msg = Message(
+            self._next_id("messages"), conversation_id, bot_id,
+            author_type, author_name, content, discord_msg_id, _now_ms(),
+        )
+        key = (msg.created_ms, msg.id)
+        self._messages[msg.id] = msg
+        self._messages_by_time.add(key)
+        if bot_id is not None:
+            self._messages_by_bot[bot_id].add(key)
+            self._bump(bot_id, "messages")
+        if conversation_id is not None:
+            self._messages_by_conversation[conversation_id].add(key)
+            conv = self._conversations.get(conversation_id)
+            if bot_id is not None and conv is not None:
+                self._join(conv, bot_id)  # a bot posting in a shared conversation takes part
+            if author_type == "human" and conversation_id not in self._human_conversation_ids:
+                self._human_conversation_ids.add(conversation_id)
+                for owner in self._participants(conversation_id):
+                    self._bump(owner, "human_interactions")
+        self._index_words(msg)
+        return msg
+
+    async def create_message(
+        self,
+        conversation_id: int | None,
+        bot_id: int | None,
+        author_type: str,
+        author_name: str,
+        content: str,
+        discord_msg_id: str | None = None,
+    ) -> Message:
+        return self._insert_message(conversation_id, bot_id, author_type, author_name, content, discord_msg_id)
+
+    def queue_message(
+        self,
+        conversation_id: int | None,
+        bot_id: int | None,
+        author_type: str,
+        author_name: str,
+        content: str,
+        discord_msg_id: str | None = None,
+    ) -> asyncio.Future[Message]:
+        return _resolved(
+            self._insert_message(conversation_id, bot_id, author_type, author_name, content, discord_msg_id)
+        )
+
+    async def get_conversation_messages(self, conv_id: int, include_archive: bool = False) -> list[Message]:
+        index = self._messages_by_conversation.get(conv_id)
+        return [self._messages[i] for i in index.oldest()] if index else []
+
+    async def get_messages_for_conversations(
+        self, conv_ids: Iterable[int], include_archive: bool = False
+    ) -> dict[int, list[Message]]:
+        return {cid: await self.get_conversation_messages(cid) for cid in dict.fromkeys(conv_ids)}
+
+    async def get_messages(
+        self, limit: int = 100, bot_id: int | None = None, before: PageKey | None = None
+    ) -> list[Message]:
+        index = self._messages_by_time if bot_id is None else self._messages_by_bot.get(bot_id)
+        return [self._messages[i] for i in index.newest(limit, before)] if index else []
+
+    async def iter_messages(
+        self, bot_id: int | None = None, after: PageKey | None = None, include_archive: bool = False
+    ) -> AsyncIterator[Message]:
+        index = self._messages_by_time if bot_id is None else self._messages_by_bot.get(bot_id)
+        for msg_id in index.oldest(after) if index else ():
+            yield self._messages[msg_id]
+
+    # ── Search ────────────────────────────────────────────────────────
+    # A word -> message ids index, updated on insert. Every query term must
+    # match (``term*`` by prefix); FTS5 operators are not supported. Rank is
+    # the negated number of matching words, so lower is better as with bm25.
+
+    def _index_words(self, msg: Message) -> None:
+        for word in _WORD.findall(msg.content.lower()):
+            self._message_ids_by_word[word].add(msg.id)
+
+    async def search_messages(
+        self,
+        query: str,
+        bot_id: int | None = None,
+        author_type: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> list[SearchHit]:
+        terms = _TERM.findall(query.lower())
+        if not terms:
+            return []
+        since_ms = _parse_utc_ms(since) if since is not None else None
+        until_ms = _parse_utc_ms(until) if until is not None else None
+        if (since is not None and since_ms is None) or (until is not None and until_ms is None):
+            return []
+
+        matches: list[Callable[[str], bool]] = []
+        candidates: set[int] | None = None
+        for term, star in terms:
+            if star:
+                ids = set().union(*(ids for w, ids in self._message_ids_by_word.items() if w.startswith(term)))
+                matches.append(lambda w, t=term: w.startswith(t))
+            else:
+                ids = self._message_ids_by_word.get(term, set())
+                matches.append(lambda w, t=term: w == t)
+            candidates = ids if candidates is None else candidates & ids
+
+        def is_match(word: str) -> bool:
+            return any(m(word) for m in matches)
+
+        hits: list[SearchHit] = []
+        for msg_id in candidates or ():
+            msg = self._messages[msg_id]
+            if bot_id is not None and msg.bot_id != bot_id:
+                continue
+            if author_type is not None and msg.author_type != author_type:
+                continue
+            if since_ms is not None and msg.created_ms < since_ms:
+                continue
+            if until_ms is not None and msg.created_ms >= until_ms:
+                continue
+            rank = -sum(1 for w in _WORD.findall(msg.content.lower()) if is_match(w))
+            hits.append(SearchHit(message=msg, snippet=_snippet(msg.content, is_match), rank=float(rank)))
+        hits.sort(key=lambda h: (h.rank, -h.message.id))
+        return hits[offset:offset + limit]
+
+    async def index_pending_messages(self, batch_size: int = 1000) -> int:
+        return 0
+
+    async def rebuild_search_index(self) -> int:
+        self._message_ids_by_word.clear()
+        for msg in self._messages.values():
+            self._index_words(msg)
+        return len(self._messages)
+
+    # ── Conversation Pairs ────────────────────────────────────────────
+
+    async def get_pair_counts(self) -> dict[tuple[int, int], int]:
+        return dict(self._pair_counts)
+
+    def _increment_pair(self, bot_a_id: int, bot_b_id: int) -> None:
+        key = (min(bot_a_id, bot_b_id), max(bot_a_id, bot_b_id))
+        self._pair_counts[key] = self._pair_counts.get(key, 0) + 1
+
+    async def increment_pair(self, bot_a_id: int, bot_b_id: int) -> None:
+        self._increment_pair(bot_a_id, bot_b_id)
+
+    def queue_increment_pair(self, bot_a_id: int, bot_b_id: int) -> asyncio.Future[None]:
+        return _resolved(self._increment_pair(bot_a_id, bot_b_id))
+
+    # ── Grades ────────────────────────────────────────────────────────
+
+    async def create_grade(
+        self,
+        bot_id: int,
+        grading_run_id: str,
+        objective_score: float,
+        quality_score: float,
+        human_score: float,
+        volume_score: float,
+        overall_score: float,
+        llm_reasoning: str,
+        total_messages: int,
+        total_conversations: int,
+        human_interactions: int,
+        input_hash: str | None = None,
+        reused_grade_id: int | None = None,
+    ) -> Grade:
+        grade = Grade(
+            self._next_id("grades"), bot_id, grading_run_id, objective_score, quality_score, human_score,
+            volume_score, overall_score, llm_reasoning, total_messages, total_conversations,
+            human_interactions, _now_ms(), input_hash, reused_grade_id,
+        )
+        key = (grade.created_ms, grade.id)
+        self._grades[grade.id] = grade
+        self._grades_by_time.add(key)
+        self._grades_by_bot[bot_id].add(key)
+        self._grade_ids_by_run[grading_run_id].append(grade.id)
+        if input_hash is not None:
+            self._grade_ids_by_hash[input_hash] = grade.id
+        entry = self._run_bots.get(grading_run_id, {}).get(bot_id)
+        if entry is not None:
+            entry.status, entry.grade_id, entry.error = "done", grade.id, None
+        return grade
+
+    async def get_bot_grades(self, bot_id: int) -> list[Grade]:
+        index = self._grades_by_bot.get(bot_id)
+        return [self._grades[i] for i in index.newest(len(index))] if index else []
+
+    async def get_grades(
+        self, limit: int = 100, bot_id: int | None = None, before: PageKey | None = None
+    ) -> list[Grade]:
+        index = self._grades_by_time if bot_id is None else self._grades_by_bot.get(bot_id)
+        return [self._grades[i] for i in index.newest(limit, before)] if index else []
+
+    async def get_latest_grades(self) -> list[Grade]:
+        grades = [self._grades[i] for i in self._latest_grade_ids.values()]
+        return sorted(grades, key=lambda g: g.overall_score, reverse=True)
+
+    async def get_grades_by_input_hash(self, input_hashes: Iterable[str]) -> dict[str, Grade]:
+        return {h: self._grades[self._grade_ids_by_hash[h]] for h in input_hashes if h in self._grade_ids_by_hash}
+
+    async def get_grades_by_run(self, grading_run_id: str) -> list[Grade]:
+        grades = [self._grades[i] for i in self._grade_ids_by_run.get(grading_run_id, ())]
+        return sorted(grades, key=lambda g: g.overall_score, reverse=True)
+
+    # ── Grading Runs ──────────────────────────────────────────────────
+
+    async def create_grading_run(
+        self,
+        run_id: str,
+        bot_ids: Iterable[int],
+        full_run: bool = False,
+        triggered_by: str = "manual",
+        batch_mode: bool = False,
+    ) -> GradingRun:
+        if run_id in self._runs:
+            raise _unique_violation("grading_runs.id")
+        run = GradingRun(run_id, "queued", 0, _now_ms(), None, full_run, triggered_by, batch_mode)
+        self._runs[run_id] = run
+        self._run_bots[run_id] = {
+            bot_id: GradingRunBot(run_id, bot_id, "pending", None, None) for bot_id in bot_ids
+        }
+        return run
+
+    async def start_grading_run(self, run_id: str) -> GradingRun:
+        run = self._runs[run_id]
+        started_ms = _now_ms() if run.status == "queued" else run.started_ms
+        run = self._runs[run_id] = dataclasses.replace(run, status="running", started_ms=started_ms)
+        return run
+
+    def _close_run(self, run_id: str, status: str) -> GradingRun:
+        run = dataclasses.replace(
+            self._runs[run_id], status=status, finished_ms=_now_ms(),
+            bot_count=len(self._grade_ids_by_run.get(run_id, ())),
+        )
+        self._runs[run_id] = run
+        return run
+
+    async def finish_grading_run(self, run_id: str) -> GradingRun:
+        for grade_id in self._grade_ids_by_run.get(run_id, ()):
+            self._latest_grade_ids[self._grades[grade_id].bot_id] = grade_id
+        return self._close_run(run_id, "finished")
+
+    async def set_grading_run_batch(self, run_id: str, batch_id: str) -> None:
+        if run_id in self._runs:
+            self._runs[run_id] = dataclasses.replace(self._runs[run_id], batch_id=batch_id)
+
+    async def fail_grading_run(self, run_id: str) -> None:
+        if run_id in self._runs:
+            self._close_run(run_id, "failed")
+
+    async def get_grading_run(self, run_id: str) -> GradingRun | None:
+        return self._runs.get(run_id)
+
+    async def get_grading_runs(self, limit: int = 50) -> list[GradingRun]:
+        return sorted(self._runs.values(), key=lambda r: (r.started_ms, r.id), reverse=True)[:limit]
+
+    async def get_unfinished_grading_runs(self) -> list[GradingRun]:
+        runs = [r for r in self._runs.values() if r.status in ("queued", "running")]
+        return sorted(runs, key=lambda r: (r.started_ms, r.id))
+
+    async def fail_grading_bot(self, run_id: str, bot_id: int, error: str) -> None:
+        entry = self._run_bots.get(run_id, {}).get(bot_id)
+        if entry is not None:
+            entry.status, entry.error = "failed", error
+
+    async def get_grading_run_bots(self, run_id: str) -> list[GradingRunBot]:
+        return [dataclasses.replace(b) for _, b in sorted(self._run_bots.get(run_id, {}).items())]
+
+    # ── Bot Memory ────────────────────────────────────────────────────
+
+    async def get_bot_memory(self, bot_id: int) -> BotMemory | None:
+        return self._memories.get(bot_id)
+
+    async def save_bot_memory(self, bot_id: int, summary: str, last_conversation_id: int) -> BotMemory:
+        memory = self._memories[bot_id] = BotMemory(bot_id, summary, last_conversation_id, _now_ms())
+        return memory
+
+    # ── Stats ─────────────────────────────────────────────────────────
+    # Maintained on insert, like the bot_stats triggers in the SQLite backend.
+
+    def _participants(self, conv_id: int) -> set[int]:
+        return set(self._conversation_bots.get(conv_id, ()))
+
+    def _bump(self, bot_id: int, key: str) -> None:
+        stats = self._stats.setdefault(bot_id, dict.fromkeys(_STAT_KEYS, 0))
+        stats[key] += 1
+
+    async def get_bot_stats(self, bot_id: int) -> dict[str, int]:
+        return dict(self._stats.get(bot_id) or dict.fromkeys(_STAT_KEYS, 0))
+
+    async def get_all_bot_stats(self) -> dict[int, dict[str, int]]:
+        return {bid: await self.get_bot_stats(bid) for bid in self._bots}
+
+    async def rebuild_bot_stats(self) -> int:
+        self._stats = {bid: dict.fromkeys(_STAT_KEYS, 0) for bid in self._bots}
+        for bid, index in self._messages_by_bot.items():
+            if bid in self._stats:
+                self._stats[bid]["messages"] = len(index)
+        for bid, index in self._conversations_by_bot.items():
+            if bid in self._stats:
+                self._stats[bid]["conversations"] = len(index)
+        for conv_id in self._human_conversation_ids:
+            for bid in self._participants(conv_id) & self._stats.keys():
+                self._stats[bid]["human_interactions"] += 1
+        return len(self._bots)
+
+
+def _snippet(content: str, is_match: Callable[[str], bool]) -> str:
+    """Up to ``_SNIPPET_WORDS`` words around the first match, matches wrapped in ``<mark>``."""
+    words = list(_WORD.finditer(content))
+    if not words:
+        return content
+    first = next((i for i, w in enumerate(words) if is_match(w.group().lower())), 0)
+    start = max(0, min(first, len(words) - _SNIPPET_WORDS))
+    end = min(len(words), start + _SNIPPET_WORDS)
+    lo = 0 if start == 0 else words[start].start()
+    hi = len(content) if end == len(words) else words[end - 1].end()
+    text = _WORD.sub(
+        lambda m: f"<mark>{m.group()}</mark>" if is_match(m.group().lower()) else m.group(), content[lo:hi]
+    )
+    return ("…" if start else "") + text + ("…" if end < len(words) else "")
@@ -0,0 +1,19 @@
+-- Composite indexes matching the lookups and orderings used in queries.py.
+
+-- get_all_bots / get_active_bots
+CREATE INDEX IF NOT EXISTS idx_bots_created_at ON bots (created_at);
+CREATE INDEX IF NOT EXISTS idx_bots_active_name ON bots (is_active, bot_name);
+
+-- get_conversations / get_bot_conversations (OR across both bot columns)
+CREATE INDEX IF NOT EXISTS idx_conversations_started_at ON conversations (started_at);
+CREATE INDEX IF NOT EXISTS idx_conversations_initiator ON conversations (initiator_bot_id, started_at);
+CREATE INDEX IF NOT EXISTS idx_conversations_responder ON conversations (responder_bot_id, started_at);
+
+-- get_messages / get_conversation_messages / get_bot_stats
+CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages (created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_bot ON messages (bot_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, created_at);
+
+-- get_bot_grades / get_latest_grades / get_grades_by_run
+CREATE INDEX IF NOT EXISTS idx_grades_bot ON grades (bot_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_grades_run ON grades (grading_run_id, overall_score);
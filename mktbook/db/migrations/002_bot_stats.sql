@@ -0,0 +1,65 @@
+-- Per-bot activity counters, maintained by triggers so that get_bot_stats is
+-- a primary-key lookup. `python -m mktbook.manage rebuild-stats` recomputes
+-- them from scratch.
+
+CREATE TABLE IF NOT EXISTS bot_stats (
+    bot_id              INTEGER PRIMARY KEY,
+    messages            INTEGER NOT NULL DEFAULT 0,
+    conversations       INTEGER NOT NULL DEFAULT 0,
+    human_interactions  INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_bot_stats_message
+AFTER INSERT ON messages
+WHEN NEW.bot_id IS NOT NULL
+BEGIN
+    INSERT INTO bot_stats (bot_id, messages) VALUES (NEW.bot_id, 1)
+    ON CONFLICT(bot_id) DO UPDATE SET messages = messages + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bot_stats_conversation
+AFTER INSERT ON conversations
+BEGIN
+    INSERT INTO bot_stats (bot_id, conversations)
+    SELECT bot_id, 1 FROM (
+        SELECT NEW.initiator_bot_id AS bot_id UNION SELECT NEW.responder_bot_id
+    ) WHERE bot_id IS NOT NULL
+    ON CONFLICT(bot_id) DO UPDATE SET conversations = conversations + 1;
+END;
+
+-- A human interaction is a conversation with at least one human message, so
+-- only the first human message in a conversation counts.
+CREATE TRIGGER IF NOT EXISTS trg_bot_stats_human
+AFTER INSERT ON messages
+WHEN NEW.author_type = 'human' AND NEW.conversation_id IS NOT NULL
+ AND NOT EXISTS (
+    SELECT 1 FROM messages
+    WHERE conversation_id = NEW.conversation_id AND author_type = 'human' AND id <> NEW.id
+ )
+BEGIN
+    INSERT INTO bot_stats (bot_id, human_interactions)
+    SELECT bot_id, 1 FROM (
+        SELECT initiator_bot_id AS bot_id FROM conversations WHERE id = NEW.conversation_id
+        UNION
+        SELECT responder_bot_id FROM conversations WHERE id = NEW.conversation_id
+    ) WHERE bot_id IS NOT NULL
+    ON CONFLICT(bot_id) DO UPDATE SET human_interactions = human_interactions + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bot_stats_bot_deleted
+AFTER DELETE ON bots
+BEGIN
+    DELETE FROM bot_stats WHERE bot_id = OLD.id;
+END;
+
+-- Backfill from existing history
+DELETE FROM bot_stats;
+INSERT INTO bot_stats (bot_id, messages, conversations, human_interactions)
+SELECT
+    b.id,
+    (SELECT COUNT(*) FROM messages m WHERE m.bot_id = b.id),
+    (SELECT COUNT(*) FROM conversations c WHERE c.initiator_bot_id = b.id OR c.responder_bot_id = b.id),
+    (SELECT COUNT(DISTINCT m.conversation_id) FROM messages m
+       JOIN conversations c ON c.id = m.conversation_id
+      WHERE m.author_type = 'human' AND (c.initiator_bot_id = b.id OR c.responder_bot_id = b.id))
+FROM bots b;
@@ -0,0 +1,2 @@
+-- get_grades pages through the whole grade history by (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_grades_created_at ON grades (created_at);
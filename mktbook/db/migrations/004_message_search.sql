@@ -0,0 +1,18 @@
+-- Full-text index over message content. The index is external-content (it
+-- reads text back from `messages`) and is filled by a background task that
+-- catches up from search_index_state.last_message_id, so inserting a
+-- message does no indexing work.
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,
+    content = 'messages',
+    content_rowid = 'id',
+    tokenize = 'porter unicode61'
+);
+
+CREATE TABLE IF NOT EXISTS search_index_state (
+    id              INTEGER PRIMARY KEY CHECK (id = 1),
+    last_message_id INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO search_index_state (id, last_message_id) VALUES (1, 0);
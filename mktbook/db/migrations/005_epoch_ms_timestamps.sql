@@ -0,0 +1,173 @@
+-- Timestamps become INTEGER milliseconds since the Unix epoch (UTC) in
+-- *_ms columns, so rows written within the same second still order by time
+-- and every ordered scan compares integers. Queries order by (ts, id).
+--
+-- Each table is rebuilt: SQLite cannot change a column's type in place. Ids
+-- and AUTOINCREMENT counters are kept, so archive files and the search index
+-- stay valid. Triggers are dropped first (a rename re-parses every trigger)
+-- and recreated along with the indexes at the end.
+
+DROP TRIGGER IF EXISTS trg_bot_stats_message;
+DROP TRIGGER IF EXISTS trg_bot_stats_conversation;
+DROP TRIGGER IF EXISTS trg_bot_stats_human;
+DROP TRIGGER IF EXISTS trg_bot_stats_bot_deleted;
+
+CREATE TEMP TABLE saved_sequence AS SELECT name, seq FROM sqlite_sequence;
+
+-- bots
+CREATE TABLE new_bots (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_name    TEXT    NOT NULL,
+    bot_name        TEXT    NOT NULL UNIQUE,
+    discord_token   TEXT    NOT NULL,
+    personality     TEXT    NOT NULL DEFAULT '',
+    objective       TEXT    NOT NULL DEFAULT '',
+    behavior_rules  TEXT    NOT NULL DEFAULT '',
+    is_active       INTEGER NOT NULL DEFAULT 1,
+    created_ms      INTEGER NOT NULL
+                    DEFAULT (strftime('%s', 'now') * 1000 + CAST(substr(strftime('%f', 'now'), 4) AS INTEGER))
+);
+INSERT INTO new_bots
+SELECT id, student_name, bot_name, discord_token, personality, objective, behavior_rules, is_active,
+       CAST(strftime('%s', created_at) AS INTEGER) * 1000
+FROM bots;
+DROP TABLE bots;
+ALTER TABLE new_bots RENAME TO bots;
+
+-- conversations
+CREATE TABLE new_conversations (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel_id      TEXT,
+    type            TEXT    NOT NULL DEFAULT 'bot-bot',  -- 'bot-bot' or 'bot-human'
+    initiator_bot_id INTEGER REFERENCES bots(id),
+    responder_bot_id INTEGER REFERENCES bots(id),
+    turn_count      INTEGER NOT NULL DEFAULT 0,
+    started_ms      INTEGER NOT NULL
+                    DEFAULT (strftime('%s', 'now') * 1000 + CAST(substr(strftime('%f', 'now'), 4) AS INTEGER)),
+    ended_ms        INTEGER
+);
+INSERT INTO new_conversations
+SELECT id, channel_id, type, initiator_bot_id, responder_bot_id, turn_count,
+       CAST(strftime('%s', started_at) AS INTEGER) * 1000,
+       CAST(strftime('%s', ended_at) AS INTEGER) * 1000
+FROM conversations;
+DROP TABLE conversations;
+ALTER TABLE new_conversations RENAME TO conversations;
+
+-- messages
+CREATE TABLE new_messages (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id INTEGER REFERENCES conversations(id),
+    bot_id          INTEGER REFERENCES bots(id),
+    author_type     TEXT    NOT NULL DEFAULT 'bot',  -- 'bot' or 'human'
+    author_name     TEXT    NOT NULL,
+    content         TEXT    NOT NULL,
+    discord_msg_id  TEXT,
+    created_ms      INTEGER NOT NULL
+                    DEFAULT (strftime('%s', 'now') * 1000 + CAST(substr(strftime('%f', 'now'), 4) AS INTEGER))
+);
+INSERT INTO new_messages
+SELECT id, conversation_id, bot_id, author_type, author_name, content, discord_msg_id,
+       CAST(strftime('%s', created_at) AS INTEGER) * 1000
+FROM messages;
+DROP TABLE messages;
+ALTER TABLE new_messages RENAME TO messages;
+
+-- grades
+CREATE TABLE new_grades (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    bot_id          INTEGER NOT NULL REFERENCES bots(id),
+    grading_run_id  TEXT    NOT NULL,
+    objective_score REAL    NOT NULL DEFAULT 0,
+    quality_score   REAL    NOT NULL DEFAULT 0,
+    human_score     REAL    NOT NULL DEFAULT 0,
+    volume_score    REAL    NOT NULL DEFAULT 0,
+    overall_score   REAL    NOT NULL DEFAULT 0,
+    llm_reasoning   TEXT    NOT NULL DEFAULT '',
+    total_messages  INTEGER NOT NULL DEFAULT 0,
+    total_conversations INTEGER NOT NULL DEFAULT 0,
+    human_interactions  INTEGER NOT NULL DEFAULT 0,
+    created_ms      INTEGER NOT NULL
+                    DEFAULT (strftime('%s', 'now') * 1000 + CAST(substr(strftime('%f', 'now'), 4) AS INTEGER))
+);
+INSERT INTO new_grades
+SELECT id, bot_id, grading_run_id, objective_score, quality_score, human_score, volume_score,
+       overall_score, llm_reasoning, total_messages, total_conversations, human_interactions,
+       CAST(strftime('%s', created_at) AS INTEGER) * 1000
+FROM grades;
+DROP TABLE grades;
+ALTER TABLE new_grades RENAME TO grades;
+
+-- conversation_pairs
+CREATE TABLE new_conversation_pairs (
+    bot_a_id        INTEGER NOT NULL REFERENCES bots(id),
+    bot_b_id        INTEGER NOT NULL REFERENCES bots(id),
+    conversation_count INTEGER NOT NULL DEFAULT 0,
+    last_conversation_ms INTEGER,
+    PRIMARY KEY (bot_a_id, bot_b_id)
+);
+INSERT INTO new_conversation_pairs
+SELECT bot_a_id, bot_b_id, conversation_count, CAST(strftime('%s', last_conversation_at) AS INTEGER) * 1000
+FROM conversation_pairs;
+DROP TABLE conversation_pairs;
+ALTER TABLE new_conversation_pairs RENAME TO conversation_pairs;
+
+UPDATE sqlite_sequence
+SET seq = (SELECT s.seq FROM saved_sequence s WHERE s.name = sqlite_sequence.name)
+WHERE name IN (SELECT name FROM saved_sequence);
+DROP TABLE temp.saved_sequence;
+
+-- Indexes (same as 001/003, on the integer columns)
+CREATE INDEX IF NOT EXISTS idx_bots_created_at ON bots (created_ms);
+CREATE INDEX IF NOT EXISTS idx_bots_active_name ON bots (is_active, bot_name);
+CREATE INDEX IF NOT EXISTS idx_conversations_started_at ON conversations (started_ms);
+CREATE INDEX IF NOT EXISTS idx_conversations_initiator ON conversations (initiator_bot_id, started_ms);
+CREATE INDEX IF NOT EXISTS idx_conversations_responder ON conversations (responder_bot_id, started_ms);
+CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages (created_ms);
+CREATE INDEX IF NOT EXISTS idx_messages_bot ON messages (bot_id, created_ms);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, created_ms);
+CREATE INDEX IF NOT EXISTS idx_grades_bot ON grades (bot_id, created_ms);
+CREATE INDEX IF NOT EXISTS idx_grades_run ON grades (grading_run_id, overall_score);
+CREATE INDEX IF NOT EXISTS idx_grades_created_at ON grades (created_ms);
+
+-- Triggers (unchanged from 002)
+CREATE TRIGGER trg_bot_stats_message
+AFTER INSERT ON messages
+WHEN NEW.bot_id IS NOT NULL
+BEGIN
+    INSERT INTO bot_stats (bot_id, messages) VALUES (NEW.bot_id, 1)
+    ON CONFLICT(bot_id) DO UPDATE SET messages = messages + 1;
+END;
+
+CREATE TRIGGER trg_bot_stats_conversation
+AFTER INSERT ON conversations
+BEGIN
+    INSERT INTO bot_stats (bot_id, conversations)
+    SELECT bot_id, 1 FROM (
+        SELECT NEW.initiator_bot_id AS bot_id UNION SELECT NEW.responder_bot_id
+    ) WHERE bot_id IS NOT NULL
+    ON CONFLICT(bot_id) DO UPDATE SET conversations = conversations + 1;
+END;
+
+CREATE TRIGGER trg_bot_stats_human
+AFTER INSERT ON messages
+WHEN NEW.author_type = 'human' AND NEW.conversation_id IS NOT NULL
+ AND NOT EXISTS (
+    SELECT 1 FROM messages
+    WHERE conversation_id = NEW.conversation_id AND author_type = 'human' AND id <> NEW.id
+ )
+BEGIN
+    INSERT INTO bot_stats (bot_id, human_interactions)
+    SELECT bot_id, 1 FROM (
+        SELECT initiator_bot_id AS bot_id FROM conversations WHERE id = NEW.conversation_id
+        UNION
+        SELECT responder_bot_id FROM conversations WHERE id = NEW.conversation_id
+    ) WHERE bot_id IS NOT NULL
+    ON CONFLICT(bot_id) DO UPDATE SET human_interactions = human_interactions + 1;
+END;
+
+CREATE TRIGGER trg_bot_stats_bot_deleted
+AFTER DELETE ON bots
+BEGIN
+    DELETE FROM bot_stats WHERE bot_id = OLD.id;
+END;
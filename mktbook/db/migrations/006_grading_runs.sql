@@ -0,0 +1,36 @@
+-- Grading runs become rows of their own, and the leaderboard ("latest grade
+-- per bot") is materialized in latest_grades. A run's grades are swapped into
+-- latest_grades in the same transaction that marks the run finished, so
+-- readers see the previous ranking until then.
+
+CREATE TABLE IF NOT EXISTS grading_runs (
+    id              TEXT    PRIMARY KEY,
+    status          TEXT    NOT NULL DEFAULT 'running',  -- 'running', 'finished' or 'failed'
+    bot_count       INTEGER NOT NULL DEFAULT 0,          -- grades written by the run
+    started_ms      INTEGER NOT NULL
+                    DEFAULT (strftime('%s', 'now') * 1000 + CAST(substr(strftime('%f', 'now'), 4) AS INTEGER)),
+    finished_ms     INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_grading_runs_started ON grading_runs (started_ms);
+
+CREATE TABLE IF NOT EXISTS latest_grades (
+    bot_id          INTEGER PRIMARY KEY REFERENCES bots(id),
+    grade_id        INTEGER NOT NULL REFERENCES grades(id),
+    overall_score   REAL    NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_latest_grades_score ON latest_grades (overall_score);
+
+-- Backfill from existing history
+INSERT OR IGNORE INTO grading_runs (id, status, bot_count, started_ms, finished_ms)
+SELECT grading_run_id, 'finished', COUNT(*), MIN(created_ms), MAX(created_ms)
+FROM grades GROUP BY grading_run_id;
+
+DELETE FROM latest_grades;
+INSERT INTO latest_grades (bot_id, grade_id, overall_score)
+SELECT g.bot_id, g.id, g.overall_score
+FROM (SELECT DISTINCT bot_id FROM grades) b
+JOIN grades g ON g.id = (
+    SELECT id FROM grades WHERE bot_id = b.bot_id ORDER BY created_ms DESC, id DESC LIMIT 1
+);
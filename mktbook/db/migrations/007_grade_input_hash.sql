@@ -0,0 +1,9 @@
+-- Incremental grading: each grade records a hash of the exact prompt it was
+-- graded from. A later run whose prompt for a bot hashes the same copies the
+-- earlier verdict (reused_grade_id points at the grade that made the LLM
+-- call) instead of asking the LLM again.
+
+ALTER TABLE grades ADD COLUMN input_hash TEXT;
+ALTER TABLE grades ADD COLUMN reused_grade_id INTEGER REFERENCES grades(id);
+
+CREATE INDEX IF NOT EXISTS idx_grades_input_hash ON grades (input_hash);
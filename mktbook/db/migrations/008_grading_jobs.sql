@@ -0,0 +1,20 @@
+-- Grading runs become background jobs. A run is created 'queued' together
+-- with one grading_run_bots row per bot to grade; each row turns 'done' in
+-- the same transaction that writes the bot's grade, or 'failed'. After a
+-- restart, runs still 'queued' or 'running' resume with their pending bots.
+
+ALTER TABLE grading_runs ADD COLUMN full_run INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE grading_runs ADD COLUMN triggered_by TEXT NOT NULL DEFAULT 'manual';  -- 'manual' or 'schedule'
+
+CREATE INDEX IF NOT EXISTS idx_grading_runs_status ON grading_runs (status);
+
+-- bot_id deliberately has no foreign key, so a queued run never blocks
+-- deleting a bot; the worker marks bots that have gone missing as failed.
+CREATE TABLE IF NOT EXISTS grading_run_bots (
+    run_id          TEXT    NOT NULL REFERENCES grading_runs(id),
+    bot_id          INTEGER NOT NULL,
+    status          TEXT    NOT NULL DEFAULT 'pending',  -- 'pending', 'done' or 'failed'
+    grade_id        INTEGER REFERENCES grades(id),
+    error           TEXT,
+    PRIMARY KEY (run_id, bot_id)
+) WITHOUT ROWID;
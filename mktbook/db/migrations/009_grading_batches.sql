@@ -0,0 +1,7 @@
+-- Batch grading: a run can send its prompts as one batch job to the
+-- provider's batch API instead of one call per bot. batch_id records the
+-- submitted batch, so a restart waits for that batch instead of sending
+-- the prompts again.
+
+ALTER TABLE grading_runs ADD COLUMN batch_mode INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE grading_runs ADD COLUMN batch_id TEXT;
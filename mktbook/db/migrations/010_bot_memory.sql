@@ -0,0 +1,16 @@
+-- Long-term memory: one rolling summary per bot, folded forward by a
+-- background task (bots/memory.py). last_conversation_id is the newest
+-- conversation already in the summary; later ones are still to be added.
+
+CREATE TABLE IF NOT EXISTS bot_memory (
+    bot_id               INTEGER PRIMARY KEY,
+    summary              TEXT    NOT NULL DEFAULT '',
+    last_conversation_id INTEGER NOT NULL DEFAULT 0,
+    updated_ms           INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_bot_memory_delete_bot
+AFTER DELETE ON bots
+BEGIN
+    DELETE FROM bot_memory WHERE bot_id = OLD.id;
+END;
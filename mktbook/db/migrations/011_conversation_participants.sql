@@ -0,0 +1,48 @@
+-- Several bots can now answer one human message in a single shared
+-- conversation, so a bot takes part in a conversation if it started it,
+-- answered it, or posted a message in it. bot_stats follows suit: the first
+-- message a bot posts in someone else's conversation counts that
+-- conversation (and a human interaction, if a human wrote in it) for the bot.
+
+DROP TRIGGER IF EXISTS trg_bot_stats_human;
+
+CREATE TRIGGER trg_bot_stats_human
+AFTER INSERT ON messages
+WHEN NEW.author_type = 'human' AND NEW.conversation_id IS NOT NULL
+ AND NOT EXISTS (
+    SELECT 1 FROM messages
+    WHERE conversation_id = NEW.conversation_id AND author_type = 'human' AND id <> NEW.id
+ )
+BEGIN
+    INSERT INTO bot_stats (bot_id, human_interactions)
+    SELECT bot_id, 1 FROM (
+        SELECT initiator_bot_id AS bot_id FROM conversations WHERE id = NEW.conversation_id
+        UNION
+        SELECT responder_bot_id FROM conversations WHERE id = NEW.conversation_id
+        UNION
+        SELECT bot_id FROM messages WHERE conversation_id = NEW.conversation_id
+    ) WHERE bot_id IS NOT NULL
+    ON CONFLICT(bot_id) DO UPDATE SET human_interactions = human_interactions + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bot_stats_joined
+AFTER INSERT ON messages
+WHEN NEW.bot_id IS NOT NULL AND NEW.conversation_id IS NOT NULL
+ AND NOT EXISTS (
+    SELECT 1 FROM conversations
+    WHERE id = NEW.conversation_id AND NEW.bot_id IN (initiator_bot_id, responder_bot_id)
+ )
+ AND NOT EXISTS (
+    SELECT 1 FROM messages
+    WHERE conversation_id = NEW.conversation_id AND bot_id = NEW.bot_id AND id <> NEW.id
+ )
+BEGIN
+    INSERT INTO bot_stats (bot_id, conversations, human_interactions)
+    VALUES (NEW.bot_id, 1, EXISTS (
+        SELECT 1 FROM messages
+        WHERE conversation_id = NEW.conversation_id AND author_type = 'human' AND id <> NEW.id
+    ))
+    ON CONFLICT(bot_id) DO UPDATE SET
+        conversations = conversations + 1,
+        human_interactions = human_interactions + excluded.human_interactions;
+END;
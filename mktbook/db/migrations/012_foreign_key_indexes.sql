@@ -0,0 +1,5 @@
+-- Columns that reference grades(id). With foreign keys on, writes to grades
+-- look up referencing rows, which scanned these tables without an index.
+CREATE INDEX IF NOT EXISTS idx_grading_run_bots_grade ON grading_run_bots (grade_id);
+CREATE INDEX IF NOT EXISTS idx_latest_grades_grade ON latest_grades (grade_id);
+CREATE INDEX IF NOT EXISTS idx_grades_reused ON grades (reused_grade_id);
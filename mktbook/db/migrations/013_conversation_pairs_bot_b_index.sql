@@ -0,0 +1,4 @@
+-- conversation_pairs(bot_b_id) references bots(id) but is not the leading
+-- column of the primary key, so every insert into or delete from bots
+-- scanned the pairs table to check it.
+CREATE INDEX IF NOT EXISTS idx_conversation_pairs_bot_b ON conversation_pairs (bot_b_id);
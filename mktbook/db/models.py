@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import time
 from dataclasses import dataclass
 
 
-@dataclass
+def format_ms(ms: int) -> str:
+    """Render epoch milliseconds as the ``YYYY-MM-DD HH:MM:SS`` UTC text used in the API and pages."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ms // 1000))
+
+
+@dataclass(slots=True)
 class Bot:
     id: int
     student_name: str
@@ -13,10 +19,14 @@ class Bot:
     objective: str
     behavior_rules: str
     is_active: bool
-    created_at: str
+    created_ms: int
+
+    @property
+    def created_at(self) -> str:
+        return format_ms(self.created_ms)
 
 
-@dataclass
+@dataclass(slots=True)
 class Conversation:
     id: int
     channel_id: str | None
@@ -24,11 +34,19 @@ class Conversation:
     initiator_bot_id: int | None
     responder_bot_id: int | None
     turn_count: int
-    started_at: str
-    ended_at: str | None
+    started_ms: int
+    ended_ms: int | None
+
+    @property
+    def started_at(self) -> str:
+        return format_ms(self.started_ms)
+
+    @property
+    def ended_at(self) -> str | None:
+        return format_ms(self.ended_ms) if self.ended_ms is not None else None
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     id: int
     conversation_id: int | None
@@ -37,10 +55,14 @@ class Message:
     author_name: str
     content: str
     discord_msg_id: str | None
-    created_at: str
+    created_ms: int
 
+    @property
+    def created_at(self) -> str:
+        return format_ms(self.created_ms)
 
-@dataclass
+
+@dataclass(slots=True)
 class Grade:
     id: int
     bot_id: int
@@ -54,4 +76,59 @@ class Grade:
     total_messages: int
     total_conversations: int
     human_interactions: int
-    created_at: str
+    created_ms: int
+    input_hash: str | None = None  # hash of the grading prompt; None if the verdict should not be reused
+    reused_grade_id: int | None = None  # set when copied from an earlier grade instead of an LLM call
+
+    @property
+    def created_at(self) -> str:
+        return format_ms(self.created_ms)
+
+
+@dataclass(slots=True)
+class GradingRun:
+    id: str
+    status: str  # 'queued', 'running', 'finished' or 'failed'
+    bot_count: int
+    started_ms: int
+    finished_ms: int | None
+    full_run: bool = False  # re-grade every bot instead of carrying unchanged verdicts forward
+    triggered_by: str = "manual"  # 'manual' or 'schedule'
+    batch_mode: bool = False  # grade through the provider's batch API
+    batch_id: str | None = None  # the submitted batch, once there is one
+
+    @property
+    def started_at(self) -> str:
+        return format_ms(self.started_ms)
+
+    @property
+    def finished_at(self) -> str | None:
+        return format_ms(self.finished_ms) if self.finished_ms is not None else None
+
+
+@dataclass(slots=True)
+class GradingRunBot:
+    run_id: str
+    bot_id: int
+    status: str  # 'pending', 'done' or 'failed'
+    grade_id: int | None
+    error: str | None
+
+
+@dataclass(slots=True)
+class BotMemory:
+    bot_id: int
+    summary: str
+    last_conversation_id: int  # newest conversation folded into the summary
+    updated_ms: int
+
+    @property
+    def updated_at(self) -> str:
+        return format_ms(self.updated_ms)
+
+
+@dataclass(slots=True)
+class SearchHit:
+    message: Message
+    snippet: str
+    rank: float
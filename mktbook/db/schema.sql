@@ -1,3 +1,5 @@
+-- Baseline schema. Later changes live in migrations/ and are applied on top.
+
 CREATE TABLE IF NOT EXISTS bots (
     id              INTEGER PRIMARY KEY AUTOINCREMENT,
     student_name    TEXT    NOT NULL,
@@ -0,0 +1,141 @@
+"""Online snapshots of the live database.
+
+A snapshot copies ``database_path`` into ``snapshot_dir`` with SQLite's
+backup API, ``snapshot_step_pages`` pages at a time, while the app keeps
+reading and writing. The copy runs in a worker thread, so it never blocks
+the event loop, and sleeps ``snapshot_step_sleep_ms`` after each step to
+leave the disk to the app in between. The source holds one read
+transaction for the whole copy. That pins a single WAL snapshot, so the
+result is consistent and new writes do not force the copy to restart.
+
+Files are written as ``*.partial`` and renamed when complete. Only the
+newest ``snapshot_keep`` snapshots are kept. Archive files (db/archive.py)
+are not included; they change only when archiving runs and can be copied
+as they are.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import pathlib
+import sqlite3
+import time
+from typing import Any
+
+from mktbook.config import settings
+
+log = logging.getLogger(__name__)
+
+_status: dict[str, Any] = {
+    "running": False,
+    "path": None,
+    "started_ms": None,
+    "pages_copied": 0,
+    "pages_total": 0,
+    "last": None,
+    "error": None,
+}
+_lock = asyncio.Lock()
+_task: asyncio.Task[None] | None = None
+
+
+def snapshot_paths() -> list[pathlib.Path]:
+    """Completed snapshots, newest first."""
+    return sorted(pathlib.Path(settings.snapshot_dir).glob("mktbook-*.db"), reverse=True)
+
+
+def snapshot_status() -> dict[str, Any]:
+    """Progress of the running snapshot, the last result, and the snapshots on disk."""
+    return {**_status, "snapshots": [p.name for p in snapshot_paths()]}
+
+
+def _copy(source: pathlib.Path, target: pathlib.Path) -> int:
+    """Back up ``source`` into ``target`` step by step. Runs in a worker thread; returns the page count."""
+    def progress(status: int, remaining: int, total: int) -> None:
+        _status["pages_copied"] = total - remaining
+        _status["pages_total"] = total
+        # backup()'s own sleep= only applies when the source is busy or
+        # locked; the pause between steps has to happen here.
+        if remaining and settings.snapshot_step_sleep_ms > 0:
+            time.sleep(settings.snapshot_step_sleep_ms / 1000)
+
+    src = sqlite3.connect(source.resolve().as_uri() + "?mode=ro", uri=True)
+    dst = sqlite3.connect(target)
+    try:
+        src.execute("BEGIN")
+        src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        src.backup(dst, pages=max(settings.snapshot_step_pages, 1), progress=progress)
+        src.rollback()
+        # A self-contained file: no -wal/-shm companions when it is opened later.
+        dst.execute("PRAGMA journal_mode=DELETE")
+        return (dst.execute("PRAGMA page_count").fetchone())[0]
+    finally:
+        dst.close()
+        src.close()
+
+
+def _prune() -> None:
+    if settings.snapshot_keep <= 0:
+        return
+    for path in snapshot_paths()[settings.snapshot_keep:]:
+        path.unlink()
+        log.info("Removed old snapshot %s", path)
+
+
+async def take_snapshot() -> dict[str, Any]:
+    """Snapshot the live database now and apply retention. Returns the result summary."""
+    if settings.database_path == ":memory:":
+        raise RuntimeError("An in-memory database cannot be snapshotted")
+    async with _lock:
+        directory = pathlib.Path(settings.snapshot_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        for stale in directory.glob("mktbook-*.db.partial"):
+            stale.unlink()
+        target = directory / time.strftime("mktbook-%Y%m%d-%H%M%S.db", time.gmtime())
+        partial = target.with_name(target.name + ".partial")
+
+        _status.update(
+            running=True, path=str(target), started_ms=int(time.time() * 1000),
+            pages_copied=0, pages_total=0, error=None,
+        )
+        start = time.perf_counter()
+        try:
+            pages = await asyncio.to_thread(_copy, pathlib.Path(settings.database_path), partial)
+            partial.replace(target)
+        except BaseException as exc:
+            partial.unlink(missing_ok=True)
+            _status["error"] = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            _status["running"] = False
+
+        result = {
+            "path": str(target),
+            "pages": pages,
+            "bytes": target.stat().st_size,
+            "seconds": round(time.perf_counter() - start, 3),
+            "finished_ms": int(time.time() * 1000),
+        }
+        _status["last"] = result
+        log.info("Snapshot %s: %d pages (%.1f MB) in %.1fs",
+                 target, pages, result["bytes"] / 1024 / 1024, result["seconds"])
+        _prune()
+        return result
+
+
+def start_snapshot() -> None:
+    """Start :func:`take_snapshot` in the background; progress shows in :func:`snapshot_status`."""
+    global _task
+    if _lock.locked() or (_task is not None and not _task.done()):
+        raise RuntimeError("A snapshot is already running")
+
+    async def _run() -> None:
+        try:
+            await take_snapshot()
+        except Exception:
+            log.exception("Snapshot failed")
+        finally:
+            _status["running"] = False
+
+    _status["running"] = True
+    _task = asyncio.create_task(_run())
@@ -0,0 +1,1014 @@
+"""SQLite storage backend: the default implementation of ``storage.Storage``.
+
+The module itself is the backend; ``storage.get_storage()`` hands it out
+as is, so every public function here is part of the interface.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import fields
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Iterable, TypeVar
+
+import aiosqlite
+
+from mktbook.config import settings
+from mktbook.db.connection import archive_reader, attached_archives, reader, submit_write, writer
+from mktbook.db.models import Bot, BotMemory, Conversation, Grade, GradingRun, GradingRunBot, Message, SearchHit
+from mktbook.db.storage import PageKey
+
+
+# Rows come back as plain tuples. Every query selects an explicit column
+# list in dataclass field order, so a row maps onto its model positionally
+# (``Message(*row)``) with no per-column name lookup.
+
+def _columns(model: type, prefix: str = "") -> str:
+    return ", ".join(prefix + f.name for f in fields(model))
+
+
+_BOT_COLUMNS = _columns(Bot)
+_CONVERSATION_COLUMNS = _columns(Conversation)
+_MESSAGE_COLUMNS = _columns(Message)
+_GRADE_COLUMNS = _columns(Grade)
+_RUN_COLUMNS = _columns(GradingRun)
+_RUN_BOT_COLUMNS = _columns(GradingRunBot)
+_MEMORY_COLUMNS = _columns(BotMemory)
+
+
+def _row_to_bot(row: tuple[Any, ...]) -> Bot:
+    bot = Bot(*row)
+    bot.is_active = bool(bot.is_active)
+    return bot
+
+
+def _row_to_run(row: tuple[Any, ...]) -> GradingRun:
+    run = GradingRun(*row)
+    run.full_run = bool(run.full_run)
+    run.batch_mode = bool(run.batch_mode)
+    return run
+
+
+# Batch lookups pass ids as bound parameters; chunk so that no statement
+# exceeds SQLite's host-parameter limit on older builds.
+_MAX_BATCH_PARAMS = 900
+
+
+_K = TypeVar("_K", bound=Hashable)
+
+
+def _chunks(ids: Iterable[_K], size: int = _MAX_BATCH_PARAMS) -> list[list[_K]]:
+    unique = list(dict.fromkeys(ids))
+    return [unique[i:i + size] for i in range(0, len(unique), size)]
+
+
+def _placeholders(n: int) -> str:
+    return ", ".join("?" * n)
+
+
+# Timestamps are stored as integer epoch milliseconds (UTC); see
+# migrations/005_epoch_ms_timestamps.sql for the matching column defaults.
+_NOW_MS = "(strftime('%s', 'now') * 1000 + CAST(substr(strftime('%f', 'now'), 4) AS INTEGER))"
+
+# Rows read per borrowed connection when streaming a table
+_STREAM_FETCH_SIZE = 500
+
+
+def _where(clauses: list[str]) -> str:
+    return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+
+# Old conversations live in archive files (see db/archive.py). Queries that
+# take ``include_archive`` read them too by attaching the archives and
+# repeating the statement once per schema under UNION ALL.
+
+@asynccontextmanager
+async def _tiers(include_archive: bool) -> AsyncIterator[tuple[aiosqlite.Connection, list[str]]]:
+    if include_archive:
+        async with archive_reader() as (db, schemas):
+            yield db, schemas
+    else:
+        async with reader() as db:
+            yield db, ["main"]
+
+
+def _across(schemas: list[str], table: str, columns: str, where: str = "") -> str:
+    return "\nUNION ALL\n".join(f"SELECT {columns} FROM {s}.{table} {where}" for s in schemas)
+
+
+_T = TypeVar("_T")
+
+
+async def _stream(
+    model: Callable[..., _T],
+    table: str,
+    columns: str,
+    sort: str,
+    clauses: list[str],
+    params: list[Any],
+    after: PageKey | None,
+    include_archive: bool,
+) -> AsyncIterator[_T]:
+    """Yield ``table`` rows in ``(sort, id)`` order, one page per borrowed connection.
+
+    The connection, with any archives attached, goes back to the pool
+    before a page is handed out, so a slow client never pins a reader for
+    the length of its download. Each page resumes after the last row's key.
+    """
+    while True:
+        where = clauses if after is None else [*clauses, f"({sort}, id) > (?, ?)"]
+        args = params if after is None else [*params, *after]
+        async with _tiers(include_archive) as (db, schemas):
+            rows = await (await db.execute(
+                f"""{_across(schemas, table, columns, _where(where))}
+                    ORDER BY {sort} ASC, id ASC LIMIT ?""",
+                (*args * len(schemas), _STREAM_FETCH_SIZE),
+            )).fetchall()
+        for row in rows:
+            item = model(*row)
+            yield item
+        if len(rows) < _STREAM_FETCH_SIZE:
+            return
+        after = (getattr(item, sort), item.id)  # type: ignore[attr-defined]
+
+
+# ── Result cache ──────────────────────────────────────────────────────
+# Hot reads of rarely-changing tables are memoised per (function, arguments).
+# Writes through this module invalidate the tables they touch; entries also
+# expire after query_cache_ttl seconds in case the database is changed from
+# elsewhere (set it to 0 to disable caching).
+
+class _ResultCache:
+    def __init__(self) -> None:
+        # Least recently used first; trimmed to query_cache_max_entries.
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, tuple[asyncio.Future[Any], tuple[str, ...]]] = {}
+        # Keys of stored entries only, so invalidation never meets a key with nothing behind it.
+        self._keys_by_table: dict[str, set[Hashable]] = {}
+        # Bumped on every invalidation, so that a fill which raced a write
+        # does not store what it read before the write.
+        self._generations: dict[str, int] = {}
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0, "evictions": 0}
+
+    async def get(self, key: Hashable, tables: tuple[str, ...], fill: Callable[[], Awaitable[Any]]) -> Any:
+        if settings.query_cache_ttl <= 0:
+            return await fill()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[1]
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            self._counters["misses"] += 1
+            task = asyncio.ensure_future(self._fill(key, tables, fill))
+            self._inflight[key] = (task, tables)
+        else:
+            task = inflight[0]
+            self._counters["coalesced"] += 1
+        # Concurrent misses share one fill; a cancelled caller does not cancel it.
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: Hashable, tables: tuple[str, ...], fill: Callable[[], Awaitable[Any]]) -> Any:
+        generations = [self._generations.get(t, 0) for t in tables]
+        try:
+            value = await fill()
+        finally:
+            inflight = self._inflight.get(key)
+            if inflight is not None and inflight[0] is asyncio.current_task():
+                del self._inflight[key]
+        if generations == [self._generations.get(t, 0) for t in tables]:
+            self._entries[key] = (time.monotonic() + settings.query_cache_ttl, value)
+            self._entries.move_to_end(key)
+            for table in tables:
+                self._keys_by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > max(settings.query_cache_max_entries, 0):
+                evicted, _ = self._entries.popitem(last=False)
+                for keys in self._keys_by_table.values():
+                    keys.discard(evicted)
+                self._counters["evictions"] += 1
+        return value
+
+    def invalidate(self, *tables: str) -> None:
+        for table in tables:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for key in self._keys_by_table.pop(table, ()):
+                self._entries.pop(key, None)
+            # Later readers start a fresh fill instead of joining one that read before the write.
+            for key in [k for k, (_, t) in self._inflight.items() if table in t]:
+                del self._inflight[key]
+        self._counters["invalidations"] += 1
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._entries), "inflight": len(self._inflight), **self._counters}
+
+
+_cache = _ResultCache()
+_F = TypeVar("_F", bound=Callable[..., Awaitable[Any]])
+
+
+def _cached(*tables: str) -> Callable[[_F], _F]:
+    """Serve the decorated read from the result cache, filed under ``tables``.
+
+    Callers get their own copy of a cached list or dict; the model objects
+    inside are shared and must be treated as read-only.
+    """
+    def decorate(fn: _F) -> _F:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            # Positional, keyword and defaulted spellings of a call share one key.
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (fn.__name__, *bound.arguments.values())
+            value = await _cache.get(key, tables, lambda: fn(*bound.args, **bound.kwargs))
+            if isinstance(value, (list, dict)):
+                return value.copy()
+            return value
+        return wrapper  # type: ignore[return-value]
+    return decorate
+
+
+def cache_stats() -> dict[str, int]:
+    """Entry count and hit/miss/invalidation counters for the result cache."""
+    return _cache.stats()
+
+
+# ── Bots ──────────────────────────────────────────────────────────────
+
+async def create_bot(
+    student_name: str,
+    bot_name: str,
+    discord_token: str,
+    personality: str = "",
+    objective: str = "",
+    behavior_rules: str = "",
+) -> Bot:
+    async with writer() as db:
+        row = await (await db.execute(
+            f"""INSERT INTO bots (student_name, bot_name, discord_token, personality, objective, behavior_rules)
+               VALUES (?, ?, ?, ?, ?, ?) RETURNING {_BOT_COLUMNS}""",
+            (student_name, bot_name, discord_token, personality, objective, behavior_rules),
+        )).fetchone()
+    _cache.invalidate("bots")
+    return _row_to_bot(row)
+
+
+@_cached("bots")
+async def get_bot(bot_id: int) -> Bot | None:
+    async with reader() as db:
+        row = await (await db.execute(f"SELECT {_BOT_COLUMNS} FROM bots WHERE id = ?", (bot_id,))).fetchone()
+        return _row_to_bot(row) if row else None
+
+
+@_cached("bots")
+async def get_bot_by_name(bot_name: str) -> Bot | None:
+    async with reader() as db:
+        row = await (await db.execute(f"SELECT {_BOT_COLUMNS} FROM bots WHERE bot_name = ?", (bot_name,))).fetchone()
+        return _row_to_bot(row) if row else None
+
+
+async def get_bots_by_ids(bot_ids: Iterable[int]) -> dict[int, Bot]:
+    """Fetch several bots at once, keyed by id. Unknown ids are omitted."""
+    return await _get_bots_by_ids(tuple(sorted(set(bot_ids))))
+
+
+@_cached("bots")
+async def _get_bots_by_ids(bot_ids: tuple[int, ...]) -> dict[int, Bot]:
+    result: dict[int, Bot] = {}
+    async with reader() as db:
+        for chunk in _chunks(bot_ids):
+            rows = await (await db.execute(
+                f"SELECT {_BOT_COLUMNS} FROM bots WHERE id IN ({_placeholders(len(chunk))})", chunk
+            )).fetchall()
+            for r in rows:
+                bot = _row_to_bot(r)
+                result[bot.id] = bot
+    return result
+
+
+@_cached("bots")
+async def get_all_bots() -> list[Bot]:
+    async with reader() as db:
+        rows = await (await db.execute(f"SELECT {_BOT_COLUMNS} FROM bots ORDER BY created_ms DESC")).fetchall()
+        return [_row_to_bot(r) for r in rows]
+
+
+@_cached("bots")
+async def get_active_bots() -> list[Bot]:
+    async with reader() as db:
+        rows = await (await db.execute(f"SELECT {_BOT_COLUMNS} FROM bots WHERE is_active = 1 ORDER BY bot_name")).fetchall()
+        return [_row_to_bot(r) for r in rows]
+
+
+async def update_bot(bot_id: int, **fields: Any) -> Bot | None:
+    if not fields:
+        return await get_bot(bot_id)
+    allowed = {"student_name", "bot_name", "discord_token", "personality", "objective", "behavior_rules", "is_active"}
+    filtered = {k: v for k, v in fields.items() if k in allowed}
+    if not filtered:
+        return await get_bot(bot_id)
+    sets = ", ".join(f"{k} = ?" for k in filtered)
+    vals = list(filtered.values()) + [bot_id]
+    async with writer() as db:
+        await db.execute(f"UPDATE bots SET {sets} WHERE id = ?", vals)
+    _cache.invalidate("bots")
+    return await get_bot(bot_id)
+
+
+async def delete_bot(bot_id: int) -> None:
+    async with writer() as db:
+        await db.execute("DELETE FROM bots WHERE id = ?", (bot_id,))
+    _cache.invalidate("bots")
+
+
+# ── Conversations ─────────────────────────────────────────────────────
+
+_INSERT_CONVERSATION = f"""INSERT INTO conversations (channel_id, type, initiator_bot_id, responder_bot_id)
+                           VALUES (?, ?, ?, ?) RETURNING {_CONVERSATION_COLUMNS}"""
+_END_CONVERSATION = f"UPDATE conversations SET ended_ms = {_NOW_MS}, turn_count = ? WHERE id = ?"
+
+
+async def create_conversation(
+    channel_id: str | None,
+    conv_type: str,
+    initiator_bot_id: int | None,
+    responder_bot_id: int | None,
+) -> Conversation:
+    async with writer() as db:
+        row = await (await db.execute(
+            _INSERT_CONVERSATION, (channel_id, conv_type, initiator_bot_id, responder_bot_id)
+        )).fetchone()
+        return Conversation(*row)
+
+
+def queue_conversation(
+    channel_id: str | None,
+    conv_type: str,
+    initiator_bot_id: int | None,
+    responder_bot_id: int | None,
+) -> asyncio.Future[Conversation]:
+    """Group-commit variant of :func:`create_conversation`."""
+    async def _run() -> Conversation:
+        rows = await submit_write(_INSERT_CONVERSATION, (channel_id, conv_type, initiator_bot_id, responder_bot_id))
+        return Conversation(*rows[0])
+    return asyncio.ensure_future(_run())
+
+
+async def end_conversation(conv_id: int, turn_count: int) -> None:
+    async with writer() as db:
+        await db.execute(_END_CONVERSATION, (turn_count, conv_id))
+
+
+def queue_end_conversation(conv_id: int, turn_count: int) -> asyncio.Future[None]:
+    """Group-commit variant of :func:`end_conversation`."""
+    async def _run() -> None:
+        await submit_write(_END_CONVERSATION, (turn_count, conv_id))
+    return asyncio.ensure_future(_run())
+
+
+async def get_conversations(limit: int = 50, before: PageKey | None = None) -> list[Conversation]:
+    """Newest conversations first; pass the last row's page key as ``before`` for the next page."""
+    clauses: list[str] = []
+    params: list[Any] = []
+    if before is not None:
+        clauses.append("(started_ms, id) < (?, ?)")
+        params.extend(before)
+    async with reader() as db:
+        rows = await (await db.execute(
+            f"""SELECT {_CONVERSATION_COLUMNS} FROM conversations {_where(clauses)}
+                ORDER BY started_ms DESC, id DESC LIMIT ?""",
+            (*params, limit),
+        )).fetchall()
+        return [Conversation(*r) for r in rows]
+
+
+async def iter_conversations(
+    after: PageKey | None = None, include_archive: bool = False
+) -> AsyncIterator[Conversation]:
+    """Yield conversations oldest first, a page at a time, without buffering the result."""
+    async for conv in _stream(Conversation, "conversations", _CONVERSATION_COLUMNS, "started_ms",
+                              [], [], after, include_archive):
+        yield conv
+
+
+# A bot takes part in a conversation it started, answered or posted in
+# (several bots can answer one human message in a shared conversation).
+_TAKES_PART = """(initiator_bot_id = ? OR responder_bot_id = ?
+    OR id IN (SELECT conversation_id FROM messages WHERE bot_id = ?))"""
+
+
+async def get_bot_conversations(bot_id: int, limit: int = 50) -> list[Conversation]:
+    async with reader() as db:
+        rows = await (await db.execute(
+            f"""SELECT {_CONVERSATION_COLUMNS} FROM conversations
+               WHERE {_TAKES_PART}
+               ORDER BY started_ms DESC, id DESC LIMIT ?""",
+            (bot_id, bot_id, bot_id, limit),
+        )).fetchall()
+        return [Conversation(*r) for r in rows]
+
+
+async def get_conversations_since(bot_id: int, after_id: int, limit: int = 20) -> list[Conversation]:
+    """The bot's conversations with ids above ``after_id``, oldest first (live tier only)."""
+    async with reader() as db:
+        rows = await (await db.execute(
+            f"""SELECT {_CONVERSATION_COLUMNS} FROM conversations
+               WHERE {_TAKES_PART} AND id > ?
+               ORDER BY id LIMIT ?""",
+            (bot_id, bot_id, bot_id, after_id, limit),
+        )).fetchall()
+        return [Conversation(*r) for r in rows]
+
+
+_RECENT_FOR_OWNERS = f"""SELECT o.bot_id AS owner_id, {_columns(Conversation, "c.")} FROM owners o
+    JOIN {{schema}}.conversations c ON c.id IN (
+        SELECT id FROM (
+            SELECT * FROM (
+                SELECT id, started_ms FROM {{schema}}.conversations
+                WHERE initiator_bot_id = o.bot_id ORDER BY started_ms DESC, id DESC LIMIT ?
+            )
+            UNION
+            SELECT * FROM (
+                SELECT id, started_ms FROM {{schema}}.conversations
+                WHERE responder_bot_id = o.bot_id ORDER BY started_ms DESC, id DESC LIMIT ?
+            )
+            UNION
+            SELECT * FROM (
+                SELECT id, started_ms FROM {{schema}}.conversations
+                WHERE id IN (SELECT conversation_id FROM {{schema}}.messages WHERE bot_id = o.bot_id)
+                ORDER BY started_ms DESC, id DESC LIMIT ?
+            )
+        ) ORDER BY started_ms DESC, id DESC LIMIT ?
+    )"""
+
+
+async def get_recent_conversations_for_bots(
+    bot_ids: Iterable[int], per_bot: int = 5, include_archive: bool = False
+) -> dict[int, list[Conversation]]:
+    """Return up to ``per_bot`` most recent conversations for each bot, newest first.
+
+    Every requested bot id is present in the result. Conversations the bot
+    started or answered come from the initiator/responder indexes, bounded
+    rather than over its full history; shared ones it only posted in come
+    from its messages.
+    """
+    ids = list(dict.fromkeys(bot_ids))
+    result: dict[int, list[Conversation]] = {bid: [] for bid in ids}
+    async with _tiers(include_archive) as (db, schemas):
+        arms = "\nUNION ALL\n".join(_RECENT_FOR_OWNERS.format(schema=s) for s in schemas)
+        for chunk in _chunks(ids, _MAX_BATCH_PARAMS - 4 * len(schemas)):
+            values = ", ".join(["(?)"] * len(chunk))
+            rows = await (await db.execute(
+                f"""WITH owners(bot_id) AS (VALUES {values})
+                    {arms}
+                    ORDER BY owner_id, started_ms DESC, id DESC""",
+                (*chunk, *(per_bot,) * 4 * len(schemas)),
+            )).fetchall()
+            for r in rows:
+                # Each tier contributes its own newest few; keep the overall newest.
+                convs = result[r[0]]
+                if len(convs) < per_bot:
+                    convs.append(Conversation(*r[1:]))
+    return result
+
+
+# ── Messages ──────────────────────────────────────────────────────────
+
+_INSERT_MESSAGE = f"""INSERT INTO messages (conversation_id, bot_id, author_type, author_name, content, discord_msg_id)
+                      VALUES (?, ?, ?, ?, ?, ?) RETURNING {_MESSAGE_COLUMNS}"""
+
+
+async def create_message(
+    conversation_id: int | None,
+    bot_id: int | None,
+    author_type: str,
+    author_name: str,
+    content: str,
+    discord_msg_id: str | None = None,
+) -> Message:
+    async with writer() as db:
+        row = await (await db.execute(
+            _INSERT_MESSAGE, (conversation_id, bot_id, author_type, author_name, content, discord_msg_id)
+        )).fetchone()
+        return Message(*row)
+
+
+def queue_message(
+    conversation_id: int | None,
+    bot_id: int | None,
+    author_type: str,
+    author_name: str,
+    content: str,
+    discord_msg_id: str | None = None,
+) -> asyncio.Future[Message]:
+    """Group-commit variant of :func:`create_message`."""
+    async def _run() -> Message:
+        rows = await submit_write(
+            _INSERT_MESSAGE, (conversation_id, bot_id, author_type, author_name, content, discord_msg_id)
+        )
+        return Message(*rows[0])
+    return asyncio.ensure_future(_run())
+
+
+async def get_conversation_messages(conv_id: int, include_archive: bool = False) -> list[Message]:
+    async with _tiers(include_archive) as (db, schemas):
+        rows = await (await db.execute(
+            f"""{_across(schemas, 'messages', _MESSAGE_COLUMNS, 'WHERE conversation_id = ?')}
+                ORDER BY created_ms ASC, id ASC""",
+            (conv_id,) * len(schemas),
+        )).fetchall()
+        return [Message(*r) for r in rows]
+
+
+async def get_messages_for_conversations(
+    conv_ids: Iterable[int], include_archive: bool = False
+) -> dict[int, list[Message]]:
+    """Fetch the messages of several conversations at once, oldest first per conversation.
+
+    Every requested conversation id is present in the result.
+    """
+    ids = list(dict.fromkeys(conv_ids))
+    result: dict[int, list[Message]] = {cid: [] for cid in ids}
+    async with _tiers(include_archive) as (db, schemas):
+        for chunk in _chunks(ids, _MAX_BATCH_PARAMS // len(schemas)):
+            where = f"WHERE conversation_id IN ({_placeholders(len(chunk))})"
+            rows = await (await db.execute(
+                f"""{_across(schemas, 'messages', _MESSAGE_COLUMNS, where)}
+                    ORDER BY conversation_id, created_ms ASC, id ASC""",
+                chunk * len(schemas),
+            )).fetchall()
+            for r in rows:
+                msg = Message(*r)
+                result[msg.conversation_id].append(msg)
+    return result
+
+
+async def get_messages(
+    limit: int = 100, bot_id: int | None = None, before: PageKey | None = None
+) -> list[Message]:
+    """Newest messages first; pass the last row's page key as ``before`` for the next page."""
+    clauses: list[str] = []
+    params: list[Any] = []
+    if bot_id is not None:
+        clauses.append("bot_id = ?")
+        params.append(bot_id)
+    if before is not None:
+        clauses.append("(created_ms, id) < (?, ?)")
+        params.extend(before)
+    async with reader() as db:
+        rows = await (await db.execute(
+            f"""SELECT {_MESSAGE_COLUMNS} FROM messages {_where(clauses)}
+                ORDER BY created_ms DESC, id DESC LIMIT ?""",
+            (*params, limit),
+        )).fetchall()
+        return [Message(*r) for r in rows]
+
+
+async def iter_messages(
+    bot_id: int | None = None, after: PageKey | None = None, include_archive: bool = False
+) -> AsyncIterator[Message]:
+    """Yield messages oldest first, a page at a time, without buffering the result."""
+    clauses: list[str] = []
+    params: list[Any] = []
+    if bot_id is not None:
+        clauses.append("bot_id = ?")
+        params.append(bot_id)
+    async for msg in _stream(Message, "messages", _MESSAGE_COLUMNS, "created_ms",
+                             clauses, params, after, include_archive):
+        yield msg
+
+
+# ── Search ────────────────────────────────────────────────────────────
+# messages_fts is filled by index_pending_messages(), which the app runs in
+# the background, so results can trail new messages by a few seconds.
+
+def _quote_terms(query: str) -> str:
+    """Turn free text into an FTS5 query matching every word literally."""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+async def search_messages(
+    query: str,
+    bot_id: int | None = None,
+    author_type: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    limit: int = 50,
+    offset: int = 0,
+) -> list[SearchHit]:
+    """Full-text search over message content, best matches first.
+
+    ``query`` accepts FTS5 syntax (``OR``, ``NEAR``, ``prefix*``, quoted
+    phrases); anything that does not parse is searched as plain words.
+    ``since``/``until`` are date/time strings (``2025-03-01`` or
+    ``2025-03-01 14:00:00``, UTC) bounding the creation time, inclusive/exclusive.
+    """
+    clauses = ["messages_fts MATCH ?"]
+    filters: list[Any] = []
+    if bot_id is not None:
+        clauses.append("m.bot_id = ?")
+        filters.append(bot_id)
+    if author_type is not None:
+        clauses.append("m.author_type = ?")
+        filters.append(author_type)
+    if since is not None:
+        clauses.append("m.created_ms >= strftime('%s', ?) * 1000")
+        filters.append(since)
+    if until is not None:
+        clauses.append("m.created_ms < strftime('%s', ?) * 1000")
+        filters.append(until)
+    sql = f"""SELECT {_columns(Message, "m.")},
+                     snippet(messages_fts, 0, '<mark>', '</mark>', '…', 16) AS snippet,
+                     bm25(messages_fts) AS rank
+              FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+              {_where(clauses)}
+              ORDER BY rank LIMIT ? OFFSET ?"""
+
+    async with reader() as db:
+        try:
+            rows = await (await db.execute(sql, (query, *filters, limit, offset))).fetchall()
+        except sqlite3.OperationalError:
+            rows = await (await db.execute(sql, (_quote_terms(query), *filters, limit, offset))).fetchall()
+        return [SearchHit(message=Message(*r[:-2]), snippet=r[-2], rank=r[-1]) for r in rows]
+
+
+async def index_pending_messages(batch_size: int = 1000) -> int:
+    """Add up to ``batch_size`` not-yet-indexed messages to the search index.
+
+    Returns how many were indexed; 0 means the index is caught up.
+    """
+    async with writer() as db:
+        last = (await (await db.execute(
+            "SELECT last_message_id FROM search_index_state WHERE id = 1"
+        )).fetchone())[0]
+        count, upto = await (await db.execute(
+            "SELECT COUNT(*), MAX(id) FROM (SELECT id FROM messages WHERE id > ? ORDER BY id LIMIT ?)",
+            (last, batch_size),
+        )).fetchone()
+        if not count:
+            return 0
+        await db.execute(
+            "INSERT INTO messages_fts (rowid, content) SELECT id, content FROM messages WHERE id > ? AND id <= ?",
+            (last, upto),
+        )
+        await db.execute("UPDATE search_index_state SET last_message_id = ? WHERE id = 1", (upto,))
+        return count
+
+
+async def rebuild_search_index() -> int:
+    """Rebuild the full-text index from scratch. Returns the number of messages indexed."""
+    async with writer() as db:
+        await db.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+        count, upto = await (await db.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM messages")).fetchone()
+        await db.execute("UPDATE search_index_state SET last_message_id = ? WHERE id = 1", (upto,))
+        return count
+
+
+# ── Conversation Pairs ────────────────────────────────────────────────
+
+_INCREMENT_PAIR = f"""INSERT INTO conversation_pairs (bot_a_id, bot_b_id, conversation_count, last_conversation_ms)
+                      VALUES (?, ?, 1, {_NOW_MS})
+                      ON CONFLICT(bot_a_id, bot_b_id)
+                      DO UPDATE SET conversation_count = conversation_count + 1,
+                                    last_conversation_ms = excluded.last_conversation_ms"""
+
+async def get_pair_counts() -> dict[tuple[int, int], int]:
+    async with reader() as db:
+        rows = await (await db.execute(
+            "SELECT bot_a_id, bot_b_id, conversation_count FROM conversation_pairs"
+        )).fetchall()
+        return {(a, b): count for a, b, count in rows}
+
+
+async def increment_pair(bot_a_id: int, bot_b_id: int) -> None:
+    a, b = min(bot_a_id, bot_b_id), max(bot_a_id, bot_b_id)
+    async with writer() as db:
+        await db.execute(_INCREMENT_PAIR, (a, b))
+
+
+def queue_increment_pair(bot_a_id: int, bot_b_id: int) -> asyncio.Future[None]:
+    """Group-commit variant of :func:`increment_pair`."""
+    a, b = min(bot_a_id, bot_b_id), max(bot_a_id, bot_b_id)
+
+    async def _run() -> None:
+        await submit_write(_INCREMENT_PAIR, (a, b))
+    return asyncio.ensure_future(_run())
+
+
+# ── Grades ────────────────────────────────────────────────────────────
+
+async def create_grade(
+    bot_id: int,
+    grading_run_id: str,
+    objective_score: float,
+    quality_score: float,
+    human_score: float,
+    volume_score: float,
+    overall_score: float,
+    llm_reasoning: str,
+    total_messages: int,
+    total_conversations: int,
+    human_interactions: int,
+    input_hash: str | None = None,
+    reused_grade_id: int | None = None,
+) -> Grade:
+    async with writer() as db:
+        row = await (await db.execute(
+            f"""INSERT INTO grades
+               (bot_id, grading_run_id, objective_score, quality_score, human_score, volume_score,
+                overall_score, llm_reasoning, total_messages, total_conversations, human_interactions,
+                input_hash, reused_grade_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) RETURNING {_GRADE_COLUMNS}""",
+            (bot_id, grading_run_id, objective_score, quality_score, human_score, volume_score,
+             overall_score, llm_reasoning, total_messages, total_conversations, human_interactions,
+             input_hash, reused_grade_id),
+        )).fetchone()
+        grade = Grade(*row)
+        # Completes the bot's entry in the run's job list, atomically with the grade.
+        await db.execute(
+            """UPDATE grading_run_bots SET status = 'done', grade_id = ?, error = NULL
+               WHERE run_id = ? AND bot_id = ?""",
+            (grade.id, grading_run_id, bot_id),
+        )
+        return grade
+
+
+async def get_bot_grades(bot_id: int) -> list[Grade]:
+    async with reader() as db:
+        rows = await (await db.execute(
+            f"SELECT {_GRADE_COLUMNS} FROM grades WHERE bot_id = ? ORDER BY created_ms DESC, id DESC", (bot_id,)
+        )).fetchall()
+        return [Grade(*r) for r in rows]
+
+
+async def get_grades(
+    limit: int = 100, bot_id: int | None = None, before: PageKey | None = None
+) -> list[Grade]:
+    """Grade history, newest first; pass the last row's page key as ``before`` for the next page."""
+    clauses: list[str] = []
+    params: list[Any] = []
+    if bot_id is not None:
+        clauses.append("bot_id = ?")
+        params.append(bot_id)
+    if before is not None:
+        clauses.append("(created_ms, id) < (?, ?)")
+        params.extend(before)
+    async with reader() as db:
+        rows = await (await db.execute(
+            f"SELECT {_GRADE_COLUMNS} FROM grades {_where(clauses)} ORDER BY created_ms DESC, id DESC LIMIT ?",
+            (*params, limit),
+        )).fetchall()
+        return [Grade(*r) for r in rows]
+
+
+@_cached("latest_grades")
+async def get_latest_grades() -> list[Grade]:
+    """The leaderboard: each bot's grade from the last finished run that graded it, best first."""
+    async with reader() as db:
+        rows = await (await db.execute(
+            f"""SELECT {_columns(Grade, "g.")} FROM latest_grades l
+               JOIN grades g ON g.id = l.grade_id
+               ORDER BY l.overall_score DESC"""
+        )).fetchall()
+        return [Grade(*r) for r in rows]
+
+
+async def get_grades_by_input_hash(input_hashes: Iterable[str]) -> dict[str, Grade]:
+    """The newest grade for each of the given prompt hashes; hashes never graded are absent."""
+    found: dict[str, Grade] = {}
+    async with reader() as db:
+        for chunk in _chunks(input_hashes):
+            rows = await (await db.execute(
+                f"""SELECT {_GRADE_COLUMNS} FROM grades
+                    WHERE input_hash IN ({_placeholders(len(chunk))}) ORDER BY id""",
+                chunk,
+            )).fetchall()
+            for r in rows:
+                grade = Grade(*r)
+                found[grade.input_hash] = grade  # type: ignore[index]
+    return found
+
+
+async def get_grades_by_run(grading_run_id: str) -> list[Grade]:
+    async with reader() as db:
+        rows = await (await db.execute(
+            f"SELECT {_GRADE_COLUMNS} FROM grades WHERE grading_run_id = ? ORDER BY overall_score DESC",
+            (grading_run_id,),
+        )).fetchall()
+        return [Grade(*r) for r in rows]
+
+
+# ── Grading Runs ──────────────────────────────────────────────────
+# A run is a background job: 'queued' when created with its list of bots,
+# 'running' while grades are written, and 'finished' in the same
+# transaction that swaps them into latest_grades, so the leaderboard never
+# shows a half-graded run. Runs left queued or running by a restart are
+# picked up again with the bots still pending.
+
+async def create_grading_run(
+    run_id: str,
+    bot_ids: Iterable[int],
+    full_run: bool = False,
+    triggered_by: str = "manual",
+    batch_mode: bool = False,
+) -> GradingRun:
+    async with writer() as db:
+        row = await (await db.execute(
+            f"""INSERT INTO grading_runs (id, status, full_run, triggered_by, batch_mode)
+                VALUES (?, 'queued', ?, ?, ?) RETURNING {_RUN_COLUMNS}""",
+            (run_id, int(full_run), triggered_by, int(batch_mode)),
+        )).fetchone()
+        await db.executemany(
+            "INSERT OR IGNORE INTO grading_run_bots (run_id, bot_id) VALUES (?, ?)",
+            [(run_id, bot_id) for bot_id in bot_ids],
+        )
+        return _row_to_run(row)
+
+
+async def start_grading_run(run_id: str) -> GradingRun:
+    """Mark a queued run running; a resumed run keeps its original start time."""
+    async with writer() as db:
+        row = await (await db.execute(
+            f"""UPDATE grading_runs
+                SET started_ms = CASE WHEN status = 'queued' THEN {_NOW_MS} ELSE started_ms END,
+                    status = 'running'
+                WHERE id = ? RETURNING {_RUN_COLUMNS}""",
+            (run_id,),
+        )).fetchone()
+        if row is None:
+            raise KeyError(run_id)
+        return _row_to_run(row)
+
+
+async def finish_grading_run(run_id: str) -> GradingRun:
+    """Mark the run finished and publish its grades as the current leaderboard.
+
+    Bots the run did not grade keep their previous entry.
+    """
+    async with writer() as db:
+        await db.execute(
+            """INSERT INTO latest_grades (bot_id, grade_id, overall_score)
+               SELECT bot_id, id, overall_score FROM grades WHERE grading_run_id = ? ORDER BY id
+               ON CONFLICT(bot_id) DO UPDATE SET grade_id = excluded.grade_id,
+                                                 overall_score = excluded.overall_score""",
+            (run_id,),
+        )
+        row = await (await db.execute(
+            f"""UPDATE grading_runs
+                SET status = 'finished', finished_ms = {_NOW_MS},
+                    bot_count = (SELECT COUNT(*) FROM grades WHERE grading_run_id = ?)
+                WHERE id = ? RETURNING {_RUN_COLUMNS}""",
+            (run_id, run_id),
+        )).fetchone()
+    _cache.invalidate("latest_grades")
+    return _row_to_run(row)
+
+
+async def set_grading_run_batch(run_id: str, batch_id: str) -> None:
+    async with writer() as db:
+        await db.execute("UPDATE grading_runs SET batch_id = ? WHERE id = ?", (batch_id, run_id))
+
+
+async def fail_grading_run(run_id: str) -> None:
+    """Close the run without touching the leaderboard; its grades stay in the history."""
+    async with writer() as db:
+        await db.execute(
+            f"""UPDATE grading_runs
+                SET status = 'failed', finished_ms = {_NOW_MS},
+                    bot_count = (SELECT COUNT(*) FROM grades WHERE grading_run_id = ?)
+                WHERE id = ?""",
+            (run_id, run_id),
+        )
+
+
+async def get_grading_run(run_id: str) -> GradingRun | None:
+    async with reader() as db:
+        row = await (await db.execute(
+            f"SELECT {_RUN_COLUMNS} FROM grading_runs WHERE id = ?", (run_id,)
+        )).fetchone()
+        return _row_to_run(row) if row else None
+
+
+async def get_grading_runs(limit: int = 50) -> list[GradingRun]:
+    """Most recent runs first."""
+    async with reader() as db:
+        rows = await (await db.execute(
+            f"SELECT {_RUN_COLUMNS} FROM grading_runs ORDER BY started_ms DESC, id DESC LIMIT ?", (limit,)
+        )).fetchall()
+        return [_row_to_run(r) for r in rows]
+
+
+async def get_unfinished_grading_runs() -> list[GradingRun]:
+    """Runs still queued or running, oldest first: the grading worker's backlog."""
+    async with reader() as db:
+        rows = await (await db.execute(
+            f"""SELECT {_RUN_COLUMNS} FROM grading_runs WHERE status IN ('queued', 'running')
+                ORDER BY started_ms, id"""
+        )).fetchall()
+        return [_row_to_run(r) for r in rows]
+
+
+async def fail_grading_bot(run_id: str, bot_id: int, error: str) -> None:
+    async with writer() as db:
+        await db.execute(
+            "UPDATE grading_run_bots SET status = 'failed', error = ? WHERE run_id = ? AND bot_id = ?",
+            (error, run_id, bot_id),
+        )
+
+
+async def get_grading_run_bots(run_id: str) -> list[GradingRunBot]:
+    async with reader() as db:
+        rows = await (await db.execute(
+            f"SELECT {_RUN_BOT_COLUMNS} FROM grading_run_bots WHERE run_id = ? ORDER BY bot_id", (run_id,)
+        )).fetchall()
+        return [GradingRunBot(*r) for r in rows]
+
+
+# ── Bot Memory ────────────────────────────────────────────────────────
+
+async def get_bot_memory(bot_id: int) -> BotMemory | None:
+    async with reader() as db:
+        row = await (await db.execute(
+            f"SELECT {_MEMORY_COLUMNS} FROM bot_memory WHERE bot_id = ?", (bot_id,)
+        )).fetchone()
+        return BotMemory(*row) if row else None
+
+
+async def save_bot_memory(bot_id: int, summary: str, last_conversation_id: int) -> BotMemory:
+    async with writer() as db:
+        row = await (await db.execute(
+            f"""INSERT INTO bot_memory (bot_id, summary, last_conversation_id, updated_ms)
+                VALUES (?, ?, ?, {_NOW_MS})
+                ON CONFLICT(bot_id) DO UPDATE SET summary = excluded.summary,
+                    last_conversation_id = excluded.last_conversation_id, updated_ms = excluded.updated_ms
+                RETURNING {_MEMORY_COLUMNS}""",
+            (bot_id, summary, last_conversation_id),
+        )).fetchone()
+        return BotMemory(*row)
+
+
+# ── Stats ─────────────────────────────────────────────────────────────
+# Counters live in the bot_stats table and are kept current by triggers
+# (see migrations/002_bot_stats.sql).
+
+_STAT_KEYS = ("messages", "conversations", "human_interactions")
+
+
+def _row_to_stats(row: tuple[int, ...] | None) -> dict[str, int]:
+    return dict(zip(_STAT_KEYS, row or (0, 0, 0)))
+
+
+async def get_bot_stats(bot_id: int) -> dict[str, int]:
+    async with reader() as db:
+        row = await (await db.execute(
+            "SELECT messages, conversations, human_interactions FROM bot_stats WHERE bot_id = ?", (bot_id,)
+        )).fetchone()
+        return _row_to_stats(row)
+
+
+async def get_all_bot_stats() -> dict[int, dict[str, int]]:
+    """Return stats for every bot, keyed by bot id (zeros for bots with no activity)."""
+    async with reader() as db:
+        rows = await (await db.execute(
+            """SELECT b.id, COALESCE(s.messages, 0), COALESCE(s.conversations, 0),
+                      COALESCE(s.human_interactions, 0)
+               FROM bots b LEFT JOIN bot_stats s ON s.bot_id = b.id"""
+        )).fetchall()
+        return {r[0]: _row_to_stats(r[1:]) for r in rows}
+
+
+_STAT_COUNTS = (
+    "(SELECT COUNT(*) FROM {s}.messages m WHERE m.bot_id = b.id)",
+    """(SELECT COUNT(*) FROM {s}.conversations c
+       WHERE c.initiator_bot_id = b.id OR c.responder_bot_id = b.id
+          OR c.id IN (SELECT conversation_id FROM {s}.messages WHERE bot_id = b.id))""",
+    """(SELECT COUNT(DISTINCT m.conversation_id) FROM {s}.messages m
+        JOIN {s}.conversations c ON c.id = m.conversation_id
+       WHERE m.author_type = 'human'
+         AND (c.initiator_bot_id = b.id OR c.responder_bot_id = b.id
+              OR c.id IN (SELECT conversation_id FROM {s}.messages WHERE bot_id = b.id)))""",
+)
+
+
+async def rebuild_bot_stats() -> int:
+    """Recompute every bot's counters from the full history, archives included.
+
+    A conversation and its messages always sit in the same tier, so each
+    counter is the sum of the per-tier counts. Returns the number of bots rebuilt.
+    """
+    async with writer() as db:
+        async with attached_archives(db) as schemas:
+            counts = ",\n".join(" + ".join(c.format(s=s) for s in schemas) for c in _STAT_COUNTS)
+            await db.execute("DELETE FROM bot_stats")
+            cursor = await db.execute(
+                f"""INSERT INTO bot_stats (bot_id, messages, conversations, human_interactions)
+                    SELECT b.id, {counts} FROM bots b"""
+            )
+            return cursor.rowcount
@@ -0,0 +1,201 @@
+"""The storage interface behind ``mktbook.db.queries``.
+
+Two backends implement :class:`Storage`:
+
+- ``sqlite`` (default): :mod:`mktbook.db.sqlite_storage`, the aiosqlite
+  database with group commit, full-text search and archive tiers.
+- ``memory``: :class:`mktbook.db.memory_storage.MemoryStorage`, indexed
+  dicts in the process. Nothing is persisted; it exists for load-testing the
+  scheduler and fleet without disk I/O and as a baseline in benchmarks.
+
+``settings.storage_backend`` picks one at first use.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Iterable, Protocol
+
+from mktbook.config import settings
+from mktbook.db.models import Bot, BotMemory, Conversation, Grade, GradingRun, GradingRunBot, Message, SearchHit
+
+# Keyset pagination: a page key is the (epoch ms, id) of the last row seen.
+# Ordering on both columns keeps pages stable when timestamps collide.
+PageKey = tuple[int, int]
+
+
+class Storage(Protocol):
+    """Every read and write the app makes.
+
+    ``queue_*`` calls return a future right away so that callers can batch
+    writes; ``iter_*`` calls return async iterators. Backends without
+    archive tiers ignore ``include_archive``.
+    """
+
+    def cache_stats(self) -> dict[str, int]: ...
+
+    # ── Bots ──
+    async def create_bot(
+        self,
+        student_name: str,
+        bot_name: str,
+        discord_token: str,
+        personality: str = "",
+        objective: str = "",
+        behavior_rules: str = "",
+    ) -> Bot: ...
+    async def get_bot(self, bot_id: int) -> Bot | None: ...
+    async def get_bot_by_name(self, bot_name: str) -> Bot | None: ...
+    async def get_bots_by_ids(self, bot_ids: Iterable[int]) -> dict[int, Bot]: ...
+    async def get_all_bots(self) -> list[Bot]: ...
+    async def get_active_bots(self) -> list[Bot]: ...
+    async def update_bot(self, bot_id: int, **fields: Any) -> Bot | None: ...
+    async def delete_bot(self, bot_id: int) -> None: ...
+
+    # ── Conversations ──
+    async def create_conversation(
+        self,
+        channel_id: str | None,
+        conv_type: str,
+        initiator_bot_id: int | None,
+        responder_bot_id: int | None,
+    ) -> Conversation: ...
+    def queue_conversation(
+        self,
+        channel_id: str | None,
+        conv_type: str,
+        initiator_bot_id: int | None,
+        responder_bot_id: int | None,
+    ) -> asyncio.Future[Conversation]: ...
+    async def end_conversation(self, conv_id: int, turn_count: int) -> None: ...
+    def queue_end_conversation(self, conv_id: int, turn_count: int) -> asyncio.Future[None]: ...
+    async def get_conversations(self, limit: int = 50, before: PageKey | None = None) -> list[Conversation]: ...
+    def iter_conversations(
+        self, after: PageKey | None = None, include_archive: bool = False
+    ) -> AsyncIterator[Conversation]: ...
+    async def get_bot_conversations(self, bot_id: int, limit: int = 50) -> list[Conversation]: ...
+    async def get_recent_conversations_for_bots(
+        self, bot_ids: Iterable[int], per_bot: int = 5, include_archive: bool = False
+    ) -> dict[int, list[Conversation]]: ...
+    async def get_conversations_since(
+        self, bot_id: int, after_id: int, limit: int = 20
+    ) -> list[Conversation]: ...
+
+    # ── Messages ──
+    async def create_message(
+        self,
+        conversation_id: int | None,
+        bot_id: int | None,
+        author_type: str,
+        author_name: str,
+        content: str,
+        discord_msg_id: str | None = None,
+    ) -> Message: ...
+    def queue_message(
+        self,
+        conversation_id: int | None,
+        bot_id: int | None,
+        author_type: str,
+        author_name: str,
+        content: str,
+        discord_msg_id: str | None = None,
+    ) -> asyncio.Future[Message]: ...
+    async def get_conversation_messages(self, conv_id: int, include_archive: bool = False) -> list[Message]: ...
+    async def get_messages_for_conversations(
+        self, conv_ids: Iterable[int], include_archive: bool = False
+    ) -> dict[int, list[Message]]: ...
+    async def get_messages(
+        self, limit: int = 100, bot_id: int | None = None, before: PageKey | None = None
+    ) -> list[Message]: ...
+    def iter_messages(
+        self, bot_id: int | None = None, after: PageKey | None = None, include_archive: bool = False
+    ) -> AsyncIterator[Message]: ...
+
+    # ── Search ──
+    async def search_messages(
+        self,
+        query: str,
+        bot_id: int | None = None,
+        author_type: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> list[SearchHit]: ...
+    async def index_pending_messages(self, batch_size: int = 1000) -> int: ...
+    async def rebuild_search_index(self) -> int: ...
+
+    # ── Conversation Pairs ──
+    async def get_pair_counts(self) -> dict[tuple[int, int], int]: ...
+    async def increment_pair(self, bot_a_id: int, bot_b_id: int) -> None: ...
+    def queue_increment_pair(self, bot_a_id: int, bot_b_id: int) -> asyncio.Future[None]: ...
+
+    # ── Grades ──
+    async def create_grade(
+        self,
+        bot_id: int,
+        grading_run_id: str,
+        objective_score: float,
+        quality_score: float,
+        human_score: float,
+        volume_score: float,
+        overall_score: float,
+        llm_reasoning: str,
+        total_messages: int,
+        total_conversations: int,
+        human_interactions: int,
+        input_hash: str | None = None,
+        reused_grade_id: int | None = None,
+    ) -> Grade: ...
+    async def get_bot_grades(self, bot_id: int) -> list[Grade]: ...
+    async def get_grades(
+        self, limit: int = 100, bot_id: int | None = None, before: PageKey | None = None
+    ) -> list[Grade]: ...
+    async def get_latest_grades(self) -> list[Grade]: ...
+    async def get_grades_by_input_hash(self, input_hashes: Iterable[str]) -> dict[str, Grade]: ...
+    async def get_grades_by_run(self, grading_run_id: str) -> list[Grade]: ...
+
+    # ── Grading Runs ──
+    async def create_grading_run(
+        self,
+        run_id: str,
+        bot_ids: Iterable[int],
+        full_run: bool = False,
+        triggered_by: str = "manual",
+        batch_mode: bool = False,
+    ) -> GradingRun: ...
+    async def start_grading_run(self, run_id: str) -> GradingRun: ...
+    async def finish_grading_run(self, run_id: str) -> GradingRun: ...
+    async def set_grading_run_batch(self, run_id: str, batch_id: str) -> None: ...
+    async def fail_grading_run(self, run_id: str) -> None: ...
+    async def get_grading_run(self, run_id: str) -> GradingRun | None: ...
+    async def get_grading_runs(self, limit: int = 50) -> list[GradingRun]: ...
+    async def get_unfinished_grading_runs(self) -> list[GradingRun]: ...
+    async def fail_grading_bot(self, run_id: str, bot_id: int, error: str) -> None: ...
+    async def get_grading_run_bots(self, run_id: str) -> list[GradingRunBot]: ...
+
+    # ── Bot Memory ──
+    async def get_bot_memory(self, bot_id: int) -> BotMemory | None: ...
+    async def save_bot_memory(self, bot_id: int, summary: str, last_conversation_id: int) -> BotMemory: ...
+
+    # ── Stats ──
+    async def get_bot_stats(self, bot_id: int) -> dict[str, int]: ...
+    async def get_all_bot_stats(self) -> dict[int, dict[str, int]]: ...
+    async def rebuild_bot_stats(self) -> int: ...
+
+
+STORAGE_NAMES = frozenset(name for name in vars(Storage) if not name.startswith("_"))
+
+_storage: Storage | None = None
+
+
+def get_storage() -> Storage:
+    """The backend named by ``settings.storage_backend``, created on first use."""
+    global _storage
+    if _storage is None:
+        if settings.storage_backend == "memory":
+            from mktbook.db.memory_storage import MemoryStorage
+            _storage = MemoryStorage()
+        else:
+            from mktbook.db import sqlite_storage
+            _storage = sqlite_storage  # the module implements the protocol
+    return _storage
@@ -0,0 +1,175 @@
+"""Batch clients for offline grading.
+
+A batch run writes every grading request to one JSONL file in the OpenAI
+Batch API input format (``custom_id``, ``method``, ``url``, ``body`` per
+line), submits it through a :class:`BatchClient`, polls until the batch is
+done, and reads back result lines in the Batch API output format.
+``grading_batch_client`` picks the implementation:
+
+- ``openai``: the OpenAI Batch API. Slower (up to 24 hours) but cheaper,
+  and it draws on a separate rate limit, so it leaves the live budget to
+  the bots.
+- ``local``: a file-based stand-in under ``grading_batch_dir``. It answers
+  the requests itself through the LLM gateway, so it makes live calls; use
+  it to try the batch code path without the Batch API.
+- ``manual``: the same stand-in without a gateway. It makes no LLM calls
+  and waits for someone to drop an ``<id>.output.jsonl`` file next to the
+  input, so batch runs can be tried fully offline.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import pathlib
+import shutil
+import uuid
+from typing import TYPE_CHECKING, Any, Protocol
+
+from mktbook.config import settings
+from mktbook.llm.gateway import Priority
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+    from mktbook.llm.gateway import LLMGateway
+
+log = logging.getLogger(__name__)
+
+# Statuses after which a batch will not change any more.
+BATCH_DONE = frozenset({"completed", "failed", "expired", "cancelled"})
+
+
+class BatchClient(Protocol):
+    async def submit(self, input_path: pathlib.Path) -> str:
+        """Submit a JSONL request file; returns the batch id."""
+        ...
+
+    async def status(self, batch_id: str) -> str:
+        """The batch's status, e.g. ``in_progress``; see :data:`BATCH_DONE`."""
+        ...
+
+    async def results(self, batch_id: str) -> list[dict[str, Any]]:
+        """Output and error lines of a finished batch, in any order."""
+        ...
+
+
+def _read_jsonl(path: pathlib.Path) -> list[dict[str, Any]]:
+    with path.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class OpenAIBatchClient:
+    """The OpenAI Batch API for ``/v1/chat/completions``."""
+
+    def __init__(self, client: AsyncOpenAI) -> None:
+        self.client = client
+
+    async def submit(self, input_path: pathlib.Path) -> str:
+        with input_path.open("rb") as f:
+            uploaded = await self.client.files.create(file=f, purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=uploaded.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        return batch.id
+
+    async def status(self, batch_id: str) -> str:
+        return (await self.client.batches.retrieve(batch_id)).status
+
+    async def results(self, batch_id: str) -> list[dict[str, Any]]:
+        batch = await self.client.batches.retrieve(batch_id)
+        lines: list[dict[str, Any]] = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await self.client.files.content(file_id)
+                lines.extend(json.loads(line) for line in content.text.splitlines() if line.strip())
+        return lines
+
+
+class LocalBatchClient:
+    """File-based stand-in for a batch service.
+
+    ``<id>.input.jsonl`` is the submitted batch; the batch is complete once
+    ``<id>.output.jsonl`` exists. With a gateway the client writes that file
+    itself, one request at a time at grading priority.
+    """
+
+    def __init__(self, directory: pathlib.Path, llm: LLMGateway | None = None) -> None:
+        self.directory = directory
+        self.llm = llm
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+
+    def _path(self, batch_id: str, kind: str) -> pathlib.Path:
+        return self.directory / f"{batch_id}.{kind}.jsonl"
+
+    async def submit(self, input_path: pathlib.Path) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        batch_id = f"local-{uuid.uuid4().hex[:12]}"
+        shutil.copyfile(input_path, self._path(batch_id, "input"))
+        self._answer(batch_id)
+        return batch_id
+
+    async def status(self, batch_id: str) -> str:
+        if self._path(batch_id, "output").exists():
+            return "completed"
+        if not self._path(batch_id, "input").exists():
+            return "failed"
+        task = self._tasks.get(batch_id)
+        if task is not None and task.done():
+            del self._tasks[batch_id]
+            if not task.cancelled() and (exc := task.exception()) is not None:
+                log.error("Local batch %s failed", batch_id, exc_info=exc)
+                return "failed"
+        self._answer(batch_id)  # picks a batch back up after a restart
+        return "in_progress"
+
+    async def results(self, batch_id: str) -> list[dict[str, Any]]:
+        return _read_jsonl(self._path(batch_id, "output"))
+
+    def _answer(self, batch_id: str) -> None:
+        if self.llm is not None and batch_id not in self._tasks:
+            self._tasks[batch_id] = asyncio.create_task(self._process(batch_id, self.llm))
+
+    async def _process(self, batch_id: str, llm: LLMGateway) -> None:
+        lines: list[dict[str, Any]] = []
+        for request in _read_jsonl(self._path(batch_id, "input")):
+            body = request["body"]
+            try:
+                resp = await llm.chat(
+                    Priority.GRADING,
+                    body["messages"],
+                    max_tokens=body["max_tokens"],
+                    temperature=body["temperature"],
+                    model=body.get("model"),
+                )
+            except Exception as exc:
+                log.warning("Local batch %s: request %s failed: %s", batch_id, request["custom_id"], exc)
+                lines.append({
+                    "custom_id": request["custom_id"], "response": None,
+                    "error": {"code": type(exc).__name__, "message": str(exc)},
+                })
+                continue
+            lines.append({
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {"choices": [{"index": 0, "message": {
+                        "role": "assistant", "content": resp.choices[0].message.content,
+                    }}]},
+                },
+                "error": None,
+            })
+
+        output = self._path(batch_id, "output")
+        partial = output.with_name(output.name + ".partial")
+        partial.write_text("".join(json.dumps(line) + "\n" for line in lines), encoding="utf-8")
+        partial.replace(output)
+        log.info("Local batch %s answered (%d requests)", batch_id, len(lines))
+
+
+def create_batch_client(llm: LLMGateway) -> BatchClient:
+    """The batch client selected by ``grading_batch_client``."""
+    if settings.grading_batch_client in ("local", "manual"):
+        answer_with = llm if settings.grading_batch_client == "local" else None
+        return LocalBatchClient(pathlib.Path(settings.grading_batch_dir) / "local", answer_with)
+    return OpenAIBatchClient(llm.client)
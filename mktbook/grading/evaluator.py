@@ -1,14 +1,32 @@
-"""LLM-based grading evaluator."""
+"""LLM-based grading evaluator.
+
+Runs are incremental by default. Each bot's grading prompt is rendered
+first and hashed together with the system prompt and model. If an
+earlier grade was made from the same hash, the bot has had no new
+activity and no config change since then. Its verdict is copied into
+the new run without an LLM call. ``full=True`` re-grades every bot,
+e.g. for final grades.
+
+Bots are graded concurrently, at most ``grading_concurrency`` at a time.
+Each finished bot is broadcast as a ``grading_progress`` event. A batch
+run sends all prompts as one job through a batch client instead (see
+grading/batch.py) and ingests the answers when the batch is done.
+"""
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import logging
-
-from openai import AsyncOpenAI
+import pathlib
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
 
 from mktbook.config import settings
 from mktbook.db import queries
-from mktbook.db.models import Grade
+from mktbook.db.models import Bot, Conversation, Grade, GradingRun, Message
+from mktbook.grading.batch import BATCH_DONE, BatchClient, create_batch_client
 from mktbook.grading.criteria import (
     GRADING_SYSTEM_PROMPT,
     GRADING_USER_TEMPLATE,
@@ -17,32 +35,318 @@ from mktbook.grading.criteria import (
     WEIGHT_QUALITY,
     WEIGHT_VOLUME,
 )
+from mktbook.llm.gateway import LLMGateway, Priority
+
+if TYPE_CHECKING:
+    from mktbook.web.websocket import WSManager
 
 log = logging.getLogger(__name__)
 
+SAMPLE_CONVERSATIONS = 5
+GRADING_MAX_TOKENS = 512
+GRADING_TEMPERATURE = 0.2
+
+
+def grading_messages(user_prompt: str) -> list[dict[str, str]]:
+    return [
+        {"role": "system", "content": GRADING_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def prompt_hash(user_prompt: str) -> str:
+    """Cache key for a grading verdict: the rendered prompt plus everything else sent with it."""
+    h = hashlib.sha256()
+    for part in (settings.openai_model, GRADING_SYSTEM_PROMPT, user_prompt):
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+@dataclass(slots=True)
+class _BotInput:
+    """A bot to grade and what its grade is based on."""
+
+    bot: Bot
+    stats: dict[str, int]
+    prompt: str
+    input_hash: str
+
 
 class GradeEvaluator:
-    def __init__(self, openai_client: AsyncOpenAI) -> None:
-        self.openai = openai_client
+    def __init__(
+        self, llm: LLMGateway, ws: WSManager | None = None, batch_client: BatchClient | None = None
+    ) -> None:
+        self.llm = llm
+        self.ws = ws
+        self.batch_client = batch_client
+        # Wall-clock time of the last run against the summed per-bot time.
+        self.timing: dict[str, float] = {}
+
+    async def grade_all(self, run_id: str, full: bool = False, batch: bool = False) -> list[Grade]:
+        """Create run ``run_id`` for every active bot and grade it now.
 
-    async def grade_all(self, run_id: str) -> list[Grade]:
+        The app queues runs through grading/jobs.py instead; this is the
+        direct path for scripts.
+        """
         bots = await queries.get_active_bots()
-        results: list[Grade] = []
+        await queries.create_grading_run(run_id, [b.id for b in bots], full_run=full, batch_mode=batch)
+        return await self.grade_run(run_id)
 
+    async def grade_run(self, run_id: str) -> list[Grade]:
+        """Grade the bots still pending in ``run_id``; returns the grades written now.
+
+        Bots whose grading prompt is unchanged since an earlier grade keep
+        that verdict unless the run is a full run. The leaderboard switches
+        to the run's grades only once it finishes. A run that raises is
+        recorded as failed; a cancelled one stays running, to be resumed.
+        """
+        run = await queries.start_grading_run(run_id)
+        try:
+            results = await self._grade_run(run)
+        except Exception:
+            await queries.fail_grading_run(run_id)
+            raise
+        await queries.finish_grading_run(run_id)
+        return results
+
+    async def _grade_run(self, run: GradingRun) -> list[Grade]:
+        entries = await queries.get_grading_run_bots(run.id)
+        bots_by_id = {b.id: b for b in await queries.get_all_bots()}
+        bots: list[Bot] = []
+        for entry in entries:
+            if entry.status != "pending":
+                continue
+            if entry.bot_id in bots_by_id:
+                bots.append(bots_by_id[entry.bot_id])
+            else:
+                await queries.fail_grading_bot(run.id, entry.bot_id, "bot no longer exists")
+        if len(bots) < len(entries):
+            log.info("Grading run %s: %d of %d bots left to grade", run.id, len(bots), len(entries))
+
+        if run.batch_mode:
+            return await self._grade_batch(run, bots, len(entries))
+        return await self._grade_live(run, bots, len(entries))
+
+    async def _prepare(self, bots: list[Bot], full: bool) -> tuple[list[_BotInput], dict[str, Grade]]:
+        """Render each bot's prompt; also returns earlier grades to reuse, by prompt hash."""
+        # Everything the prompts need is fetched up front in a fixed number of
+        # queries, however many bots there are. Samples may come from the
+        # archives for bots that have been quiet lately.
+        all_stats = await queries.get_all_bot_stats()
+        convs_by_bot = await queries.get_recent_conversations_for_bots(
+            [b.id for b in bots], per_bot=SAMPLE_CONVERSATIONS, include_archive=True
+        )
+        msgs_by_conv = await queries.get_messages_for_conversations(
+            (c.id for convs in convs_by_bot.values() for c in convs), include_archive=True
+        )
+
+        inputs: list[_BotInput] = []
         for bot in bots:
-            try:
-                grade = await self._grade_bot(bot, run_id)
+            prompt = self._build_user_prompt(
+                bot, all_stats[bot.id], self._build_sample_conversations(convs_by_bot[bot.id], msgs_by_conv)
+            )
+            inputs.append(_BotInput(bot, all_stats[bot.id], prompt, prompt_hash(prompt)))
+        previous = {} if full else await queries.get_grades_by_input_hash(i.input_hash for i in inputs)
+        return inputs, previous
+
+    async def _grade_live(self, run: GradingRun, bots: list[Bot], total: int) -> list[Grade]:
+        run_id = run.id
+        inputs, previous = await self._prepare(bots, run.full_run)
+
+        concurrency = max(settings.grading_concurrency, 1)
+        slots = asyncio.Semaphore(concurrency)
+        bot_seconds = 0.0
+        done = total - len(bots)
+
+        async def grade_one(item: _BotInput) -> Grade | None:
+            # A failure is logged and reported for this bot only; the others keep going.
+            nonlocal bot_seconds, done
+            bot = item.bot
+            grade: Grade | None = None
+            async with slots:
+                start = time.perf_counter()
+                try:
+                    earlier = previous.get(item.input_hash)
+                    if earlier is not None:
+                        grade = await self._carry_forward(earlier, bot, run_id)
+                    else:
+                        grade = await self._grade_bot(item, run_id)
+                except Exception as exc:
+                    log.exception("Failed to grade bot %s", bot.bot_name)
+                    await queries.fail_grading_bot(run_id, bot.id, f"{type(exc).__name__}: {exc}")
+                elapsed = time.perf_counter() - start
+            bot_seconds += elapsed
+            done += 1
+            await self._report_progress(run_id, bot, grade, done, total, elapsed)
+            return grade
+
+        start = time.perf_counter()
+        graded = await asyncio.gather(*(grade_one(item) for item in inputs))
+        wall = time.perf_counter() - start
+        results = [g for g in graded if g is not None]
+        reused = sum(g.reused_grade_id is not None for g in results)
+
+        self.timing = {
+            "wall_seconds": round(wall, 3),
+            "bot_seconds": round(bot_seconds, 3),
+            "speedup": round(bot_seconds / wall, 2) if wall > 0 else 1.0,
+            "concurrency": concurrency,
+        }
+        log.info(
+            "Grading run %s%s: %d bots graded, %d unchanged and carried forward, %d failed; "
+            "%.1fs wall-clock for %.1fs of per-bot work (%.1fx at concurrency %d)",
+            run_id, " (full run)" if run.full_run else "", len(results) - reused, reused,
+            len(bots) - len(results), wall, bot_seconds, self.timing["speedup"], concurrency,
+        )
+        return results
+
+    # ── Batch runs ──
+
+    async def _grade_batch(self, run: GradingRun, bots: list[Bot], total: int) -> list[Grade]:
+        """Carry unchanged bots forward, send the rest as one batch, and ingest its answers.
+
+        A resumed run whose batch was already submitted only waits for it.
+        """
+        client = self.batch_client = self.batch_client or create_batch_client(self.llm)
+        start = time.perf_counter()
+        done = total - len(bots)
+        results: list[Grade] = []
+
+        if run.batch_id is None:
+            inputs, previous = await self._prepare(bots, run.full_run)
+            to_send: list[_BotInput] = []
+            for item in inputs:
+                earlier = previous.get(item.input_hash)
+                if earlier is None:
+                    to_send.append(item)
+                    continue
+                grade = await self._carry_forward(earlier, item.bot, run.id)
                 results.append(grade)
-            except Exception:
-                log.exception("Failed to grade bot %s", bot.bot_name)
+                done += 1
+                await self._report_progress(run.id, item.bot, grade, done, total, 0.0)
+            batch_id = await self._submit_batch(client, run.id, to_send) if to_send else None
+        else:
+            batch_id = run.batch_id
+            to_send = await self._load_batch_inputs(run.id, bots)
+            log.info("Grading run %s: waiting for batch %s submitted before the restart", run.id, batch_id)
+
+        failed = 0
+        if batch_id is not None:
+            while (status := await client.status(batch_id)) not in BATCH_DONE:
+                await asyncio.sleep(settings.grading_batch_poll_interval)
+            if status == "failed":
+                raise RuntimeError(f"batch {batch_id} failed")
+            if status != "completed":
+                log.warning("Grading run %s: batch %s ended %s; ingesting the answers it has",
+                            run.id, batch_id, status)
 
+            pending = {f"bot-{item.bot.id}": item for item in to_send}
+            for line in await client.results(batch_id):
+                item = pending.pop(line.get("custom_id", ""), None)
+                if item is None:
+                    continue
+                grade = await self._ingest_batch_line(item, run.id, line)
+                if grade is None:
+                    failed += 1
+                else:
+                    results.append(grade)
+                done += 1
+                await self._report_progress(run.id, item.bot, grade, done, total, time.perf_counter() - start)
+            for item in pending.values():
+                await queries.fail_grading_bot(run.id, item.bot.id, f"no answer in batch {batch_id} ({status})")
+                failed += 1
+
+        wall = time.perf_counter() - start
+        self.timing = {"wall_seconds": round(wall, 3)}
+        reused = sum(g.reused_grade_id is not None for g in results)
+        log.info(
+            "Grading run %s (batch %s): %d bots graded, %d unchanged and carried forward, %d failed in %.0fs",
+            run.id, batch_id or "not needed", len(results) - reused, reused, failed, wall,
+        )
         return results
 
-    async def _grade_bot(self, bot, run_id: str) -> Grade:
-        stats = await queries.get_bot_stats(bot.id)
-        sample_convos = await self._build_sample_conversations(bot.id)
+    @staticmethod
+    def _batch_files(run_id: str) -> tuple[pathlib.Path, pathlib.Path]:
+        directory = pathlib.Path(settings.grading_batch_dir)
+        return directory / f"run-{run_id}.jsonl", directory / f"run-{run_id}.meta.json"
+
+    async def _submit_batch(self, client: BatchClient, run_id: str, inputs: list[_BotInput]) -> str:
+        input_path, meta_path = self._batch_files(run_id)
+        input_path.parent.mkdir(parents=True, exist_ok=True)
+        with input_path.open("w", encoding="utf-8") as f:
+            for item in inputs:
+                request = {
+                    "custom_id": f"bot-{item.bot.id}",
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": settings.openai_model,
+                        "messages": grading_messages(item.prompt),
+                        "max_tokens": GRADING_MAX_TOKENS,
+                        "temperature": GRADING_TEMPERATURE,
+                    },
+                }
+                f.write(json.dumps(request) + "\n")
+        # What each grade is based on, so a restart can ingest the answers
+        # without rendering prompts that may have changed since.
+        meta_path.write_text(json.dumps({
+            str(item.bot.id): {"stats": item.stats, "input_hash": item.input_hash} for item in inputs
+        }), encoding="utf-8")
 
-        user_prompt = GRADING_USER_TEMPLATE.format(
+        batch_id = await client.submit(input_path)
+        await queries.set_grading_run_batch(run_id, batch_id)
+        log.info("Grading run %s: submitted batch %s with %d requests", run_id, batch_id, len(inputs))
+        return batch_id
+
+    async def _load_batch_inputs(self, run_id: str, bots: list[Bot]) -> list[_BotInput]:
+        _, meta_path = self._batch_files(run_id)
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        inputs: list[_BotInput] = []
+        for bot in bots:
+            entry = meta.get(str(bot.id))
+            if entry is None:
+                await queries.fail_grading_bot(run_id, bot.id, "not in the submitted batch")
+                continue
+            inputs.append(_BotInput(bot, entry["stats"], "", entry["input_hash"]))
+        return inputs
+
+    async def _ingest_batch_line(self, item: _BotInput, run_id: str, line: dict[str, Any]) -> Grade | None:
+        response = line.get("response") or {}
+        error = line.get("error")
+        try:
+            if error or response.get("status_code") != 200:
+                raise RuntimeError((error or {}).get("message") or f"HTTP {response.get('status_code')}")
+            raw = response["body"]["choices"][0]["message"]["content"] or "{}"
+            return await self._save_grade(item, run_id, raw)
+        except Exception as exc:
+            log.error("Batch answer for %s unusable: %s", item.bot.bot_name, exc)
+            await queries.fail_grading_bot(run_id, item.bot.id, f"{type(exc).__name__}: {exc}")
+            return None
+
+    async def _report_progress(
+        self, run_id: str, bot: Bot, grade: Grade | None, done: int, total: int, seconds: float
+    ) -> None:
+        if not self.ws:
+            return
+        event: dict[str, Any] = {
+            "type": "grading_progress",
+            "run_id": run_id,
+            "bot_id": bot.id,
+            "bot": bot.bot_name,
+            "done": done,
+            "total": total,
+            "seconds": round(seconds, 3),
+            "ok": grade is not None,
+        }
+        if grade is not None:
+            event["overall_score"] = grade.overall_score
+            event["reused"] = grade.reused_grade_id is not None
+        await self.ws.broadcast(event)
+
+    @staticmethod
+    def _build_user_prompt(bot: Bot, stats: dict[str, int], sample_convos: str) -> str:
+        return GRADING_USER_TEMPLATE.format(
             bot_name=bot.bot_name,
             student_name=bot.student_name,
             objective=bot.objective or "(not specified)",
@@ -54,17 +358,41 @@ class GradeEvaluator:
             sample_conversations=sample_convos or "(no conversations yet)",
         )
 
-        resp = await self.openai.chat.completions.create(
-            model=settings.openai_model,
-            messages=[
-                {"role": "system", "content": GRADING_SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt},
-            ],
-            max_tokens=512,
-            temperature=0.2,
+    @staticmethod
+    async def _carry_forward(earlier: Grade, bot: Bot, run_id: str) -> Grade:
+        """Copy ``earlier`` into this run; the prompt it was graded from has not changed."""
+        grade = await queries.create_grade(
+            bot_id=bot.id,
+            grading_run_id=run_id,
+            objective_score=earlier.objective_score,
+            quality_score=earlier.quality_score,
+            human_score=earlier.human_score,
+            volume_score=earlier.volume_score,
+            overall_score=earlier.overall_score,
+            llm_reasoning=earlier.llm_reasoning,
+            total_messages=earlier.total_messages,
+            total_conversations=earlier.total_conversations,
+            human_interactions=earlier.human_interactions,
+            input_hash=earlier.input_hash,
+            reused_grade_id=earlier.reused_grade_id or earlier.id,
+        )
+        log.info("Unchanged %s: %.1f carried forward from grade #%d",
+                 bot.bot_name, grade.overall_score, grade.reused_grade_id)
+        return grade
+
+    async def _grade_bot(self, item: _BotInput, run_id: str) -> Grade:
+        resp = await self.llm.chat(
+            Priority.GRADING,
+            grading_messages(item.prompt),
+            max_tokens=GRADING_MAX_TOKENS,
+            temperature=GRADING_TEMPERATURE,
         )
+        return await self._save_grade(item, run_id, resp.choices[0].message.content or "{}")
 
-        raw = resp.choices[0].message.content or "{}"
+    async def _save_grade(self, item: _BotInput, run_id: str, raw: str) -> Grade:
+        """Parse and weight an LLM verdict and store it as the bot's grade."""
+        bot, stats = item.bot, item.stats
+        input_hash: str | None = item.input_hash
         # Strip markdown fences if present
         raw = raw.strip()
         if raw.startswith("```"):
@@ -77,6 +405,7 @@ class GradeEvaluator:
             data = json.loads(raw)
         except json.JSONDecodeError:
             log.error("Failed to parse grading response for %s: %s", bot.bot_name, raw)
+            input_hash = None  # retry on the next run rather than carry a parse error forward
             data = {
                 "objective_score": 0,
                 "quality_score": 0,
@@ -109,20 +438,23 @@ class GradeEvaluator:
             total_messages=stats["messages"],
             total_conversations=stats["conversations"],
             human_interactions=stats["human_interactions"],
+            input_hash=input_hash,
         )
 
         log.info("Graded %s: %.1f (obj=%.0f, qual=%.0f, hum=%.0f, vol=%.0f)",
                  bot.bot_name, overall, obj, qual, hum, vol)
         return grade
 
-    async def _build_sample_conversations(self, bot_id: int, max_convos: int = 5) -> str:
-        conversations = await queries.get_bot_conversations(bot_id, limit=max_convos)
+    @staticmethod
+    def _build_sample_conversations(
+        conversations: list[Conversation], msgs_by_conv: dict[int, list[Message]]
+    ) -> str:
         if not conversations:
             return ""
 
         parts: list[str] = []
         for conv in conversations:
-            msgs = await queries.get_conversation_messages(conv.id)
+            msgs = msgs_by_conv.get(conv.id)
             if not msgs:
                 continue
             lines = [f"[{conv.type} conversation #{conv.id}]"]
@@ -10,7 +10,7 @@ from mktbook.db import queries
 async def export_csv() -> str:
     """Export latest grades for all bots as CSV text."""
     grades = await queries.get_latest_grades()
-    bots = {b.id: b for b in await queries.get_all_bots()}
+    bots = await queries.get_bots_by_ids(g.bot_id for g in grades)
 
     output = io.StringIO()
     writer = csv.writer(output)
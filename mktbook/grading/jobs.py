@@ -0,0 +1,102 @@
+"""Grading runs as persistent background jobs.
+
+:func:`enqueue_grading` records a queued run with one entry per active bot
+and returns at once. :func:`run_grading_worker` (started by main.py)
+grades queued live runs one at a time. Each bot's entry is marked done in the
+same transaction as its grade, so a run cut short by a restart resumes
+with only the bots still pending. Batch runs (grading/batch.py) can take
+hours, so each one waits in a task of its own while live runs carry on.
+An optional ``grading_schedule`` cron expression queues runs automatically,
+e.g. off-peak at night.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from mktbook.db import queries
+from mktbook.db.models import GradingRun
+from mktbook.grading.batch import BatchClient, create_batch_client
+from mktbook.grading.evaluator import GradeEvaluator
+from mktbook.scheduler.cron import parse_cron
+
+if TYPE_CHECKING:
+    from mktbook.llm.gateway import LLMGateway
+    from mktbook.web.websocket import WSManager
+
+log = logging.getLogger(__name__)
+
+_wakeup = asyncio.Event()
+
+
+async def enqueue_grading(full: bool = False, batch: bool = False, triggered_by: str = "manual") -> GradingRun:
+    """Queue a run for every active bot; the worker picks it up."""
+    run_id = str(uuid.uuid4())[:8]
+    bots = await queries.get_active_bots()
+    run = await queries.create_grading_run(
+        run_id, [b.id for b in bots], full_run=full, triggered_by=triggered_by, batch_mode=batch
+    )
+    log.info("Queued grading run %s for %d bots (%s%s%s)",
+             run_id, len(bots), triggered_by, ", full" if full else "", ", batch" if batch else "")
+    _wakeup.set()
+    return run
+
+
+async def _grade_run(llm: LLMGateway, ws: WSManager | None, batch_client: BatchClient, run_id: str) -> None:
+    evaluator = GradeEvaluator(llm, ws, batch_client)
+    try:
+        grades = await evaluator.grade_run(run_id)
+    except Exception:
+        log.exception("Grading run %s failed", run_id)
+        return
+    if ws:
+        await ws.broadcast({
+            "type": "grading_complete", "run_id": run_id, "count": len(grades), "timing": evaluator.timing,
+        })
+
+
+async def run_grading_worker(llm: LLMGateway, ws: WSManager | None = None) -> None:
+    """Grade queued runs, oldest first, until cancelled.
+
+    Cancelling mid-run leaves the run 'running' with its remaining bots
+    pending; the next worker resumes it.
+    """
+    batch_client = create_batch_client(llm)
+    batches: dict[str, asyncio.Task[None]] = {}
+    backlog = await queries.get_unfinished_grading_runs()
+    if backlog:
+        log.info("Resuming %d unfinished grading runs", len(backlog))
+
+    try:
+        while True:
+            _wakeup.clear()
+            batches = {run_id: task for run_id, task in batches.items() if not task.done()}
+            for run in await queries.get_unfinished_grading_runs():
+                if not run.batch_mode:
+                    await _grade_run(llm, ws, batch_client, run.id)
+                elif run.id not in batches:
+                    batches[run.id] = asyncio.create_task(_grade_run(llm, ws, batch_client, run.id))
+            await _wakeup.wait()
+    finally:
+        for task in batches.values():
+            task.cancel()
+
+
+async def run_grading_schedule(expr: str) -> None:
+    """Queue a grading run each time the cron expression ``expr`` comes due."""
+    schedule = parse_cron(expr)
+    while True:
+        due = schedule.next_after(datetime.now())
+        log.info("Next scheduled grading run at %s", due.isoformat(sep=" ", timespec="minutes"))
+        while (remaining := (due - datetime.now()).total_seconds()) > 0:
+            await asyncio.sleep(remaining)
+        try:
+            if await queries.get_unfinished_grading_runs():
+                log.info("Skipping scheduled grading run: a run is still queued or running")
+                continue
+            await enqueue_grading(triggered_by="schedule")
+        except Exception:
+            log.exception("Scheduled grading run could not be queued")
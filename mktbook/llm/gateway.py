@@ -0,0 +1,285 @@
+"""Shared gateway for every LLM call the app makes.
+
+One :class:`LLMGateway` (created in main.py) sits in front of the OpenAI
+client. It keeps the app inside the provider's requests-per-minute and
+tokens-per-minute budgets with two token buckets, caps concurrent requests,
+and admits waiting calls strictly by priority: human replies first, then
+scheduled bot-bot turns, then grading, then background memory summaries.
+A grading run therefore never delays a reply to a human, and bursts queue
+here instead of coming back as 429s.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections.abc import AsyncIterator
+from enum import IntEnum
+from typing import Any
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, RateLimitError
+
+from mktbook.config import settings
+
+log = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Admission order when calls are waiting; lower goes first."""
+
+    HUMAN = 0
+    CONVERSATION = 1
+    GRADING = 2
+    MEMORY = 3
+
+
+def create_openai_client() -> AsyncOpenAI:
+    """An OpenAI client whose connection pool matches the gateway's concurrency."""
+    pool = max(settings.llm_max_concurrency, 1)
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=pool, max_keepalive_connections=pool, keepalive_expiry=60.0),
+        timeout=httpx.Timeout(settings.llm_timeout, connect=10.0),
+    )
+    return AsyncOpenAI(api_key=settings.openai_api_key, http_client=http_client)
+
+
+def message_tokens(message: dict[str, str]) -> int:
+    """Rough token count of one chat message: ~4 characters per token plus framing."""
+    return len(message.get("content") or "") // 4 + 4
+
+
+def estimate_tokens(messages: list[dict[str, str]], max_tokens: int) -> int:
+    """Rough upper bound on a request's token cost: the prompt estimate plus the reply budget."""
+    return sum(message_tokens(m) for m in messages) + max_tokens
+
+
+class _TokenBucket:
+    """Refills continuously at ``per_minute / 60`` per second up to ``per_minute``; 0 means unlimited."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` can be taken (a request larger than the bucket waits for a full one)."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(missing, 0.0) * 60 / self.capacity
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            self._refill()
+            self.level -= amount
+
+    def give(self, amount: float) -> None:
+        if self.capacity > 0:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+    def available(self) -> float:
+        self._refill()
+        return self.level
+
+    def drain(self) -> None:
+        if self.capacity > 0:
+            self._refill()
+            self.level = min(self.level, 0.0)
+
+
+class LLMGateway:
+    """Rate-limited, prioritised access to chat completions."""
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        requests_per_minute: int | None = None,
+        tokens_per_minute: int | None = None,
+        max_concurrency: int | None = None,
+    ) -> None:
+        self.client = client
+        self.max_concurrency = max(max_concurrency or settings.llm_max_concurrency, 1)
+        self._requests = _TokenBucket(
+            settings.llm_requests_per_minute if requests_per_minute is None else requests_per_minute
+        )
+        self._tokens = _TokenBucket(settings.llm_tokens_per_minute if tokens_per_minute is None else tokens_per_minute)
+        self._seq = itertools.count()
+        self._waiting: list[tuple[int, int, float, asyncio.Future[None]]] = []
+        self._active = 0
+        self._wakeup: asyncio.TimerHandle | None = None
+        self._wakeup_at = 0.0
+        self._metrics = {
+            p.name.lower(): {
+                "requests": 0, "errors": 0, "rate_limited": 0, "tokens": 0,
+                "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+            }
+            for p in Priority
+        }
+
+    # ── Admission ──
+
+    async def _acquire(self, priority: Priority, cost: int) -> float:
+        """Wait for a slot and budget; returns how long the call queued."""
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        entry = (int(priority), next(self._seq), float(cost), fut)
+        heapq.heappush(self._waiting, entry)
+        start = time.monotonic()
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release()  # granted just as the caller gave up
+            raise
+        return time.monotonic() - start
+
+    def _dispatch(self) -> None:
+        """Admit waiting calls in priority order while slots and budget allow."""
+        while self._waiting:
+            _, _, cost, fut = self._waiting[0]
+            if fut.done():  # cancelled while queued
+                heapq.heappop(self._waiting)
+                continue
+            if self._active >= self.max_concurrency:
+                return  # _release() calls back in
+            delay = max(self._requests.delay(1), self._tokens.delay(cost))
+            if delay > 0:
+                # The head waits for budget; lower priorities wait behind it.
+                loop = asyncio.get_running_loop()
+                if self._wakeup is None or loop.time() + delay < self._wakeup_at:
+                    if self._wakeup is not None:
+                        self._wakeup.cancel()
+                    self._wakeup_at = loop.time() + delay
+                    self._wakeup = loop.call_at(self._wakeup_at, self._on_wakeup)
+                return
+            heapq.heappop(self._waiting)
+            self._requests.take(1)
+            self._tokens.take(cost)
+            self._active += 1
+            fut.set_result(None)
+
+    def _on_wakeup(self) -> None:
+        self._wakeup = None
+        self._dispatch()
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    # ── Calls ──
+
+    async def _begin(self, priority: Priority, cost: int) -> dict[str, Any]:
+        """Admit a call and count it; returns its class's metrics."""
+        m = self._metrics[priority.name.lower()]
+        waited = await self._acquire(priority, cost)
+        m["wait_seconds"] += waited
+        m["max_wait_seconds"] = max(m["max_wait_seconds"], waited)
+        m["requests"] += 1
+        return m
+
+    def _failed(self, m: dict[str, Any], exc: Exception) -> None:
+        m["errors"] += 1
+        if isinstance(exc, RateLimitError):
+            # The provider disagrees with our budget: stop admitting until it refills.
+            m["rate_limited"] += 1
+            self._requests.drain()
+
+    def _settle(self, m: dict[str, Any], cost: int, used: int | None) -> None:
+        if used is not None:
+            m["tokens"] += used
+            # Settle the estimate against what the call actually cost.
+            self._tokens.give(cost - used)
+
+    async def chat(
+        self,
+        priority: Priority,
+        messages: list[dict[str, str]],
+        *,
+        max_tokens: int,
+        temperature: float,
+        model: str | None = None,
+    ) -> Any:
+        """``chat.completions.create`` through the gateway; returns the completion."""
+        cost = estimate_tokens(messages, max_tokens)
+        m = await self._begin(priority, cost)
+        try:
+            resp = await self.client.chat.completions.create(
+                model=model or settings.openai_model,
+                messages=messages,  # type: ignore[arg-type]
+                max_tokens=max_tokens,
+                temperature=temperature,
+            )
+        except Exception as exc:
+            self._failed(m, exc)
+            raise
+        finally:
+            self._release()
+
+        self._settle(m, cost, getattr(getattr(resp, "usage", None), "total_tokens", None))
+        return resp
+
+    async def stream_chat(
+        self,
+        priority: Priority,
+        messages: list[dict[str, str]],
+        *,
+        max_tokens: int,
+        temperature: float,
+        model: str | None = None,
+    ) -> AsyncIterator[str]:
+        """Like :meth:`chat` but streamed: yields the reply text as it arrives.
+
+        The call keeps its concurrency slot until the stream ends, so iterate
+        it to the end or ``aclose()`` it.
+        """
+        cost = estimate_tokens(messages, max_tokens)
+        m = await self._begin(priority, cost)
+        used: int | None = None
+        try:
+            stream = await self.client.chat.completions.create(
+                model=model or settings.openai_model,
+                messages=messages,  # type: ignore[arg-type]
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        used = chunk.usage.total_tokens
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Frees the HTTP connection when the caller stops early.
+                await stream.close()
+        except Exception as exc:
+            self._failed(m, exc)
+            raise
+        finally:
+            self._release()
+        self._settle(m, cost, used)
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth, budget left and per-priority request, wait and token counters."""
+        waiting = {p.name.lower(): 0 for p in Priority}
+        for prio, _, _, fut in self._waiting:
+            if not fut.done():
+                waiting[Priority(prio).name.lower()] += 1
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "requests_available": None if self._requests.capacity <= 0 else int(self._requests.available()),
+            "tokens_available": None if self._tokens.capacity <= 0 else int(self._tokens.available()),
+            "classes": {name: {**m, "waiting": waiting[name]} for name, m in self._metrics.items()},
+        }
@@ -8,16 +8,24 @@ Runs three concurrent subsystems on one asyncio event loop:
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import logging
 import signal
 import sys
+from typing import Any, Coroutine
 
 import uvicorn
-from openai import AsyncOpenAI
 
 from mktbook.bots.fleet import BotFleet
+from mktbook.bots.memory import run_memory_updater
 from mktbook.config import settings
+from mktbook.db import queries
+from mktbook.db.archive import archive_conversations, upgrade_archives
 from mktbook.db.connection import close_db, get_db
+from mktbook.db.maintenance import run_maintenance
+from mktbook.grading.jobs import run_grading_schedule, run_grading_worker
+from mktbook.llm.gateway import LLMGateway, create_openai_client
+from mktbook.scheduler.cron import parse_cron
 from mktbook.scheduler.loop import ConversationScheduler
 from mktbook.web.app import create_app
 from mktbook.web.websocket import WSManager
@@ -31,20 +39,27 @@ log = logging.getLogger("mktbook")
 
 async def main() -> None:
     # Shared resources
-    openai_client = AsyncOpenAI(api_key=settings.openai_api_key)
+    llm = LLMGateway(create_openai_client())
     ws = WSManager()
 
     # Initialize database
-    await get_db()
-    log.info("Database initialized at %s", settings.database_path)
+    if settings.storage_backend == "sqlite":
+        await get_db()
+        await upgrade_archives()
+        log.info("Database initialized at %s", settings.database_path)
+    else:
+        log.warning("Using %s storage; nothing will be persisted", settings.storage_backend)
+
+    if settings.grading_schedule:
+        parse_cron(settings.grading_schedule)  # a bad expression stops startup here
 
     # Create subsystems
-    fleet = BotFleet(openai_client, ws)
+    fleet = BotFleet(llm, ws)
     scheduler = ConversationScheduler(fleet, ws)
     app = create_app(ws)
     app.state.fleet = fleet
     app.state.scheduler = scheduler
-    app.state.openai = openai_client
+    app.state.llm = llm
 
     # Uvicorn server config
     config = uvicorn.Config(
@@ -85,12 +100,65 @@ async def main() -> None:
         await asyncio.sleep(5)
         await scheduler.run()
 
+    async def run_search_indexer() -> None:
+        # Index new messages off the insert path, in the background
+        while not shutdown_event.is_set():
+            try:
+                while await queries.index_pending_messages():
+                    pass
+            except Exception:
+                log.exception("Search indexing failed")
+            try:
+                await asyncio.wait_for(shutdown_event.wait(), timeout=settings.search_index_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_archiver() -> None:
+        # Move old conversations into the archive files once per interval
+        while not shutdown_event.is_set():
+            try:
+                await archive_conversations()
+            except Exception:
+                log.exception("Archiving failed")
+            try:
+                await asyncio.wait_for(shutdown_event.wait(), timeout=settings.archive_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_db_maintenance() -> None:
+        # Checkpoint, vacuum and analyze the database off the request path
+        while not shutdown_event.is_set():
+            try:
+                await run_maintenance()
+            except Exception:
+                log.exception("Database maintenance failed")
+            try:
+                await asyncio.wait_for(shutdown_event.wait(), timeout=settings.db_maintenance_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_until_shutdown(job: Coroutine[Any, Any, None]) -> None:
+        # Background jobs that loop forever; cancelled on shutdown
+        task = asyncio.create_task(job)
+        await shutdown_event.wait()
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    tasks = [run_server(), run_fleet(), run_scheduler(), run_search_indexer()]
+    # Grading runs queued before a restart resume here
+    tasks.append(run_until_shutdown(run_grading_worker(llm, ws)))
+    if settings.grading_schedule:
+        tasks.append(run_until_shutdown(run_grading_schedule(settings.grading_schedule)))
+    if settings.memory_enabled:
+        tasks.append(run_until_shutdown(run_memory_updater(llm)))
+    if settings.storage_backend == "sqlite":
+        tasks.append(run_db_maintenance())
+        if settings.archive_after_days > 0:
+            tasks.append(run_archiver())
+
     try:
-        await asyncio.gather(
-            run_server(),
-            run_fleet(),
-            run_scheduler(),
-        )
+        await asyncio.gather(*tasks)
     except asyncio.CancelledError:
         pass
     finally:
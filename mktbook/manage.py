@@ -0,0 +1,82 @@
+"""MktBook maintenance commands for the SQLite database.
+
+Usage::
+
+    python -m mktbook.manage rebuild-stats
+    python -m mktbook.manage rebuild-search
+    python -m mktbook.manage archive [--older-than DAYS]
+    python -m mktbook.manage snapshot
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+
+from mktbook.db import sqlite_storage
+from mktbook.db.archive import archive_conversations, upgrade_archives
+from mktbook.db.connection import close_db
+from mktbook.db.snapshot import take_snapshot
+
+log = logging.getLogger("mktbook.manage")
+
+
+async def rebuild_stats(args: argparse.Namespace) -> None:
+    count = await sqlite_storage.rebuild_bot_stats()
+    log.info("Rebuilt activity counters for %d bots", count)
+
+
+async def rebuild_search(args: argparse.Namespace) -> None:
+    count = await sqlite_storage.rebuild_search_index()
+    log.info("Rebuilt search index over %d messages", count)
+
+
+async def archive(args: argparse.Namespace) -> None:
+    count = await archive_conversations(older_than_days=args.older_than)
+    log.info("Archived %d conversations", count)
+
+
+async def snapshot(args: argparse.Namespace) -> None:
+    result = await take_snapshot()
+    log.info("Snapshot written to %s (%d bytes, %.1fs)", result["path"], result["bytes"], result["seconds"])
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m mktbook.manage")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("rebuild-stats", help="Recompute the bot_stats counters from message history")
+    p.set_defaults(handler=rebuild_stats)
+
+    p = sub.add_parser("rebuild-search", help="Rebuild the full-text message search index")
+    p.set_defaults(handler=rebuild_search)
+
+    p = sub.add_parser("archive", help="Move old conversations out of the live database")
+    p.add_argument("--older-than", type=int, metavar="DAYS", help="Override archive_after_days")
+    p.set_defaults(handler=archive)
+
+    p = sub.add_parser("snapshot", help="Copy the live database into snapshot_dir while it is in use")
+    p.set_defaults(handler=snapshot)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)-8s %(name)s: %(message)s",
+    )
+    args = build_parser().parse_args(argv)
+
+    async def _run() -> None:
+        try:
+            await upgrade_archives()
+            await args.handler(args)
+        finally:
+            await close_db()
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Five-field cron expressions for scheduled background jobs.
+
+``minute hour day-of-month month day-of-week``; each field is ``*``, a
+number, a range ``a-b``, a list ``a,b,c`` or a step (``*/15``, ``1-5/2``).
+Day of week counts from Sunday = 0 (7 is also Sunday). As in cron, when
+both day fields are restricted a day matching either one is due. Times are
+the server's local time.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+_BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+_MAX_DAYS = 366 * 5
+
+
+def _parse_field(text: str, low: int, high: int) -> frozenset[int]:
+    values: set[int] = set()
+    for part in text.split(","):
+        base, _, step_text = part.partition("/")
+        step = int(step_text) if step_text else 1
+        if base == "*":
+            start, end = low, high
+        elif "-" in base:
+            start, end = (int(v) for v in base.split("-", 1))
+        else:
+            start = int(base)
+            end = high if step_text else start
+        if not (low <= start <= end <= high) or step < 1:
+            raise ValueError(f"cron field {text!r} is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+@dataclass(frozen=True, slots=True)
+class CronSchedule:
+    minutes: frozenset[int]
+    hours: frozenset[int]
+    days: frozenset[int]
+    months: frozenset[int]
+    weekdays: frozenset[int]  # 0 = Sunday
+    any_day: bool
+    any_weekday: bool
+
+    def _day_matches(self, t: datetime) -> bool:
+        day_ok = t.day in self.days
+        weekday_ok = (t.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, t: datetime) -> datetime:
+        """The first due minute strictly after ``t``."""
+        t = t.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=_MAX_DAYS)
+        while t < limit:
+            if t.month not in self.months or not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError("cron schedule never comes due")
+
+
+def parse_cron(expr: str) -> CronSchedule:
+    """Parse ``expr``; raises ``ValueError`` if it is not a valid five-field expression."""
+    fields = expr.split()
+    if len(fields) != 5:
+        raise ValueError(f"cron expression {expr!r} needs 5 fields, got {len(fields)}")
+    minutes, hours, days, months, weekdays = (
+        _parse_field(text, low, high) for text, (low, high) in zip(fields, _BOUNDS)
+    )
+    return CronSchedule(
+        minutes, hours, days, months,
+        frozenset(d % 7 for d in weekdays),
+        any_day=fields[2] == "*",
+        any_weekday=fields[4] == "*",
+    )
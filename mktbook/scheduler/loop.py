@@ -7,6 +7,7 @@ import random
 from typing import TYPE_CHECKING
 
 from mktbook.bots.conversation import build_conversation_messages
+from mktbook.bots.memory import conversation_ended
 from mktbook.config import settings
 from mktbook.db import queries
 from mktbook.scheduler.pairing import select_pair
@@ -64,13 +65,17 @@ class ConversationScheduler:
         initiator: SingleBot
         responder: SingleBot
 
-        conv = await queries.create_conversation(
+        conv_future = queries.queue_conversation(
             channel_id=str(initiator.marketplace_channel.id) if initiator.marketplace_channel else None,
             conv_type="bot-bot",
             initiator_bot_id=initiator.bot_row.id,
             responder_bot_id=responder.bot_row.id,
         )
-        await queries.increment_pair(initiator.bot_row.id, responder.bot_row.id)
+        pair_future = queries.queue_increment_pair(initiator.bot_row.id, responder.bot_row.id)
+        conv, _, init_memory, resp_memory = await asyncio.gather(
+            conv_future, pair_future,
+            queries.get_bot_memory(initiator.bot_row.id), queries.get_bot_memory(responder.bot_row.id),
+        )
 
         log.info("Starting conversation #%d: %s <-> %s",
                  conv.id, initiator.bot_row.bot_name, responder.bot_row.bot_name)
@@ -84,68 +89,75 @@ class ConversationScheduler:
 
         messages_so_far = []
         turns = settings.conversation_turns  # Each turn = 2 messages
-
-        for turn in range(turns):
-            # Initiator speaks
-            llm_msgs = build_conversation_messages(
-                initiator.bot_row,
-                messages_so_far,
-                opener=(turn == 0),
-                partner_name=responder.bot_row.bot_name,
-            )
-            init_text = await initiator.generate_response(llm_msgs)
-            sent = await initiator.send_to_marketplace(init_text)
-
-            init_msg = await queries.create_message(
-                conversation_id=conv.id,
-                bot_id=initiator.bot_row.id,
-                author_type="bot",
-                author_name=initiator.bot_row.bot_name,
-                content=init_text,
-                discord_msg_id=str(sent.id) if sent else None,
-            )
-            messages_so_far.append(init_msg)
-
-            if self.ws:
-                await self.ws.broadcast({
-                    "type": "message",
-                    "bot": initiator.bot_row.bot_name,
-                    "content": init_text,
-                    "conversation_type": "bot-bot",
-                })
-
-            await asyncio.sleep(MESSAGE_PACE_SECONDS)
-
-            # Responder speaks
-            llm_msgs = build_conversation_messages(
-                responder.bot_row,
-                messages_so_far,
-            )
-            resp_text = await responder.generate_response(llm_msgs)
-            sent = await responder.send_to_marketplace(resp_text)
-
-            resp_msg = await queries.create_message(
-                conversation_id=conv.id,
-                bot_id=responder.bot_row.id,
-                author_type="bot",
-                author_name=responder.bot_row.bot_name,
-                content=resp_text,
-                discord_msg_id=str(sent.id) if sent else None,
-            )
-            messages_so_far.append(resp_msg)
-
-            if self.ws:
-                await self.ws.broadcast({
-                    "type": "message",
-                    "bot": responder.bot_row.bot_name,
-                    "content": resp_text,
-                    "conversation_type": "bot-bot",
-                })
-
-            await asyncio.sleep(MESSAGE_PACE_SECONDS)
-
-        await queries.end_conversation(conv.id, turns)
-        log.info("Conversation #%d complete (%d turns)", conv.id, turns)
+        turns_done = 0
+
+        try:
+            for turn in range(turns):
+                # Initiator speaks
+                llm_msgs = build_conversation_messages(
+                    initiator.bot_row,
+                    messages_so_far,
+                    opener=(turn == 0),
+                    partner_name=responder.bot_row.bot_name,
+                    memory=init_memory.summary if init_memory else "",
+                )
+                init_text = await initiator.generate_response(llm_msgs)
+                sent = await initiator.send_to_marketplace(init_text)
+
+                init_msg = await queries.queue_message(
+                    conversation_id=conv.id,
+                    bot_id=initiator.bot_row.id,
+                    author_type="bot",
+                    author_name=initiator.bot_row.bot_name,
+                    content=init_text,
+                    discord_msg_id=str(sent.id) if sent else None,
+                )
+                messages_so_far.append(init_msg)
+
+                if self.ws:
+                    await self.ws.broadcast({
+                        "type": "message",
+                        "bot": initiator.bot_row.bot_name,
+                        "content": init_text,
+                        "conversation_type": "bot-bot",
+                    })
+
+                await asyncio.sleep(MESSAGE_PACE_SECONDS)
+
+                # Responder speaks
+                llm_msgs = build_conversation_messages(
+                    responder.bot_row,
+                    messages_so_far,
+                    memory=resp_memory.summary if resp_memory else "",
+                )
+                resp_text = await responder.generate_response(llm_msgs)
+                sent = await responder.send_to_marketplace(resp_text)
+
+                resp_msg = await queries.queue_message(
+                    conversation_id=conv.id,
+                    bot_id=responder.bot_row.id,
+                    author_type="bot",
+                    author_name=responder.bot_row.bot_name,
+                    content=resp_text,
+                    discord_msg_id=str(sent.id) if sent else None,
+                )
+                messages_so_far.append(resp_msg)
+
+                if self.ws:
+                    await self.ws.broadcast({
+                        "type": "message",
+                        "bot": responder.bot_row.bot_name,
+                        "content": resp_text,
+                        "conversation_type": "bot-bot",
+                    })
+
+                await asyncio.sleep(MESSAGE_PACE_SECONDS)
+                turns_done += 1
+        finally:
+            # End it even when a turn fails, so it does not stay open forever.
+            await queries.queue_end_conversation(conv.id, turns_done)
+            conversation_ended(initiator.bot_row.id, responder.bot_row.id)
+        log.info("Conversation #%d complete (%d turns)", conv.id, turns_done)
 
         if self.ws:
             await self.ws.broadcast({"type": "conversation_end", "conversation_id": conv.id})
@@ -32,7 +32,7 @@ def create_app(ws: WSManager) -> FastAPI:
     app.state.ws = ws
     app.state.fleet = None       # set by main.py
     app.state.scheduler = None   # set by main.py
-    app.state.openai = None      # set by main.py
+    app.state.llm = None         # set by main.py
 
     # Register routes
     from mktbook.web.routes_api import router as api_router
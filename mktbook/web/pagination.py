@@ -0,0 +1,35 @@
+"""Opaque cursors for keyset-paginated listings."""
+from __future__ import annotations
+
+import base64
+import json
+
+from fastapi import HTTPException, Response
+
+from mktbook.db.queries import PageKey
+
+# Upper bound on ``limit`` for the paginated list endpoints; the stream
+# endpoints are the way to pull everything.
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(key: PageKey) -> str:
+    raw = json.dumps(list(key), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> PageKey | None:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, row_id = json.loads(raw)
+        return int(ts), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def set_next_cursor(response: Response, key: PageKey | None) -> None:
+    """Advertise the next page, if any, in the ``X-Next-Cursor`` header."""
+    if key is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor(key)
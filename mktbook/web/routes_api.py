@@ -1,13 +1,21 @@
 """REST API routes."""
 from __future__ import annotations
 
-import uuid
-from typing import Any
+import json
+from typing import Any, AsyncIterator, Callable
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from mktbook.bots.conversation import prompt_stats
+from mktbook.config import settings
 from mktbook.db import queries
+from mktbook.db.connection import get_db
+from mktbook.db.maintenance import maintenance_stats
+from mktbook.db.snapshot import snapshot_status, start_snapshot
+from mktbook.db.models import Conversation, GradingRun, Message
+from mktbook.web.pagination import MAX_PAGE_SIZE, decode_cursor, set_next_cursor
 
 router = APIRouter(prefix="/api")
 
@@ -81,6 +89,12 @@ async def get_bot(bot_id: int) -> dict[str, Any]:
         return {"error": "not found"}
     data = _bot_to_dict(bot)
     data["stats"] = await queries.get_bot_stats(bot_id)
+    memory = await queries.get_bot_memory(bot_id)
+    data["memory"] = {
+        "summary": memory.summary,
+        "last_conversation_id": memory.last_conversation_id,
+        "updated_at": memory.updated_at,
+    } if memory else None
     data["grades"] = [
         {
             "grading_run_id": g.grading_run_id,
@@ -120,22 +134,119 @@ async def delete_bot(bot_id: int, request: Request) -> dict[str, str]:
     return {"status": "deleted"}
 
 
-# ── Messages ──────────────────────────────────────────────────────────
+@router.get("/fleet/stats")
+async def fleet_stats(request: Request) -> dict[str, Any]:
+    fleet = request.app.state.fleet
+    if not fleet:
+        return {"error": "fleet not running"}
+    return fleet.stats()
+
+
+# ── Messages & Conversations ──────────────────────────────────────────
+# Listings are keyset-paginated: when a full page is returned, the
+# X-Next-Cursor header holds the value to pass as ``cursor`` for the next
+# (older) page. The /stream variants emit every row oldest first as NDJSON.
+
+_STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def _message_to_dict(m: Message) -> dict[str, Any]:
+    return {
+        "id": m.id,
+        "conversation_id": m.conversation_id,
+        "bot_id": m.bot_id,
+        "author_type": m.author_type,
+        "author_name": m.author_name,
+        "content": m.content,
+        "created_at": m.created_at,
+    }
+
+
+def _conversation_to_dict(c: Conversation) -> dict[str, Any]:
+    return {
+        "id": c.id,
+        "channel_id": c.channel_id,
+        "type": c.type,
+        "initiator_bot_id": c.initiator_bot_id,
+        "responder_bot_id": c.responder_bot_id,
+        "turn_count": c.turn_count,
+        "started_at": c.started_at,
+        "ended_at": c.ended_at,
+    }
+
+
+def _ndjson(rows: AsyncIterator[Any], to_dict: Callable[[Any], dict[str, Any]]) -> StreamingResponse:
+    async def body() -> AsyncIterator[str]:
+        buf: list[str] = []
+        size = 0
+        async for row in rows:
+            line = json.dumps(to_dict(row)) + "\n"
+            buf.append(line)
+            size += len(line)
+            if size >= _STREAM_CHUNK_BYTES:
+                yield "".join(buf)
+                buf, size = [], 0
+        if buf:
+            yield "".join(buf)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
 
 @router.get("/messages")
-async def list_messages(limit: int = 100, bot_id: int | None = None) -> list[dict[str, Any]]:
-    msgs = await queries.get_messages(limit=limit, bot_id=bot_id)
+async def list_messages(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    bot_id: int | None = None,
+    cursor: str | None = None,
+) -> list[dict[str, Any]]:
+    msgs = await queries.get_messages(limit=limit, bot_id=bot_id, before=decode_cursor(cursor))
+    if len(msgs) == limit:
+        set_next_cursor(response, (msgs[-1].created_ms, msgs[-1].id))
+    return [_message_to_dict(m) for m in msgs]
+
+
+@router.get("/messages/stream")
+async def stream_messages(
+    bot_id: int | None = None, after: str | None = None, include_archive: bool = True
+) -> StreamingResponse:
+    rows = queries.iter_messages(bot_id=bot_id, after=decode_cursor(after), include_archive=include_archive)
+    return _ndjson(rows, _message_to_dict)
+
+
+@router.get("/conversations")
+async def list_conversations(
+    response: Response, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), cursor: str | None = None
+) -> list[dict[str, Any]]:
+    convs = await queries.get_conversations(limit=limit, before=decode_cursor(cursor))
+    if len(convs) == limit:
+        set_next_cursor(response, (convs[-1].started_ms, convs[-1].id))
+    return [_conversation_to_dict(c) for c in convs]
+
+
+@router.get("/conversations/stream")
+async def stream_conversations(after: str | None = None, include_archive: bool = True) -> StreamingResponse:
+    rows = queries.iter_conversations(after=decode_cursor(after), include_archive=include_archive)
+    return _ndjson(rows, _conversation_to_dict)
+
+
+# ── Search ────────────────────────────────────────────────────────────
+
+@router.get("/search")
+async def search(
+    q: str,
+    bot_id: int | None = None,
+    author_type: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+) -> list[dict[str, Any]]:
+    hits = await queries.search_messages(
+        q, bot_id=bot_id, author_type=author_type, since=since, until=until, limit=limit, offset=offset
+    )
     return [
-        {
-            "id": m.id,
-            "conversation_id": m.conversation_id,
-            "bot_id": m.bot_id,
-            "author_type": m.author_type,
-            "author_name": m.author_name,
-            "content": m.content,
-            "created_at": m.created_at,
-        }
-        for m in msgs
+        {**_message_to_dict(h.message), "snippet": h.snippet, "rank": h.rank}
+        for h in hits
     ]
 
 
@@ -144,7 +255,7 @@ async def list_messages(limit: int = 100, bot_id: int | None = None) -> list[dic
 @router.get("/leaderboard")
 async def leaderboard() -> list[dict[str, Any]]:
     grades = await queries.get_latest_grades()
-    bots = {b.id: b for b in await queries.get_all_bots()}
+    bots = await queries.get_bots_by_ids(g.bot_id for g in grades)
     result = []
     for g in grades:
         bot = bots.get(g.bot_id)
@@ -164,37 +275,128 @@ async def leaderboard() -> list[dict[str, Any]]:
 
 # ── Grading ───────────────────────────────────────────────────────────
 
+@router.get("/grades")
+async def list_grades(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    bot_id: int | None = None,
+    cursor: str | None = None,
+) -> list[dict[str, Any]]:
+    grades = await queries.get_grades(limit=limit, bot_id=bot_id, before=decode_cursor(cursor))
+    if len(grades) == limit:
+        set_next_cursor(response, (grades[-1].created_ms, grades[-1].id))
+    return [
+        {
+            "id": g.id,
+            "bot_id": g.bot_id,
+            "grading_run_id": g.grading_run_id,
+            "overall_score": g.overall_score,
+            "objective_score": g.objective_score,
+            "quality_score": g.quality_score,
+            "human_score": g.human_score,
+            "volume_score": g.volume_score,
+            "llm_reasoning": g.llm_reasoning,
+            "reused_grade_id": g.reused_grade_id,
+            "created_at": g.created_at,
+        }
+        for g in grades
+    ]
+
+
 @router.post("/grading/run")
-async def run_grading(request: Request) -> dict[str, Any]:
-    from mktbook.grading.evaluator import GradeEvaluator
+async def run_grading(request: Request, full: bool = False, batch: bool = False) -> dict[str, Any]:
+    """Queue a grading run; progress is at ``GET /api/grading/runs/{run_id}``."""
+    from mktbook.grading.jobs import enqueue_grading
 
-    openai_client = request.app.state.openai
-    if not openai_client:
+    if not request.app.state.llm:
         return {"error": "OpenAI client not configured"}
 
-    run_id = str(uuid.uuid4())[:8]
-    evaluator = GradeEvaluator(openai_client)
-    grades = await evaluator.grade_all(run_id)
+    run = await enqueue_grading(full=full, batch=batch)
+    return _run_to_dict(run)
 
-    ws = request.app.state.ws
-    if ws:
-        await ws.broadcast({"type": "grading_complete", "run_id": run_id, "count": len(grades)})
 
+def _run_to_dict(r: GradingRun) -> dict[str, Any]:
     return {
-        "run_id": run_id,
-        "grades": [
-            {
-                "bot_id": g.bot_id,
-                "overall_score": g.overall_score,
-                "llm_reasoning": g.llm_reasoning,
-            }
-            for g in grades
-        ],
+        "id": r.id,
+        "status": r.status,
+        "bot_count": r.bot_count,
+        "full_run": r.full_run,
+        "triggered_by": r.triggered_by,
+        "batch_mode": r.batch_mode,
+        "batch_id": r.batch_id,
+        "started_at": r.started_at,
+        "finished_at": r.finished_at,
     }
 
 
+@router.get("/grading/runs")
+async def list_grading_runs(limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE)) -> list[dict[str, Any]]:
+    return [_run_to_dict(r) for r in await queries.get_grading_runs(limit)]
+
+
+@router.get("/grading/runs/{run_id}")
+async def get_grading_run(run_id: str) -> dict[str, Any]:
+    run = await queries.get_grading_run(run_id)
+    if not run:
+        return {"error": "not found"}
+    entries = await queries.get_grading_run_bots(run_id)
+    grades = await queries.get_grades_by_run(run_id)
+    data = _run_to_dict(run)
+    data["progress"] = {
+        status: sum(e.status == status for e in entries) for status in ("pending", "done", "failed")
+    }
+    data["progress"]["reused"] = sum(g.reused_grade_id is not None for g in grades)
+    data["bots"] = [
+        {"bot_id": e.bot_id, "status": e.status, "grade_id": e.grade_id, "error": e.error}
+        for e in entries
+    ]
+    return data
+
+
 @router.get("/grading/export")
 async def export_grades() -> dict[str, Any]:
     from mktbook.grading.export import export_csv
     csv_text = await export_csv()
     return {"csv": csv_text}
+
+
+# ── LLM ───────────────────────────────────────────────────────────────
+
+@router.get("/llm/stats")
+async def llm_stats(request: Request) -> dict[str, Any]:
+    llm = request.app.state.llm
+    if not llm:
+        return {"error": "OpenAI client not configured"}
+    return {**llm.stats(), "prompts": prompt_stats()}
+
+
+# ── Database ──────────────────────────────────────────────────────────
+
+@router.get("/db/stats")
+async def db_stats() -> dict[str, Any]:
+    if settings.storage_backend != "sqlite":
+        return {"backend": settings.storage_backend}
+    db = await get_db()
+    return {
+        "backend": "sqlite",
+        **db.stats(),
+        "query_cache": queries.cache_stats(),
+        "maintenance": maintenance_stats(),
+    }
+
+
+@router.post("/db/snapshot")
+async def create_snapshot() -> dict[str, Any]:
+    """Start an online snapshot; poll GET /api/db/snapshot for progress."""
+    if settings.storage_backend != "sqlite":
+        return {"error": f"snapshots need the sqlite backend, not {settings.storage_backend}"}
+    try:
+        start_snapshot()
+    except RuntimeError as exc:
+        return {"error": str(exc)}
+    return snapshot_status()
+
+
+@router.get("/db/snapshot")
+async def get_snapshot_status() -> dict[str, Any]:
+    return snapshot_status()
@@ -6,6 +6,7 @@ from fastapi.responses import HTMLResponse, RedirectResponse
 
 from mktbook.db import queries
 from mktbook.web.app import TEMPLATES
+from mktbook.web.pagination import decode_cursor, encode_cursor
 
 router = APIRouter()
 
@@ -25,8 +26,7 @@ async def dashboard(request: Request) -> HTMLResponse:
             "bot_id": g.bot_id,
         })
     recent_messages = await queries.get_messages(limit=20)
-    return TEMPLATES.TemplateResponse("dashboard.html", {
-        "request": request,
+    return TEMPLATES.TemplateResponse(request, "dashboard.html", {
         "bots": bots,
         "leaderboard": leaderboard,
         "messages": recent_messages,
@@ -36,11 +36,8 @@ async def dashboard(request: Request) -> HTMLResponse:
 @router.get("/bots", response_class=HTMLResponse)
 async def bot_list(request: Request) -> HTMLResponse:
     bots = await queries.get_all_bots()
-    stats = {}
-    for b in bots:
-        stats[b.id] = await queries.get_bot_stats(b.id)
-    return TEMPLATES.TemplateResponse("bot_list.html", {
-        "request": request,
+    stats = await queries.get_all_bot_stats()
+    return TEMPLATES.TemplateResponse(request, "bot_list.html", {
         "bots": bots,
         "stats": stats,
     })
@@ -48,8 +45,7 @@ async def bot_list(request: Request) -> HTMLResponse:
 
 @router.get("/bots/new", response_class=HTMLResponse)
 async def bot_form_new(request: Request) -> HTMLResponse:
-    return TEMPLATES.TemplateResponse("bot_form.html", {
-        "request": request,
+    return TEMPLATES.TemplateResponse(request, "bot_form.html", {
         "bot": None,
     })
 
@@ -86,12 +82,13 @@ async def bot_detail(request: Request, bot_id: int) -> HTMLResponse:
     stats = await queries.get_bot_stats(bot_id)
     grades = await queries.get_bot_grades(bot_id)
     conversations = await queries.get_bot_conversations(bot_id, limit=20)
-    return TEMPLATES.TemplateResponse("bot_detail.html", {
-        "request": request,
+    memory = await queries.get_bot_memory(bot_id)
+    return TEMPLATES.TemplateResponse(request, "bot_detail.html", {
         "bot": bot,
         "stats": stats,
         "grades": grades,
         "conversations": conversations,
+        "memory": memory,
     })
 
 
@@ -100,8 +97,7 @@ async def bot_form_edit(request: Request, bot_id: int) -> HTMLResponse:
     bot = await queries.get_bot(bot_id)
     if not bot:
         return HTMLResponse("<h1>Bot not found</h1>", status_code=404)
-    return TEMPLATES.TemplateResponse("bot_form.html", {
-        "request": request,
+    return TEMPLATES.TemplateResponse(request, "bot_form.html", {
         "bot": bot,
     })
 
@@ -137,24 +133,25 @@ async def bot_form_update(
 @router.get("/grading", response_class=HTMLResponse)
 async def grading_page(request: Request) -> HTMLResponse:
     grades = await queries.get_latest_grades()
-    bots = {b.id: b for b in await queries.get_all_bots()}
+    bots = await queries.get_bots_by_ids(g.bot_id for g in grades)
     enriched = []
     for g in grades:
         bot = bots.get(g.bot_id)
         enriched.append({"grade": g, "bot": bot})
-    return TEMPLATES.TemplateResponse("grading.html", {
-        "request": request,
+    return TEMPLATES.TemplateResponse(request, "grading.html", {
         "grades": enriched,
     })
 
 
 @router.get("/messages", response_class=HTMLResponse)
-async def messages_page(request: Request, bot_id: int | None = None) -> HTMLResponse:
-    msgs = await queries.get_messages(limit=200, bot_id=bot_id)
+async def messages_page(request: Request, bot_id: int | None = None, cursor: str | None = None) -> HTMLResponse:
+    page_size = 200
+    msgs = await queries.get_messages(limit=page_size, bot_id=bot_id, before=decode_cursor(cursor))
     bots = await queries.get_all_bots()
-    return TEMPLATES.TemplateResponse("messages.html", {
-        "request": request,
+    next_cursor = encode_cursor((msgs[-1].created_ms, msgs[-1].id)) if len(msgs) == page_size else None
+    return TEMPLATES.TemplateResponse(request, "messages.html", {
         "messages": msgs,
         "bots": bots,
         "selected_bot_id": bot_id,
+        "next_cursor": next_cursor,
     })
@@ -39,10 +39,24 @@
     }
 
     function handleEvent(data) {
+        if (data.type === 'grading_progress') {
+            showGradingProgress(data);
+            return;
+        }
+
         const feed = document.getElementById('activity-feed');
         if (!feed) return;
 
+        if (data.type === 'message_delta') {
+            showReplyDelta(feed, data);
+            return;
+        }
+
         if (data.type === 'message') {
+            if (data.reply_id) {
+                const streaming = feed.querySelector(`[data-reply-id="${CSS.escape(data.reply_id)}"]`);
+                if (streaming) streaming.remove();
+            }
             const item = document.createElement('div');
             item.className = 'feed-item';
             item.innerHTML = `<strong>${escapeHtml(data.bot)}</strong>: ${escapeHtml(data.content.substring(0, 100))}` +
@@ -72,6 +86,39 @@
         }
     }
 
+    function showReplyDelta(feed, data) {
+        let item = feed.querySelector(`[data-reply-id="${CSS.escape(data.reply_id)}"]`);
+        if (!item) {
+            item = document.createElement('div');
+            item.className = 'feed-item';
+            item.dataset.replyId = data.reply_id;
+            item.innerHTML = `<strong>${escapeHtml(data.bot)}</strong>: <span class="reply-text"></span>` +
+                `<small>bot-human - typing...</small>`;
+            feed.insertBefore(item, feed.firstChild);
+        }
+        item.querySelector('.reply-text').textContent += data.delta;
+    }
+
+    function showGradingProgress(data) {
+        const list = document.getElementById('grading-progress');
+        if (!list) return;
+        if (list.dataset.runId !== data.run_id) {
+            list.dataset.runId = data.run_id;
+            list.innerHTML = '';
+        }
+        const item = document.createElement('li');
+        if (data.ok) {
+            item.innerHTML = `<strong>${escapeHtml(data.bot)}</strong>: ${data.overall_score.toFixed(1)}` +
+                (data.reused ? ' <small>(unchanged, carried forward)</small>' : ` <small>(${data.seconds.toFixed(1)}s)</small>`);
+        } else {
+            item.innerHTML = `<strong>${escapeHtml(data.bot)}</strong>: <em>failed</em>`;
+        }
+        list.appendChild(item);
+
+        const status = document.getElementById('grading-status');
+        if (status) status.textContent = `Grading in progress... ${data.done}/${data.total} bots done`;
+    }
+
     function escapeHtml(text) {
         const div = document.createElement('div');
         div.textContent = text;
@@ -79,7 +126,8 @@
     }
 
     // Only connect if we're on a page that might benefit
-    if (document.getElementById('activity-feed') || document.getElementById('message-table-body')) {
+    if (document.getElementById('activity-feed') || document.getElementById('message-table-body')
+            || document.getElementById('grading-progress')) {
         connect();
     }
 })();
@@ -0,0 +1,59 @@
+"""Shared fixtures: a throwaway environment and one storage backend per test.
+
+Async tests are marked ``pytest.mark.anyio`` and run on asyncio (anyio's
+pytest plugin comes with the web stack). Settings are read from the
+environment, so the required ones get dummy values before mktbook is imported.
+"""
+from __future__ import annotations
+
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("DISCORD_GUILD_ID", "1")
+
+from typing import AsyncIterator  # noqa: E402
+
+import pytest  # noqa: E402
+
+from mktbook.config import settings  # noqa: E402
+from mktbook.db import connection, sqlite_storage, storage  # noqa: E402
+from mktbook.db.storage import Storage  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def _isolated_settings(tmp_path, monkeypatch) -> None:
+    """Every test gets its own database file, archive and snapshot directories."""
+    monkeypatch.setattr(settings, "database_path", str(tmp_path / "mktbook.db"))
+    monkeypatch.setattr(settings, "archive_dir", str(tmp_path / "archive"))
+    monkeypatch.setattr(settings, "snapshot_dir", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(settings, "grading_batch_dir", str(tmp_path / "batches"))
+    monkeypatch.setattr(settings, "storage_backend", "sqlite")
+    monkeypatch.setattr(storage, "_storage", None)
+    # The result cache is module state; start each test with an empty one.
+    monkeypatch.setattr(sqlite_storage, "_cache", sqlite_storage._ResultCache())
+
+
+@pytest.fixture
+async def sqlite_backend() -> AsyncIterator[Storage]:
+    """The SQLite backend on a fresh database file, closed after the test."""
+    try:
+        yield storage.get_storage()
+    finally:
+        await connection.close_db()
+
+
+@pytest.fixture
+def memory_backend(monkeypatch) -> Storage:
+    monkeypatch.setattr(settings, "storage_backend", "memory")
+    return storage.get_storage()
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def backend(request) -> Storage:
+    """Each storage backend in turn, also installed behind ``mktbook.db.queries``."""
+    return request.getfixturevalue(f"{request.param}_backend")
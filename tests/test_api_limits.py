@@ -0,0 +1,27 @@
+"""The paginated list endpoints reject page sizes outside 1..MAX_PAGE_SIZE."""
+from __future__ import annotations
+
+import httpx
+import pytest
+
+from mktbook.web.app import create_app
+from mktbook.web.pagination import MAX_PAGE_SIZE
+from mktbook.web.websocket import WSManager
+
+pytestmark = pytest.mark.anyio
+
+ENDPOINTS = ["/api/messages", "/api/conversations", "/api/grades", "/api/grading/runs", "/api/search?q=coffee"]
+
+
+@pytest.mark.parametrize("path", ENDPOINTS)
+async def test_limit_out_of_range_is_rejected(sqlite_backend, path: str) -> None:
+    sep = "&" if "?" in path else "?"
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(WSManager())), base_url="http://t") as c:
+        for limit in (0, -1, MAX_PAGE_SIZE + 1):
+            assert (await c.get(f"{path}{sep}limit={limit}")).status_code == 422, limit
+        assert (await c.get(f"{path}{sep}limit=1")).status_code == 200
+
+
+async def test_negative_search_offset_is_rejected(sqlite_backend) -> None:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(WSManager())), base_url="http://t") as c:
+        assert (await c.get("/api/search?q=coffee&offset=-1")).status_code == 422
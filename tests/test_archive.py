@@ -0,0 +1,101 @@
+"""Archiving moves old conversations out of the live database without losing them from full-history reads.
+
+Streams across the tiers read a page at a time and hold no reader while the client is slow.
+"""
+from __future__ import annotations
+
+import json
+
+import httpx
+import pytest
+
+from mktbook.db import archive, maintenance, queries, sqlite_storage
+from mktbook.db.connection import archive_paths, get_db, reader, writer
+from mktbook.db.storage import Storage
+from mktbook.web.app import create_app
+from mktbook.web.websocket import WSManager
+
+pytestmark = pytest.mark.anyio
+
+CONVERSATIONS = 30
+TURNS = 4
+
+
+async def _history(s: Storage) -> list[int]:
+    """Ended conversations between two bots, backdated a year so they are due for archiving."""
+    alpha = await s.create_bot("s1", "alpha", "t1")
+    beta = await s.create_bot("s2", "beta", "t2")
+    ids = []
+    for i in range(CONVERSATIONS):
+        conv = await s.queue_conversation("1", "bot-bot", alpha.id, beta.id)
+        for turn in range(TURNS):
+            bot = (alpha, beta)[turn % 2]
+            await s.queue_message(conv.id, bot.id, "bot", bot.bot_name, f"offer {i}.{turn} " + "x" * 400)
+        await s.queue_end_conversation(conv.id, TURNS)
+        ids.append(conv.id)
+    async with writer() as db:
+        await db.execute("UPDATE conversations SET started_ms = started_ms - 365 * 86400000")
+    return ids
+
+
+async def _live_size() -> tuple[int, int, int]:
+    async with reader() as db:
+        convs = (await (await db.execute("SELECT COUNT(*) FROM conversations")).fetchone())[0]
+        msgs = (await (await db.execute("SELECT COUNT(*) FROM messages")).fetchone())[0]
+        pages = (await (await db.execute("PRAGMA page_count")).fetchone())[0]
+    return convs, msgs, pages
+
+
+async def _stream(client: httpx.AsyncClient, path: str) -> list[dict]:
+    response = await client.get(path)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+async def test_archived_history_stays_readable(sqlite_backend: Storage) -> None:
+    conv_ids = await _history(sqlite_backend)
+    stats = await queries.get_all_bot_stats()
+    before = await queries.get_messages_for_conversations(conv_ids)
+    convs_before, msgs_before, pages_before = await _live_size()
+    assert (convs_before, msgs_before) == (CONVERSATIONS, CONVERSATIONS * TURNS)
+
+    assert await archive.archive_conversations(older_than_days=30, batch_size=7) == CONVERSATIONS
+    await maintenance.incremental_vacuum(10_000)
+    assert len(archive_paths()) == 1
+    convs_after, msgs_after, pages_after = await _live_size()
+    assert (convs_after, msgs_after) == (0, 0)
+    assert pages_after < pages_before
+
+    # Live-only reads no longer see the history; full-history reads see all of it.
+    assert await queries.get_messages_for_conversations(conv_ids) == {cid: [] for cid in conv_ids}
+    assert await queries.get_messages_for_conversations(conv_ids, include_archive=True) == before
+    assert await queries.get_conversation_messages(conv_ids[0], include_archive=True) == before[conv_ids[0]]
+    [alpha, _] = await queries.get_all_bots()
+    recent = await queries.get_recent_conversations_for_bots([alpha.id], per_bot=3, include_archive=True)
+    assert [c.id for c in recent[alpha.id]] == conv_ids[:-4:-1]
+    assert await queries.get_all_bot_stats() == stats
+
+    transport = httpx.ASGITransport(app=create_app(WSManager()))
+    async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+        streamed = await _stream(client, "/api/conversations/stream")
+        assert [c["id"] for c in streamed] == conv_ids
+        streamed = await _stream(client, "/api/messages/stream")
+        assert [m["id"] for m in streamed] == [m.id for cid in conv_ids for m in before[cid]]
+        assert await _stream(client, "/api/messages/stream?include_archive=false") == []
+
+
+async def test_a_paused_stream_holds_no_reader(sqlite_backend: Storage, monkeypatch) -> None:
+    monkeypatch.setattr(sqlite_storage, "_STREAM_FETCH_SIZE", 7)
+    conv_ids = await _history(sqlite_backend)
+    await archive.archive_conversations(older_than_days=30)
+    live = await sqlite_backend.queue_conversation("1", "bot-human", None, None)
+    db = await get_db()
+
+    stream = queries.iter_conversations(include_archive=True)
+    streamed = [(await stream.__anext__()).id]
+    # Between pages every reader is back in the pool, with its archives detached.
+    assert db.stats()["readers_idle"] == db.read_pool_size
+    async with reader() as conn:
+        assert [name for _, name, _ in await (await conn.execute("PRAGMA database_list")).fetchall()] == ["main"]
+    streamed += [c.id async for c in stream]
+    assert streamed == [*conv_ids, live.id]
@@ -0,0 +1,276 @@
+"""A ``shared`` fleet against a local stand-in for Discord's gateway and REST API.
+
+One listener holds the only gateway connection and finds the marketplace
+channel; the bots log in over HTTP only, answer the human messages the
+fleet hands them, and post through their own tokens.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable
+
+import pytest
+import yarl
+from aiohttp import WSMsgType, web
+from discord import gateway, http
+
+from mktbook.bots import fleet as fleet_module
+from mktbook.bots.fleet import BotFleet
+from mktbook.config import settings
+from mktbook.db import queries
+from mktbook.llm.gateway import LLMGateway
+
+pytestmark = pytest.mark.anyio
+
+GUILD_ID, MARKETPLACE_ID, OTHER_CHANNEL_ID = 1, 500, 501
+
+
+def _json(data: Any, status: int = 200) -> web.Response:
+    # discord.py only parses bodies whose content type is exactly application/json.
+    return web.Response(status=status, body=json.dumps(data).encode(), headers={"Content-Type": "application/json"})
+
+
+def _user(token: str) -> dict[str, Any]:
+    """Token ``tN`` belongs to bot user 2000+N."""
+    return {"id": str(2000 + int(token[1:])), "username": f"user-{token}", "discriminator": "0", "avatar": None,
+            "bot": True}
+
+
+class FakeDiscord:
+    """Just enough of Discord for logging in, READY/GUILD_CREATE, MESSAGE_CREATE and posting."""
+
+    def __init__(self) -> None:
+        self.sockets: list[web.WebSocketResponse] = []
+        self.identified: list[str] = []  # token of each gateway login, in order
+        self.posts: list[tuple[str, int, str]] = []  # (token, channel id, content)
+        self._ids = itertools.count(10_000)
+        self._seq = itertools.count(1)
+
+    def routes(self) -> list[web.RouteDef]:
+        return [
+            web.get("/api/v10/users/@me", self.me),
+            web.get("/api/v10/oauth2/applications/@me", self.application),
+            web.get("/api/v10/gateway", self.gateway_url),
+            web.get("/api/v10/gateway/bot", self.gateway_url),
+            web.post("/api/v10/channels/{channel_id}/messages", self.post_message),
+            web.post("/api/v10/channels/{channel_id}/typing", self.typing),
+            web.get("/gw", self.gateway),
+        ]
+
+    @staticmethod
+    def _token(request: web.Request) -> str:
+        return request.headers["Authorization"].split()[-1]
+
+    def _message(self, author: dict[str, Any], content: str, message_id: int | None = None) -> dict[str, Any]:
+        return {
+            "id": str(message_id or next(self._ids)), "channel_id": str(MARKETPLACE_ID), "guild_id": str(GUILD_ID),
+            "author": author, "content": content, "timestamp": "2026-01-01T00:00:00+00:00",
+            "edited_timestamp": None, "tts": False, "mention_everyone": False, "mentions": [],
+            "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0,
+        }
+
+    # ── REST ──
+
+    async def me(self, request: web.Request) -> web.Response:
+        if self._token(request) == "revoked":
+            return _json({"message": "401: Unauthorized", "code": 0}, status=401)
+        return _json(_user(self._token(request)))
+
+    async def application(self, request: web.Request) -> web.Response:
+        user = _user(self._token(request))
+        return _json({"id": user["id"], "name": user["username"], "description": "", "icon": None,
+                      "bot_public": True, "bot_require_code_grant": False, "owner": user, "verify_key": "k",
+                      "flags": 0})
+
+    async def gateway_url(self, request: web.Request) -> web.Response:
+        return _json({"url": "ws://unused", "shards": 1, "session_start_limit": {}})
+
+    async def post_message(self, request: web.Request) -> web.Response:
+        token, content = self._token(request), (await request.json())["content"]
+        self.posts.append((token, int(request.match_info["channel_id"]), content))
+        return _json(self._message(_user(token), content))
+
+    async def typing(self, request: web.Request) -> web.Response:
+        return web.Response(status=204)
+
+    # ── Gateway ──
+
+    async def gateway(self, request: web.Request) -> web.WebSocketResponse:
+        sock = web.WebSocketResponse()
+        await sock.prepare(request)
+        await sock.send_str(json.dumps({"op": 10, "d": {"heartbeat_interval": 40_000}}))
+        async for frame in sock:
+            if frame.type != WSMsgType.TEXT:
+                continue
+            payload = json.loads(frame.data)
+            if payload["op"] == 1:
+                await sock.send_str(json.dumps({"op": 11}))
+            elif payload["op"] == 2:
+                token = payload["d"]["token"].split()[-1]
+                self.sockets.append(sock)
+                self.identified.append(token)
+                await self._identified(sock, _user(token))
+        self.sockets.remove(sock)
+        return sock
+
+    async def _identified(self, sock: web.WebSocketResponse, user: dict[str, Any]) -> None:
+        await self._dispatch(sock, "READY", {
+            "v": 10, "user": user, "guilds": [{"id": str(GUILD_ID), "unavailable": True}], "session_id": "s",
+            "resume_gateway_url": "ws://unused", "application": {"id": user["id"], "flags": 0},
+        })
+        channels = [
+            {"id": str(OTHER_CHANNEL_ID), "type": 0, "name": "general", "position": 0, "permission_overwrites": []},
+            {"id": str(MARKETPLACE_ID), "type": 0, "name": settings.marketplace_channel_name, "position": 1,
+             "permission_overwrites": []},
+        ]
+        await self._dispatch(sock, "GUILD_CREATE", {
+            "id": str(GUILD_ID), "name": "class", "unavailable": False, "owner_id": "1", "member_count": 1,
+            "roles": [], "members": [], "emojis": [], "stickers": [], "features": [], "channels": channels,
+            "threads": [],
+        })
+
+    async def _dispatch(self, sock: web.WebSocketResponse, event: str, data: dict[str, Any]) -> None:
+        await sock.send_str(json.dumps({"op": 0, "t": event, "s": next(self._seq), "d": data}))
+
+    async def human_says(self, content: str) -> None:
+        """A human posts in the marketplace; every gateway connection gets the event."""
+        author = {"id": "42", "username": "sam", "discriminator": "0", "avatar": None}
+        data = self._message(author, content)
+        data["member"] = {"roles": [], "joined_at": "2026-01-01T00:00:00+00:00", "deaf": False, "mute": False,
+                          "nick": "Sam"}
+        for sock in list(self.sockets):
+            await self._dispatch(sock, "MESSAGE_CREATE", data)
+
+
+@pytest.fixture
+async def discord_api(monkeypatch) -> AsyncIterator[FakeDiscord]:
+    fake = FakeDiscord()
+    app = web.Application()
+    app.add_routes(fake.routes())
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+    monkeypatch.setattr(http.Route, "BASE", f"http://127.0.0.1:{port}/api/v10")
+    monkeypatch.setattr(gateway.DiscordWebSocket, "DEFAULT_GATEWAY", yarl.URL(f"ws://127.0.0.1:{port}/gw"))
+    try:
+        yield fake
+    finally:
+        await runner.cleanup()
+
+
+def _llm() -> LLMGateway:
+    async def create(**kwargs: Any) -> Any:
+        message = SimpleNamespace(content="Fresh beans, two dollars.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(total_tokens=10))
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return LLMGateway(client, requests_per_minute=0, tokens_per_minute=0)  # type: ignore[arg-type]
+
+
+async def _until(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    async def poll() -> None:
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.fixture
+def shared_mode(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "fleet_mode", "shared")
+    monkeypatch.setattr(settings, "discord_guild_id", GUILD_ID)
+    monkeypatch.setattr(settings, "discord_listener_token", "")
+    monkeypatch.setattr(settings, "reply_streaming", False)
+    monkeypatch.setattr(settings, "reply_max_bots", 2)
+    monkeypatch.setattr(settings, "memory_enabled", False)
+
+
+async def test_shared_fleet_listens_once_and_posts_through_each_bot(
+    memory_backend, discord_api, shared_mode, monkeypatch
+) -> None:
+    bots = [await queries.create_bot(f"s{i}", f"Bot{i}", f"t{i}") for i in range(3)]
+
+    fleet = BotFleet(_llm())
+    await fleet.start_all()
+    try:
+        await asyncio.wait_for(fleet._startup_task, 10)  # type: ignore[arg-type]
+
+        # Channel discovery: one gateway connection, the listener's, finds the
+        # marketplace; every sender posts there without a gateway of its own.
+        assert len(discord_api.sockets) == 1
+        assert fleet._listener is not None and fleet._listener.channel_id == MARKETPLACE_ID
+        assert {c.marketplace_channel.id for c in fleet.active_bots.values()} == {MARKETPLACE_ID}
+        assert fleet.stats()["gateway_connections"] == 1
+
+        # A mentioned bot answers alone under reply_policy 'mentioned'.
+        monkeypatch.setattr(settings, "reply_policy", "mentioned")
+        await discord_api.human_says("Bot1, got any coffee?")
+        await _until(lambda: len(discord_api.posts) == 1)
+        assert discord_api.posts == [("t1", MARKETPLACE_ID, "Fresh beans, two dollars.")]
+
+        # Under 'any' the bots not cooling down fill reply_max_bots places.
+        monkeypatch.setattr(settings, "reply_policy", "any")
+        await discord_api.human_says("Anyone selling tea?")
+        await _until(lambda: len(discord_api.posts) == 3)
+        assert sorted(token for token, _, _ in discord_api.posts[1:]) == ["t0", "t2"]
+
+        # Each human message becomes one conversation with every reply in it.
+        conv = (await queries.get_conversations())[0]
+        messages = await queries.get_conversation_messages(conv.id)
+        assert [m.author_type for m in messages] == ["human", "bot", "bot"]
+        assert sorted(m.bot_id for m in messages if m.bot_id) == [bots[0].id, bots[2].id]
+
+        # The scheduler's path: a sender posts with its own token.
+        sent = await fleet.get_bot(bots[2].id).send_to_marketplace("Anyone need filters?")
+        assert sent is not None and sent.author.id == 2002
+        assert discord_api.posts[-1] == ("t2", MARKETPLACE_ID, "Anyone need filters?")
+    finally:
+        await fleet.stop_all()
+
+
+async def test_listener_moves_off_a_stopped_bots_token(memory_backend, discord_api, shared_mode) -> None:
+    bots = [await queries.create_bot(f"s{i}", f"Bot{i}", f"t{i}") for i in range(2)]
+    fleet = BotFleet(_llm())
+    await fleet.start_all()
+    try:
+        await asyncio.wait_for(fleet._startup_task, 10)  # type: ignore[arg-type]
+        assert discord_api.identified == ["t0"]
+        await fleet.stop_bot(bots[0].id)
+        await _until(lambda: fleet._listener is not None and fleet._listener.channel_id == MARKETPLACE_ID)
+        assert discord_api.identified == ["t0", "t1"] and len(discord_api.sockets) == 1
+
+        await discord_api.human_says("Bot1, still open?")
+        await _until(lambda: len(discord_api.posts) == 1)
+        assert discord_api.posts[0][0] == "t1"
+    finally:
+        await fleet.stop_all()
+
+
+async def test_a_failed_listener_is_replaced_by_the_next_bot_started(
+    memory_backend, discord_api, shared_mode, monkeypatch
+) -> None:
+    monkeypatch.setattr(settings, "discord_listener_token", "revoked")
+    first = await queries.create_bot("s0", "Bot0", "t0")
+    fleet = BotFleet(_llm())
+    await fleet.start_bot(first)
+    try:
+        await _until(lambda: fleet._listener is None)
+        assert fleet.get_bot(first.id).marketplace_channel is None
+
+        monkeypatch.setattr(settings, "discord_listener_token", "t9")
+        second = await queries.create_bot("s1", "Bot1", "t1")
+        await fleet.start_bot(second)
+        await _until(lambda: fleet.get_bot(second.id).marketplace_channel is not None)
+        assert discord_api.identified == ["t9"]
+    finally:
+        await fleet.stop_all()
+
+
+def test_memory_figures_are_unavailable_without_proc(monkeypatch) -> None:
+    monkeypatch.setattr(fleet_module, "_rss_bytes", lambda: None)
+    stats = BotFleet(_llm()).stats()
+    assert (stats["rss_mb"], stats["fleet_mb"], stats["mb_per_bot"]) == (None, None, None)
@@ -0,0 +1,52 @@
+"""The file-based batch stand-ins: failures end the batch, and manual mode stays offline."""
+from __future__ import annotations
+
+import asyncio
+import json
+import pathlib
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from mktbook.config import settings
+from mktbook.grading.batch import LocalBatchClient, create_batch_client
+
+pytestmark = pytest.mark.anyio
+
+
+def _input(tmp_path: pathlib.Path, *lines: dict[str, Any]) -> pathlib.Path:
+    path = tmp_path / "requests.jsonl"
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines), encoding="utf-8")
+    return path
+
+
+def _request(custom_id: str) -> dict[str, Any]:
+    body = {"messages": [{"role": "user", "content": "grade"}], "max_tokens": 10, "temperature": 0}
+    return {"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}
+
+
+class _NoCalls:
+    async def chat(self, *_: Any, **__: Any) -> Any:
+        raise AssertionError("the manual stand-in must not call the LLM")
+
+
+async def test_batch_fails_when_processing_it_raises(tmp_path) -> None:
+    client = LocalBatchClient(tmp_path / "local", SimpleNamespace())  # type: ignore[arg-type]
+    batch_id = await client.submit(_input(tmp_path, {"custom_id": "bot-1"}))  # no body: _process raises
+    await asyncio.sleep(0)
+    assert await client.status(batch_id) == "failed"
+
+
+async def test_manual_client_waits_for_a_dropped_output_file(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "grading_batch_client", "manual")
+    client = create_batch_client(_NoCalls())  # type: ignore[arg-type]
+    batch_id = await client.submit(_input(tmp_path, _request("bot-1")))
+    await asyncio.sleep(0)
+    assert await client.status(batch_id) == "in_progress"
+
+    answer = {"custom_id": "bot-1", "response": {"status_code": 200, "body": {}}, "error": None}
+    output = pathlib.Path(settings.grading_batch_dir) / "local" / f"{batch_id}.output.jsonl"
+    output.write_text(json.dumps(answer) + "\n", encoding="utf-8")
+    assert await client.status(batch_id) == "completed"
+    assert await client.results(batch_id) == [answer]
@@ -0,0 +1,84 @@
+"""Incremental grading: unchanged bots keep their verdict, changed ones and full runs call the LLM."""
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from mktbook.db import queries
+from mktbook.db.storage import Storage
+from mktbook.grading.evaluator import GradeEvaluator
+from mktbook.llm.gateway import LLMGateway
+
+pytestmark = pytest.mark.anyio
+
+VERDICT = {"objective_score": 80, "quality_score": 70, "human_score": 60, "volume_score": 50, "reasoning": "fine"}
+
+
+class CountingGrader:
+    """A provider that answers every grading prompt with the same verdict and keeps the prompts."""
+
+    def __init__(self) -> None:
+        self.prompts: list[str] = []
+
+    async def create(self, **kwargs: Any) -> Any:
+        self.prompts.append(kwargs["messages"][-1]["content"])
+        message = SimpleNamespace(content=json.dumps(VERDICT))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(total_tokens=10))
+
+    def graded(self) -> list[str]:
+        """Bot names in the prompts sent since the last call."""
+        names = sorted(p.split("**Bot Name:** ", 1)[-1].split("\n", 1)[0] for p in self.prompts)
+        self.prompts.clear()
+        return names
+
+
+def _evaluator(grader: CountingGrader) -> GradeEvaluator:
+    client = SimpleNamespace(chat=SimpleNamespace(completions=grader))
+    return GradeEvaluator(LLMGateway(client, requests_per_minute=0, tokens_per_minute=0))  # type: ignore[arg-type]
+
+
+async def _say(s: Storage, conv_id: int, bot_id: int, name: str, text: str) -> None:
+    await s.queue_message(conv_id, bot_id, "bot", name, text)
+
+
+async def test_only_changed_bots_are_regraded(backend: Storage) -> None:
+    alpha = await backend.create_bot("s1", "alpha", "t1")
+    beta = await backend.create_bot("s2", "beta", "t2")
+    conv = await backend.queue_conversation("1", "bot-bot", alpha.id, beta.id)
+    await _say(backend, conv.id, alpha.id, "alpha", "selling apples")
+    await _say(backend, conv.id, beta.id, "beta", "buying apples")
+    grader = CountingGrader()
+    evaluator = _evaluator(grader)
+
+    first = await evaluator.grade_all("r1")
+    assert grader.graded() == ["alpha", "beta"]
+    assert all(g.reused_grade_id is None for g in first)
+
+    # Nothing happened since: both verdicts are copied, with no LLM call.
+    second = await evaluator.grade_all("r2")
+    assert grader.graded() == []
+    earlier = {g.bot_id: g.id for g in first}
+    assert {g.bot_id: g.reused_grade_id for g in second} == earlier
+    assert {g.bot_id: g.overall_score for g in second} == {g.bot_id: g.overall_score for g in first}
+
+    # A message in a conversation only beta is sampled from changes beta's prompt alone.
+    solo = await backend.queue_conversation("1", "bot-human", None, beta.id)
+    await _say(backend, solo.id, beta.id, "beta", "pears today")
+    third = {g.bot_id: g for g in await evaluator.grade_all("r3")}
+    assert grader.graded() == ["beta"]
+    assert third[alpha.id].reused_grade_id == earlier[alpha.id]
+    assert third[beta.id].reused_grade_id is None
+
+    # So does a config change.
+    await backend.update_bot(alpha.id, personality="terse")
+    await evaluator.grade_all("r4")
+    assert grader.graded() == ["alpha"]
+
+    # A full run grades everyone again.
+    full = await evaluator.grade_all("r5", full=True)
+    assert grader.graded() == ["alpha", "beta"]
+    assert all(g.reused_grade_id is None for g in full)
+    assert [r.status for r in await backend.get_grading_runs()] == ["finished"] * 5
@@ -0,0 +1,80 @@
+"""Grading jobs: a worker stopped mid-run leaves the rest pending, and the next one finishes that run."""
+from __future__ import annotations
+
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from mktbook.config import settings
+from mktbook.db import queries
+from mktbook.db.storage import Storage
+from mktbook.grading import jobs
+from mktbook.llm.gateway import LLMGateway
+
+pytestmark = pytest.mark.anyio
+
+VERDICT = {"objective_score": 80, "quality_score": 70, "human_score": 60, "volume_score": 50, "reasoning": "fine"}
+
+
+class Grader:
+    """Answers grading prompts in order; after ``answer`` of them, the rest hang until cancelled."""
+
+    def __init__(self, answer: int | None = None) -> None:
+        self.answer = answer
+        self.graded: list[str] = []
+        self.hung = asyncio.Event()
+
+    async def create(self, **kwargs: Any) -> Any:
+        if self.answer is not None and len(self.graded) >= self.answer:
+            self.hung.set()
+            await asyncio.Event().wait()
+        prompt = kwargs["messages"][-1]["content"]
+        self.graded.append(prompt.split("**Bot Name:** ", 1)[-1].split("\n", 1)[0])
+        message = SimpleNamespace(content=json.dumps(VERDICT))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(total_tokens=10))
+
+
+def _llm(grader: Grader) -> LLMGateway:
+    client = SimpleNamespace(chat=SimpleNamespace(completions=grader))
+    return LLMGateway(client, requests_per_minute=0, tokens_per_minute=0)  # type: ignore[arg-type]
+
+
+async def _stop(task: asyncio.Task[None]) -> None:
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+async def test_a_restarted_worker_grades_only_the_pending_bots(backend: Storage, monkeypatch) -> None:
+    monkeypatch.setattr(jobs, "_wakeup", asyncio.Event())
+    monkeypatch.setattr(settings, "grading_concurrency", 1)
+    bots = [await backend.create_bot(f"s{i}", f"bot{i}", f"t{i}") for i in range(3)]
+    run = await jobs.enqueue_grading()
+
+    # The first worker grades one bot, then is stopped while waiting on the second.
+    first = Grader(answer=1)
+    worker = asyncio.create_task(jobs.run_grading_worker(_llm(first)))
+    await asyncio.wait_for(first.hung.wait(), 5)
+    await _stop(worker)
+
+    assert (await queries.get_grading_run(run.id)).status == "running"
+    entries = {e.bot_id: e.status for e in await queries.get_grading_run_bots(run.id)}
+    [done_id] = [bot_id for bot_id, status in entries.items() if status == "done"]
+    assert sorted(entries.values()) == ["done", "pending", "pending"]
+
+    second = Grader()
+    worker = asyncio.create_task(jobs.run_grading_worker(_llm(second)))
+    while (await queries.get_grading_run(run.id)).status != "finished":
+        await asyncio.sleep(0.01)
+    await _stop(worker)
+
+    names = {b.id: b.bot_name for b in bots}
+    assert first.graded == [names[done_id]]
+    assert sorted(second.graded) == sorted(name for bot_id, name in names.items() if bot_id != done_id)
+    grades = await queries.get_grades_by_run(run.id)
+    assert sorted(g.bot_id for g in grades) == sorted(names)
+    assert [r.id for r in await queries.get_grading_runs()] == [run.id]
+    assert {e.status for e in await queries.get_grading_run_bots(run.id)} == {"done"}
@@ -0,0 +1,213 @@
+"""The LLM gateway: admission by priority, the concurrency cap, both budgets, and queue metrics.
+
+A fake provider holds each call until the test releases it, and a fake
+clock stands in for ``time.monotonic`` inside the gateway, so budgets
+refill only when the test says so.
+"""
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from mktbook.llm import gateway
+from mktbook.llm.gateway import LLMGateway, Priority
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeStream:
+    def __init__(self, pieces: list[str]) -> None:
+        self.pieces = pieces
+        self.closed = False
+
+    def __aiter__(self) -> Any:
+        return self._chunks()
+
+    async def _chunks(self) -> Any:
+        for piece in self.pieces:
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+        yield SimpleNamespace(usage=SimpleNamespace(total_tokens=42), choices=[])
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def _gateway(stream: FakeStream) -> LLMGateway:
+    async def create(**_: Any) -> FakeStream:
+        return stream
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return LLMGateway(client, requests_per_minute=0, tokens_per_minute=0)  # type: ignore[arg-type]
+
+
+def _chat(llm: LLMGateway) -> Any:
+    return llm.stream_chat(Priority.HUMAN, [{"role": "user", "content": "hi"}], max_tokens=10, temperature=0)
+
+
+async def test_stream_is_closed_when_read_to_the_end() -> None:
+    stream = FakeStream(["he", "llo"])
+    llm = _gateway(stream)
+    assert [piece async for piece in _chat(llm)] == ["he", "llo"]
+    assert stream.closed and llm.stats()["active"] == 0
+
+
+async def test_stream_is_closed_when_the_caller_stops_early() -> None:
+    stream = FakeStream(["he", "llo"])
+    llm = _gateway(stream)
+    reply = _chat(llm)
+    assert await reply.__anext__() == "he"
+    await reply.aclose()
+    assert stream.closed and llm.stats()["active"] == 0
+
+
+class HeldProvider:
+    """``chat.completions.create`` that records who got through and waits to be released."""
+
+    def __init__(self) -> None:
+        self.started: list[str] = []
+        self.active = self.peak = 0
+        self._gates: dict[str, asyncio.Event] = {}
+
+    def gate(self, name: str) -> asyncio.Event:
+        return self._gates.setdefault(name, asyncio.Event())
+
+    async def create(self, **kwargs: Any) -> Any:
+        name = kwargs["messages"][-1]["content"]
+        self.started.append(name)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await self.gate(name).wait()
+        finally:
+            self.active -= 1
+        message = SimpleNamespace(content="ok")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(total_tokens=10))
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(gateway, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def _held_gateway(provider: HeldProvider, **limits: int) -> LLMGateway:
+    client = SimpleNamespace(chat=SimpleNamespace(completions=provider))
+    limits = {"requests_per_minute": 0, "tokens_per_minute": 0, **limits}
+    return LLMGateway(client, **limits)  # type: ignore[arg-type]
+
+
+def _call(llm: LLMGateway, priority: Priority, name: str, max_tokens: int = 10) -> asyncio.Task[Any]:
+    messages = [{"role": "user", "content": name}]
+    return asyncio.create_task(llm.chat(priority, messages, max_tokens=max_tokens, temperature=0))
+
+
+async def _run_ready() -> None:
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+async def test_waiting_calls_are_admitted_by_priority() -> None:
+    provider = HeldProvider()
+    llm = _held_gateway(provider, max_concurrency=1)
+    calls = [_call(llm, Priority.GRADING, "grading-1")]
+    await _run_ready()
+    # Queued lowest priority first; each class must still overtake the ones below it.
+    for priority, name in [(Priority.MEMORY, "memory"), (Priority.GRADING, "grading-2"),
+                           (Priority.CONVERSATION, "conversation"), (Priority.HUMAN, "human")]:
+        calls.append(_call(llm, priority, name))
+        await _run_ready()
+    assert provider.started == ["grading-1"]
+
+    for name in ["grading-1", "human", "conversation", "grading-2"]:
+        provider.gate(name).set()
+        await _run_ready()
+    provider.gate("memory").set()
+    await asyncio.gather(*calls)
+    assert provider.started == ["grading-1", "human", "conversation", "grading-2", "memory"]
+
+
+async def test_concurrency_cap_holds_under_a_burst() -> None:
+    provider = HeldProvider()
+    llm = _held_gateway(provider, max_concurrency=3)
+    calls = [_call(llm, Priority.GRADING, f"call-{i}") for i in range(10)]
+    await _run_ready()
+    assert (provider.active, llm.stats()["active"]) == (3, 3)
+
+    for i in range(10):
+        provider.gate(f"call-{i}").set()
+        await _run_ready()
+    await asyncio.gather(*calls)
+    assert provider.peak == 3 and len(provider.started) == 10
+    assert llm.stats()["active"] == 0
+
+
+async def test_request_budget_spaces_calls_out(clock) -> None:
+    provider = HeldProvider()
+    for i in range(3):
+        provider.gate(f"call-{i}").set()
+    llm = _held_gateway(provider, requests_per_minute=2)
+    calls = [_call(llm, Priority.HUMAN, f"call-{i}") for i in range(3)]
+    await _run_ready()
+    assert provider.started == ["call-0", "call-1"]  # the bucket starts full
+
+    clock.now += 29  # one request refills every 30 seconds
+    llm._dispatch()
+    await _run_ready()
+    assert len(provider.started) == 2
+
+    clock.now += 1
+    llm._dispatch()  # what the gateway's wake-up timer does
+    await asyncio.gather(*calls)
+    assert provider.started == ["call-0", "call-1", "call-2"]
+
+
+async def test_token_budget_is_settled_against_actual_usage(clock) -> None:
+    provider = HeldProvider()
+    llm = _held_gateway(provider, tokens_per_minute=100)
+    # Each call is estimated at 4 framing + 50 reply tokens = 54; two do not fit in 100.
+    first = _call(llm, Priority.HUMAN, "first", max_tokens=50)
+    second = _call(llm, Priority.HUMAN, "second", max_tokens=50)
+    await _run_ready()
+    assert provider.started == ["first"]
+    assert llm._wakeup is not None  # a refill is scheduled
+
+    # The first call used 10 tokens, not 54; the difference goes back in the bucket.
+    provider.gate("first").set()
+    provider.gate("second").set()
+    await first
+    await second
+    assert provider.started == ["first", "second"]
+    assert llm.stats()["classes"]["human"]["tokens"] == 20
+
+
+async def test_queue_wait_is_measured_per_class(clock) -> None:
+    provider = HeldProvider()
+    llm = _held_gateway(provider, max_concurrency=1)
+    grading = _call(llm, Priority.GRADING, "grading")
+    await _run_ready()
+    human = _call(llm, Priority.HUMAN, "human")
+    await _run_ready()
+
+    clock.now += 5
+    provider.gate("grading").set()
+    provider.gate("human").set()
+    await asyncio.gather(grading, human)
+
+    classes = llm.stats()["classes"]
+    assert (classes["human"]["requests"], classes["human"]["wait_seconds"], classes["human"]["max_wait_seconds"]) == (
+        1, 5.0, 5.0,
+    )
+    assert (classes["grading"]["requests"], classes["grading"]["wait_seconds"]) == (1, 0.0)
+    assert classes["conversation"]["requests"] == 0
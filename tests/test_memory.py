@@ -0,0 +1,83 @@
+"""Memory updates move past conversations that never ended; the scheduler always ends its own."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from mktbook.bots import memory
+from mktbook.config import settings
+from mktbook.db import queries
+from mktbook.db.storage import Storage
+from mktbook.llm.gateway import LLMGateway
+from mktbook.scheduler import loop
+
+pytestmark = pytest.mark.anyio
+
+
+def _summarizer(prompts: list[str]) -> LLMGateway:
+    async def create(**kwargs: Any) -> Any:
+        prompts.append(kwargs["messages"][-1]["content"])
+        message = SimpleNamespace(content=f"summary {len(prompts)}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(total_tokens=10))
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return LLMGateway(client, requests_per_minute=0, tokens_per_minute=0)  # type: ignore[arg-type]
+
+
+async def _conversations(s: Storage, bot_id: int, *ended: bool) -> list[int]:
+    ids = []
+    for i, end in enumerate(ended):
+        conv = await s.queue_conversation("1", "bot-human", None, bot_id)
+        await s.queue_message(conv.id, bot_id, "bot", "alpha", f"reply {i}")
+        if end:
+            await s.queue_end_conversation(conv.id, 1)
+        ids.append(conv.id)
+    return ids
+
+
+async def test_a_running_conversation_holds_back_later_ones(backend: Storage) -> None:
+    bot = await backend.create_bot("s1", "alpha", "t1")
+    first, running, _ = await _conversations(backend, bot.id, True, False, True)
+    prompts: list[str] = []
+    result = await memory.update_memory(_summarizer(prompts), bot)
+    assert result.last_conversation_id == first
+    assert f"#{running}" not in prompts[0]
+
+
+async def test_a_stale_open_conversation_is_skipped(backend: Storage, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "memory_open_conversation_timeout", 0)
+    bot = await backend.create_bot("s1", "alpha", "t1")
+    first, abandoned, last = await _conversations(backend, bot.id, True, False, True)
+    prompts: list[str] = []
+    result = await memory.update_memory(_summarizer(prompts), bot)
+    assert result.last_conversation_id == last
+    assert f"#{first}" in prompts[0] and f"#{last}" in prompts[0] and f"#{abandoned}" not in prompts[0]
+
+
+async def test_scheduler_ends_a_conversation_that_fails_midway(backend: Storage, monkeypatch) -> None:
+    monkeypatch.setattr(loop, "MESSAGE_PACE_SECONDS", 0)
+    monkeypatch.setattr(memory, "_pending", set())
+    rows = [await backend.create_bot(f"s{i}", f"bot{i}", f"t{i}") for i in range(2)]
+
+    async def send(text: str) -> None:
+        return None
+
+    async def speak(_: Any) -> str:
+        return "offer"
+
+    async def fail(_: Any) -> str:
+        raise RuntimeError("LLM down")
+
+    initiator = SimpleNamespace(bot_row=rows[0], marketplace_channel=None, generate_response=speak,
+                                send_to_marketplace=send)
+    responder = SimpleNamespace(bot_row=rows[1], marketplace_channel=None, generate_response=fail,
+                                send_to_marketplace=send)
+    scheduler = loop.ConversationScheduler(fleet=None)  # type: ignore[arg-type]
+    with pytest.raises(RuntimeError):
+        await scheduler._run_conversation(initiator, responder)
+
+    [conv] = await queries.get_conversations()
+    assert (conv.ended_ms is not None, conv.turn_count) == (True, 0)
+    assert memory._pending == {rows[0].id, rows[1].id}
@@ -0,0 +1,123 @@
+"""Page renders and grading runs issue a fixed number of queries, whatever the fleet size.
+
+Each scenario runs against a small and a larger seeded database and counts
+the statements sent over the reader and writer connections. Reads must not
+grow with the number of bots; a grading run writes one grade per bot.
+"""
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+from typing import Any
+
+import aiosqlite
+import httpx
+import pytest
+
+from mktbook.config import settings
+from mktbook.db import queries
+from mktbook.grading.evaluator import GradeEvaluator
+from mktbook.llm.gateway import LLMGateway
+from mktbook.web.app import create_app
+from mktbook.web.websocket import WSManager
+
+pytestmark = pytest.mark.anyio
+
+SMALL, LARGE = 2, 8
+PAGES = ["/", "/bots", "/bots/1", "/grading", "/messages", "/api/bots", "/api/leaderboard", "/api/grades"]
+_COUNTED = {"SELECT": "reads", "WITH": "reads", "INSERT": "writes", "UPDATE": "writes", "DELETE": "writes"}
+
+
+class QueryCounter:
+    def __init__(self) -> None:
+        self.reads = self.writes = 0
+
+    def reset(self) -> None:
+        self.reads = self.writes = 0
+
+    def count(self, sql: str) -> None:
+        kind = _COUNTED.get(sql.lstrip().split(None, 1)[0].upper())
+        if kind:
+            setattr(self, kind, getattr(self, kind) + 1)
+
+
+@pytest.fixture
+def counter(monkeypatch) -> QueryCounter:
+    """Counts statements on every reader and writer connection."""
+    counter = QueryCounter()
+    execute, executemany = aiosqlite.Connection.execute, aiosqlite.Connection.executemany
+
+    async def counted_execute(self: aiosqlite.Connection, sql: str, parameters: Any = None) -> Any:
+        counter.count(sql)
+        return await execute(self, sql, parameters)
+
+    async def counted_executemany(self: aiosqlite.Connection, sql: str, parameters: Any) -> Any:
+        counter.count(sql)
+        return await executemany(self, sql, parameters)
+
+    monkeypatch.setattr(aiosqlite.Connection, "execute", counted_execute)
+    monkeypatch.setattr(aiosqlite.Connection, "executemany", counted_executemany)
+    monkeypatch.setattr(settings, "query_cache_ttl", 0)  # count real queries, not cache hits
+    return counter
+
+
+def _grading_llm() -> LLMGateway:
+    verdict = json.dumps({
+        "objective_score": 70, "quality_score": 60, "human_score": 50, "volume_score": 40, "reasoning": "ok",
+    })
+
+    async def create(**_: Any) -> Any:
+        message = SimpleNamespace(content=verdict)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(total_tokens=100))
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return LLMGateway(client, requests_per_minute=0, tokens_per_minute=0)  # type: ignore[arg-type]
+
+
+async def _seed(n_bots: int, first: int = 0) -> None:
+    """``n_bots`` more bots, each with conversations, messages, a human exchange and a grade."""
+    bots = [await queries.create_bot(f"student{i}", f"bot{i}", f"token{i}") for i in range(first, first + n_bots)]
+    for i, bot in enumerate(bots):
+        partner = bots[(i + 1) % n_bots]
+        for turn in range(2):
+            conv = await queries.queue_conversation("1", "bot-bot", bot.id, partner.id)
+            await queries.queue_message(conv.id, bot.id, "bot", bot.bot_name, f"offer {turn}")
+            await queries.queue_message(conv.id, partner.id, "bot", partner.bot_name, f"counter {turn}")
+            await queries.queue_end_conversation(conv.id, 2)
+        conv = await queries.queue_conversation("1", "bot-human", None, bot.id)
+        await queries.queue_message(conv.id, None, "human", "sam", "hello?")
+        await queries.queue_end_conversation(conv.id, 1)
+    await GradeEvaluator(_grading_llm()).grade_all(f"seed{first}", full=True)
+
+
+async def _page_counts(counter: QueryCounter) -> dict[str, tuple[int, int]]:
+    app = create_app(WSManager())
+    counts = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        for path in PAGES:
+            counter.reset()
+            response = await client.get(path)
+            assert response.status_code == 200, path
+            counts[path] = (counter.reads, counter.writes)
+    return counts
+
+
+async def test_page_queries_do_not_grow_with_bots(sqlite_backend, counter) -> None:
+    await _seed(SMALL)
+    small = await _page_counts(counter)
+    await _seed(LARGE - SMALL, first=SMALL)
+    assert await _page_counts(counter) == small
+
+
+async def test_grading_queries_do_not_grow_with_bots(sqlite_backend, counter) -> None:
+    per_size = {}
+    for first, n_bots in ((0, SMALL), (SMALL, LARGE)):
+        await _seed(n_bots - first, first)
+        counter.reset()
+        grades = await GradeEvaluator(_grading_llm()).grade_all(f"run{n_bots}", full=True)
+        per_size[n_bots] = (counter.reads, counter.writes, len(grades))
+
+    (small_reads, small_writes, small_graded), (large_reads, large_writes, large_graded) = per_size.values()
+    assert large_reads == small_reads
+    # One grade per bot, written together with the bot's entry in the run.
+    assert (large_writes - small_writes) == (large_graded - small_graded) * 2
@@ -0,0 +1,185 @@
+"""Every SQLite query is served by an index: none falls back to a full table scan.
+
+Each storage call runs against a small seeded database with the archive tier
+in use. Every statement it sends is explained on the same connection, so the
+plans see the attached archives too.
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, Awaitable, Callable
+
+import aiosqlite
+import pytest
+
+from mktbook.config import settings
+from mktbook.db import archive, queries
+
+pytestmark = pytest.mark.anyio
+
+# Whole-table reads that are the point of the call, keyed by (storage call,
+# table or alias as the plan names it). Anything else that reads a whole
+# table or index fails the test.
+FULL_SCAN_ALLOWED = {
+    # The scheduler weighs every pair of bots; one small row per pair that has talked.
+    ("get_pair_counts", "conversation_pairs"): "every row is needed",
+    # The bot list, the leaderboard and the stats table show every bot; one row per bot.
+    ("get_all_bots", "bots"): "lists every bot",
+    ("get_latest_grades", "l"): "the leaderboard ranks every bot",
+    ("get_all_bot_stats", "b"): "stats for every bot",
+    # Maintenance commands that recompute from everything, run by hand.
+    ("rebuild_bot_stats", "b"): "recounts every bot",
+    ("rebuild_search_index", "messages"): "reindexes every message",
+    # The export stream with no resume key starts at the oldest conversation.
+    ("iter_conversations", "main.conversations"): "streams every conversation",
+}
+
+_EXPLAINED = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+# "SCAN t" reads every row of t. "SCAN t USING [COVERING] INDEX i" reads every
+# entry of i instead, which is no better unless a LIMIT stops the walk early.
+_SCAN = re.compile(r"^SCAN ([\w.]+)(?: AS \w+)?( USING (?:COVERING )?INDEX \w+)?$")
+_LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+
+
+def _full_scans(sql: str, plan: list[str]) -> list[str]:
+    # Rows of a WITH clause, e.g. a VALUES list of ids, are the query's own input.
+    ctes = set(re.findall(r"(\w+)\s*(?:\([^)]*\))?\s+AS\s*\(", sql))
+    ctes |= {alias for cte in ctes for alias in re.findall(rf"\b{cte}\s+(?:AS\s+)?(\w+)", sql)}
+    limited = bool(_LIMIT.search(sql))
+    return [
+        match.group(1) for line in plan
+        if (match := _SCAN.match(line)) and match.group(1) not in ctes and not (match.group(2) and limited)
+    ]
+
+
+@pytest.fixture
+def plans(monkeypatch) -> tuple[dict[str, list[tuple[str, list[str]]]], list[str]]:
+    """Record the query plan of every statement, filed under the storage call running it."""
+    recorded: dict[str, list[tuple[str, list[str]]]] = {}
+    current = ["setup"]
+    execute = aiosqlite.Connection.execute
+
+    async def explain_then_execute(self: aiosqlite.Connection, sql: str, parameters: Any = None) -> Any:
+        if sql.lstrip().split(None, 1)[0].upper() in _EXPLAINED:
+            cursor = await execute(self, "EXPLAIN QUERY PLAN " + sql, parameters or ())
+            plan = [row[3] for row in await cursor.fetchall()]
+            recorded.setdefault(current[0], []).append((" ".join(sql.split()), plan))
+        return await execute(self, sql, parameters)
+
+    monkeypatch.setattr(aiosqlite.Connection, "execute", explain_then_execute)
+    monkeypatch.setattr(settings, "query_cache_ttl", 0)  # cached reads would skip their SQL
+    return recorded, current
+
+
+async def _seed() -> dict[str, Any]:
+    alpha = await queries.create_bot("s1", "alpha", "t1", objective="sell coffee")
+    beta = await queries.create_bot("s2", "beta", "t2")
+    convs = []
+    for i in range(4):
+        conv = await queries.queue_conversation("1", "bot-bot", alpha.id, beta.id)
+        await queries.queue_message(conv.id, alpha.id, "bot", "alpha", f"fresh coffee beans {i}")
+        await queries.queue_message(conv.id, None, "human", "sam", "how much is the coffee?")
+        await queries.queue_end_conversation(conv.id, 2)
+        convs.append(conv)
+        if i == 1:
+            # The first two go to the archive tier.
+            await archive.archive_conversations(older_than_days=0)
+    await queries.queue_increment_pair(alpha.id, beta.id)
+    await queries.index_pending_messages()
+    return {"alpha": alpha, "beta": beta, "convs": convs}
+
+
+async def _drain(iterator: Any) -> list[Any]:
+    return [row async for row in iterator]
+
+
+def _calls(seed: dict[str, Any]) -> list[tuple[str, Callable[[], Awaitable[Any]]]]:
+    """One or more invocations of every storage function, by name."""
+    a, b = seed["alpha"].id, seed["beta"].id
+    conv = seed["convs"][-1].id
+    page = (2**62, 2**62)
+    return [
+        ("create_bot", lambda: queries.create_bot("s3", "gamma", "t3")),
+        ("get_bot", lambda: queries.get_bot(a)),
+        ("get_bot_by_name", lambda: queries.get_bot_by_name("alpha")),
+        ("get_bots_by_ids", lambda: queries.get_bots_by_ids([a, b])),
+        ("get_all_bots", queries.get_all_bots),
+        ("get_active_bots", queries.get_active_bots),
+        ("update_bot", lambda: queries.update_bot(b, personality="calm")),
+        ("create_conversation", lambda: queries.create_conversation("1", "bot-human", None, a)),
+        ("queue_conversation", lambda: queries.queue_conversation("1", "bot-bot", a, b)),
+        ("end_conversation", lambda: queries.end_conversation(conv, 2)),
+        ("queue_end_conversation", lambda: queries.queue_end_conversation(conv, 2)),
+        ("get_conversations", queries.get_conversations),
+        ("get_conversations", lambda: queries.get_conversations(before=page)),
+        ("iter_conversations", lambda: _drain(queries.iter_conversations())),
+        ("iter_conversations", lambda: _drain(queries.iter_conversations(after=(0, 0), include_archive=True))),
+        ("get_bot_conversations", lambda: queries.get_bot_conversations(a)),
+        ("get_recent_conversations_for_bots", lambda: queries.get_recent_conversations_for_bots([a, b])),
+        ("get_recent_conversations_for_bots",
+         lambda: queries.get_recent_conversations_for_bots([a, b], include_archive=True)),
+        ("get_conversations_since", lambda: queries.get_conversations_since(a, 0)),
+        ("create_message", lambda: queries.create_message(conv, b, "bot", "beta", "two cups")),
+        ("queue_message", lambda: queries.queue_message(conv, None, "human", "sam", "thanks")),
+        ("get_conversation_messages", lambda: queries.get_conversation_messages(conv)),
+        ("get_conversation_messages", lambda: queries.get_conversation_messages(conv, include_archive=True)),
+        ("get_messages_for_conversations", lambda: queries.get_messages_for_conversations([conv, conv - 1])),
+        ("get_messages_for_conversations",
+         lambda: queries.get_messages_for_conversations([conv], include_archive=True)),
+        ("get_messages", queries.get_messages),
+        ("get_messages", lambda: queries.get_messages(bot_id=a, before=page)),
+        ("iter_messages", lambda: _drain(queries.iter_messages(bot_id=a))),
+        ("iter_messages", lambda: _drain(queries.iter_messages(after=(0, 0), include_archive=True))),
+        ("search_messages", lambda: queries.search_messages("coffee")),
+        ("search_messages",
+         lambda: queries.search_messages("coffee", bot_id=a, author_type="bot", since="2000-01-01", until="2999-01-01")),
+        ("index_pending_messages", queries.index_pending_messages),
+        ("rebuild_search_index", queries.rebuild_search_index),
+        ("get_pair_counts", queries.get_pair_counts),
+        ("increment_pair", lambda: queries.increment_pair(a, b)),
+        ("queue_increment_pair", lambda: queries.queue_increment_pair(b, a)),
+        ("create_grading_run", lambda: queries.create_grading_run("r1", [a, b])),
+        ("start_grading_run", lambda: queries.start_grading_run("r1")),
+        ("create_grade", lambda: queries.create_grade(a, "r1", 1, 2, 3, 4, 5, "ok", 1, 1, 1, input_hash="h")),
+        ("fail_grading_bot", lambda: queries.fail_grading_bot("r1", b, "timeout")),
+        ("set_grading_run_batch", lambda: queries.set_grading_run_batch("r1", "batch-1")),
+        ("get_grading_run_bots", lambda: queries.get_grading_run_bots("r1")),
+        ("get_unfinished_grading_runs", queries.get_unfinished_grading_runs),
+        ("finish_grading_run", lambda: queries.finish_grading_run("r1")),
+        ("create_grading_run", lambda: queries.create_grading_run("r2", [a])),
+        ("fail_grading_run", lambda: queries.fail_grading_run("r2")),
+        ("get_grading_run", lambda: queries.get_grading_run("r1")),
+        ("get_grading_runs", queries.get_grading_runs),
+        ("get_bot_grades", lambda: queries.get_bot_grades(a)),
+        ("get_grades", queries.get_grades),
+        ("get_grades", lambda: queries.get_grades(bot_id=a, before=page)),
+        ("get_latest_grades", queries.get_latest_grades),
+        ("get_grades_by_input_hash", lambda: queries.get_grades_by_input_hash(["h", "missing"])),
+        ("get_grades_by_run", lambda: queries.get_grades_by_run("r1")),
+        ("save_bot_memory", lambda: queries.save_bot_memory(a, "likes coffee", conv)),
+        ("get_bot_memory", lambda: queries.get_bot_memory(a)),
+        ("get_bot_stats", lambda: queries.get_bot_stats(a)),
+        ("get_all_bot_stats", queries.get_all_bot_stats),
+        ("rebuild_bot_stats", queries.rebuild_bot_stats),
+        ("delete_bot", lambda: queries.delete_bot(seed["alpha"].id + 2)),
+    ]
+
+
+async def test_no_query_scans_a_whole_table(sqlite_backend, plans) -> None:
+    recorded, current = plans
+    calls = _calls(await _seed())
+    for name, call in calls:
+        current[0] = name
+        await call()
+
+    public = {name for name in queries.STORAGE_NAMES if name != "cache_stats"}
+    assert public == {name for name, _ in calls}, "every storage function is exercised"
+
+    offenders = [
+        f"{name}: {sql[:100]}\n    " + "\n    ".join(plan)
+        for name, statements in recorded.items()
+        if name != "setup"
+        for sql, plan in statements
+        if any((name, table) not in FULL_SCAN_ALLOWED for table in _full_scans(sql, plan))
+    ]
+    assert not offenders, "full table scans:\n" + "\n".join(offenders)
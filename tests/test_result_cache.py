@@ -0,0 +1,110 @@
+"""The SQLite result cache: one fill per miss, invalidation on writes, keyword calls, bounded size."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from mktbook.config import settings
+from mktbook.db import queries, sqlite_storage
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_keyword_and_positional_calls_share_an_entry(sqlite_backend) -> None:
+    bot = await queries.create_bot("s1", "alpha", "t1")
+    assert (await sqlite_storage.get_bot(bot_id=bot.id)).bot_name == "alpha"
+    assert (await sqlite_storage.get_bot(bot.id)).bot_name == "alpha"
+    stats = queries.cache_stats()
+    assert (stats["entries"], stats["misses"], stats["hits"]) == (1, 1, 1)
+
+
+async def test_least_recently_used_entries_are_evicted(sqlite_backend, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "query_cache_max_entries", 2)
+    bots = [await queries.create_bot(f"s{i}", f"bot{i}", f"t{i}") for i in range(3)]
+    await queries.get_bot(bots[0].id)
+    await queries.get_bot(bots[1].id)
+    await queries.get_bot(bots[0].id)  # bots[1] is now the oldest
+    await queries.get_bot(bots[2].id)
+
+    stats = queries.cache_stats()
+    assert (stats["entries"], stats["evictions"]) == (2, 1)
+    await queries.get_bot(bots[0].id)
+    assert queries.cache_stats()["hits"] == stats["hits"] + 1
+    await queries.get_bot(bots[1].id)
+    assert queries.cache_stats()["misses"] == stats["misses"] + 1
+
+
+class SlowFill:
+    """A fill that counts its calls and returns only once released."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> list[int]:
+        self.calls += 1
+        call = self.calls
+        await self.release.wait()
+        return [call]
+
+
+async def test_concurrent_misses_share_one_fill() -> None:
+    cache, fill = sqlite_storage._ResultCache(), SlowFill()
+    readers = [asyncio.create_task(cache.get("key", ("bots",), fill)) for _ in range(5)]
+    await asyncio.sleep(0)
+    fill.release.set()
+    assert await asyncio.gather(*readers) == [[1]] * 5
+    assert fill.calls == 1
+    assert (cache.stats()["misses"], cache.stats()["coalesced"]) == (1, 4)
+
+
+async def test_a_fill_that_raced_a_write_is_not_stored() -> None:
+    cache, fill = sqlite_storage._ResultCache(), SlowFill()
+    before_write = asyncio.create_task(cache.get("key", ("bots",), fill))
+    while not fill.calls:
+        await asyncio.sleep(0)
+    cache.invalidate("bots")
+    # A reader after the write does not join the fill that read before it.
+    after_write = asyncio.create_task(cache.get("key", ("bots",), fill))
+    while fill.calls < 2:
+        await asyncio.sleep(0)
+    fill.release.set()
+    assert (await before_write, await after_write) == ([1], [2])
+    assert cache.stats()["entries"] == 1
+    assert await cache.get("key", ("bots",), fill) == [2]
+
+
+async def test_a_failed_fill_leaves_nothing_behind() -> None:
+    cache = sqlite_storage._ResultCache()
+
+    async def fail() -> None:
+        raise RuntimeError("database is locked")
+
+    with pytest.raises(RuntimeError):
+        await cache.get("key", ("bots",), fail)
+    assert cache.stats()["entries"] == cache.stats()["inflight"] == 0
+    assert cache._keys_by_table == {}
+
+
+async def test_bot_writes_invalidate_cached_reads(sqlite_backend) -> None:
+    alpha = await queries.create_bot("s1", "alpha", "t1")
+    assert [b.bot_name for b in await queries.get_active_bots()] == ["alpha"]
+    assert len(await queries.get_all_bots()) == 1
+    await queries.get_all_bots()
+    assert queries.cache_stats()["hits"] == 1  # the reads below would be served from the cache
+
+    beta = await queries.create_bot("s2", "beta", "t2")
+    assert sorted(b.bot_name for b in await queries.get_all_bots()) == ["alpha", "beta"]
+    assert sorted(b.bot_name for b in await queries.get_active_bots()) == ["alpha", "beta"]
+
+    assert (await queries.get_bot(beta.id)).is_active
+    await queries.update_bot(beta.id, is_active=False, personality="quiet")
+    assert (await queries.get_bot(beta.id)).personality == "quiet"
+    assert [b.bot_name for b in await queries.get_active_bots()] == ["alpha"]
+
+    await queries.delete_bot(alpha.id)
+    assert await queries.get_bot(alpha.id) is None
+    assert await queries.get_bot_by_name("alpha") is None
+    assert [b.bot_name for b in await queries.get_all_bots()] == ["beta"]
+    assert await queries.get_active_bots() == []
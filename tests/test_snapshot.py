@@ -0,0 +1,29 @@
+"""Online snapshots copy the live database step by step, pausing between steps."""
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+
+from mktbook.config import settings
+from mktbook.db import queries, snapshot
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_snapshot_pauses_between_steps(sqlite_backend, monkeypatch) -> None:
+    bot = await queries.create_bot("s1", "alpha", "t1")
+    conv = await queries.create_conversation("1", "bot-human", None, bot.id)
+    for i in range(50):
+        await queries.queue_message(conv.id, bot.id, "bot", "alpha", f"message {i} " * 50)
+
+    pauses: list[float] = []
+    monkeypatch.setattr(snapshot.time, "sleep", pauses.append)
+    monkeypatch.setattr(settings, "snapshot_step_pages", 4)
+    monkeypatch.setattr(settings, "snapshot_step_sleep_ms", 7)
+    result = await snapshot.take_snapshot()
+
+    steps = -(-result["pages"] // 4)
+    assert pauses == [0.007] * (steps - 1)  # none after the last step
+    with sqlite3.connect(result["path"]) as copy:
+        assert copy.execute("SELECT COUNT(*) FROM messages").fetchone() == (50,)
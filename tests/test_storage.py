@@ -0,0 +1,243 @@
+"""Both storage backends give the same answers through the Storage interface.
+
+Every test runs once per backend (see the ``backend`` fixture), so a
+behaviour asserted here is one the rest of the app may rely on whichever
+backend is configured.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from mktbook.db import queries
+from mktbook.db.storage import Storage
+
+pytestmark = pytest.mark.anyio
+
+
+async def _seed(s: Storage, conversations: int = 6) -> dict[str, Any]:
+    """Two bots trading messages; every other conversation has a human in it."""
+    alpha = await s.create_bot("s1", "alpha", "t1", objective="sell coffee")
+    beta = await s.create_bot("s2", "beta", "t2")
+    convs = []
+    for i in range(conversations):
+        conv = await s.queue_conversation("1", "bot-bot", alpha.id, beta.id)
+        for turn in range(3):
+            speaker = alpha if turn % 2 == 0 else beta
+            await s.queue_message(conv.id, speaker.id, "bot", speaker.bot_name, f"fresh coffee offer {i}.{turn}")
+        if i % 2:
+            await s.create_message(conv.id, None, "human", "sam", "Coffee for me please")
+        await s.queue_end_conversation(conv.id, 3)
+        await s.queue_increment_pair(beta.id, alpha.id)
+        convs.append(conv)
+    while await s.index_pending_messages():
+        pass
+    return {"alpha": alpha, "beta": beta, "convs": convs}
+
+
+# ── Bots ──────────────────────────────────────────────────────────────
+
+async def test_bots(backend: Storage) -> None:
+    alpha = await backend.create_bot("s1", "alpha", "t1", personality="brisk")
+    beta = await backend.create_bot("s2", "beta", "t2")
+    with pytest.raises(Exception):
+        await backend.create_bot("s3", "alpha", "t3")
+
+    assert (await backend.get_bot(alpha.id)).personality == "brisk"
+    assert (await backend.get_bot_by_name("beta")).id == beta.id
+    assert await backend.get_bot(999) is None
+    assert sorted(await backend.get_bots_by_ids([alpha.id, beta.id, 999])) == [alpha.id, beta.id]
+
+    updated = await backend.update_bot(beta.id, is_active=False, objective="buy tea")
+    assert (updated.objective, updated.is_active) == ("buy tea", False)
+    assert sorted(b.bot_name for b in await backend.get_all_bots()) == ["alpha", "beta"]
+    assert [b.bot_name for b in await backend.get_active_bots()] == ["alpha"]
+
+    await backend.delete_bot(beta.id)
+    assert await backend.get_bot(beta.id) is None
+    assert [b.bot_name for b in await backend.get_all_bots()] == ["alpha"]
+
+
+async def test_backend_is_behind_queries(backend: Storage) -> None:
+    bot = await backend.create_bot("s1", "alpha", "t1")
+    assert (await queries.get_bot(bot.id)).bot_name == "alpha"
+
+
+# ── Conversations and messages ────────────────────────────────────────
+
+async def test_conversation_pages_are_newest_first_and_disjoint(backend: Storage) -> None:
+    convs = (await _seed(backend))["convs"]
+    first = await backend.get_conversations(limit=4)
+    last = first[-1]
+    rest = await backend.get_conversations(limit=4, before=(last.started_ms, last.id))
+    assert [c.id for c in first + rest] == [c.id for c in reversed(convs)]
+    assert all(c.turn_count == 3 and c.ended_ms is not None for c in first + rest)
+
+
+async def test_message_pages_and_bot_filter(backend: Storage) -> None:
+    seed = await _seed(backend)
+    everything = await backend.get_messages(limit=1000)
+    assert len(everything) == 6 * 3 + 3
+
+    first = await backend.get_messages(limit=5)
+    last = first[-1]
+    second = await backend.get_messages(limit=5, before=(last.created_ms, last.id))
+    assert [m.id for m in first + second] == [m.id for m in everything[:10]]
+
+    beta_only = await backend.get_messages(limit=1000, bot_id=seed["beta"].id)
+    assert beta_only and all(m.bot_id == seed["beta"].id for m in beta_only)
+
+
+async def test_iterators_resume_after_a_page_key(backend: Storage) -> None:
+    await _seed(backend)
+    messages = [m async for m in backend.iter_messages()]
+    assert [m.id for m in messages] == sorted(m.id for m in messages)
+    middle = messages[4]
+    resumed = [m.id async for m in backend.iter_messages(after=(middle.created_ms, middle.id))]
+    assert resumed == [m.id for m in messages[5:]]
+
+    conversations = [c.id async for c in backend.iter_conversations()]
+    assert conversations == sorted(conversations) and len(conversations) == 6
+
+
+async def test_conversations_per_bot(backend: Storage) -> None:
+    seed = await _seed(backend)
+    alpha, beta, convs = seed["alpha"], seed["beta"], seed["convs"]
+    newest_two = [convs[-1].id, convs[-2].id]
+
+    recent = await backend.get_recent_conversations_for_bots([alpha.id, beta.id, 999], per_bot=2)
+    assert {bot_id: [c.id for c in cs] for bot_id, cs in recent.items() if cs} == {
+        alpha.id: newest_two, beta.id: newest_two,
+    }
+    assert [c.id for c in await backend.get_bot_conversations(alpha.id, limit=2)] == newest_two
+    since = await backend.get_conversations_since(alpha.id, convs[3].id)
+    assert [c.id for c in since] == [convs[4].id, convs[5].id]
+
+
+async def test_messages_for_several_conversations_at_once(backend: Storage) -> None:
+    convs = (await _seed(backend))["convs"]
+    batch = await backend.get_messages_for_conversations([convs[0].id, convs[1].id, 999])
+    assert {conv_id: len(ms) for conv_id, ms in batch.items() if ms} == {convs[0].id: 3, convs[1].id: 4}
+    assert [m.id for m in batch[convs[1].id]] == [m.id for m in await backend.get_conversation_messages(convs[1].id)]
+
+
+async def test_pair_counts_are_unordered(backend: Storage) -> None:
+    seed = await _seed(backend)
+    alpha, beta = seed["alpha"].id, seed["beta"].id
+    await backend.increment_pair(alpha, beta)
+    assert await backend.get_pair_counts() == {(alpha, beta): 7}
+
+
+# ── Search ────────────────────────────────────────────────────────────
+
+async def test_search_filters(backend: Storage) -> None:
+    seed = await _seed(backend)
+    assert len(await backend.search_messages("coffee", limit=100)) == 6 * 3 + 3
+    humans = await backend.search_messages("coffee", author_type="human")
+    assert len(humans) == 3 and all(h.message.author_type == "human" for h in humans)
+    assert all("<mark>" in h.snippet for h in humans)
+    assert len(await backend.search_messages("coffee", bot_id=seed["beta"].id, limit=100)) == 6
+    assert len(await backend.search_messages("cof*", limit=100)) == 6 * 3 + 3
+    assert await backend.search_messages("coffee", since="2999-01-01") == []
+    assert len(await backend.search_messages("coffee", since="2000-01-01", until="2999-01-01", limit=100)) == 21
+
+    page = await backend.search_messages("coffee", limit=5, offset=5)
+    assert len(page) == 5
+    assert await backend.search_messages("tea") == []
+
+
+async def test_rebuilt_search_index_matches_the_incremental_one(backend: Storage) -> None:
+    await _seed(backend)
+    before = [h.message.id for h in await backend.search_messages("coffee", limit=100)]
+    await backend.rebuild_search_index()
+    assert sorted(h.message.id for h in await backend.search_messages("coffee", limit=100)) == sorted(before)
+
+
+# ── Stats ─────────────────────────────────────────────────────────────
+
+async def test_stats_are_kept_up_to_date_and_rebuild_to_the_same(backend: Storage) -> None:
+    seed = await _seed(backend)
+    alpha, beta = seed["alpha"].id, seed["beta"].id
+    stats = await backend.get_all_bot_stats()
+    assert stats[alpha] == {"messages": 12, "conversations": 6, "human_interactions": 3}
+    assert stats[beta] == {"messages": 6, "conversations": 6, "human_interactions": 3}
+    assert await backend.get_bot_stats(alpha) == stats[alpha]
+
+    await backend.rebuild_bot_stats()
+    assert await backend.get_all_bot_stats() == stats
+
+
+# ── Grading ───────────────────────────────────────────────────────────
+
+async def _grade(s: Storage, bot_id: int, run_id: str, overall: float, input_hash: str | None = None) -> Any:
+    return await s.create_grade(bot_id, run_id, 1, 2, 3, 4, overall, "ok", 10, 2, 1, input_hash=input_hash)
+
+
+async def test_grading_run_lifecycle(backend: Storage) -> None:
+    seed = await _seed(backend, conversations=1)
+    alpha, beta = seed["alpha"].id, seed["beta"].id
+
+    run = await backend.create_grading_run("r1", [alpha, beta], full_run=True, batch_mode=True)
+    assert (run.status, run.full_run, run.batch_mode, run.triggered_by) == ("queued", True, True, "manual")
+    assert (await backend.start_grading_run("r1")).status == "running"
+    await backend.set_grading_run_batch("r1", "batch-1")
+    assert (await backend.get_grading_run("r1")).batch_id == "batch-1"
+    assert [r.id for r in await backend.get_unfinished_grading_runs()] == ["r1"]
+
+    grade = await _grade(backend, alpha, "r1", 80, input_hash="h1")
+    await backend.fail_grading_bot("r1", beta, "timeout")
+    assert [(e.bot_id, e.status, e.grade_id, e.error) for e in await backend.get_grading_run_bots("r1")] == [
+        (alpha, "done", grade.id, None), (beta, "failed", None, "timeout"),
+    ]
+
+    finished = await backend.finish_grading_run("r1")
+    # bot_count counts the bots graded, not the ones that failed.
+    assert (finished.status, finished.bot_count, finished.finished_ms is not None) == ("finished", 1, True)
+    assert await backend.get_unfinished_grading_runs() == []
+    assert await backend.get_grading_run("missing") is None
+
+
+async def test_grades_of_failed_runs_do_not_count_as_latest(backend: Storage) -> None:
+    seed = await _seed(backend, conversations=1)
+    alpha, beta = seed["alpha"].id, seed["beta"].id
+    await backend.create_grading_run("r1", [alpha, beta])
+    await backend.start_grading_run("r1")
+    await _grade(backend, alpha, "r1", 80, input_hash="h1")
+    await _grade(backend, beta, "r1", 60)
+    await backend.finish_grading_run("r1")
+
+    await backend.create_grading_run("r2", [alpha])
+    await backend.start_grading_run("r2")
+    await _grade(backend, alpha, "r2", 10)
+    await backend.fail_grading_run("r2")
+
+    assert [(g.bot_id, g.grading_run_id) for g in await backend.get_latest_grades()] == [(alpha, "r1"), (beta, "r1")]
+    assert [(r.id, r.status) for r in await backend.get_grading_runs()] == [("r2", "failed"), ("r1", "finished")]
+    assert [g.grading_run_id for g in await backend.get_bot_grades(alpha)] == ["r2", "r1"]
+    assert sorted(g.bot_id for g in await backend.get_grades_by_run("r1")) == [alpha, beta]
+    assert list(await backend.get_grades_by_input_hash(["h1", "missing"])) == ["h1"]
+
+
+async def test_grade_pages(backend: Storage) -> None:
+    seed = await _seed(backend, conversations=1)
+    await backend.create_grading_run("r1", [seed["alpha"].id])
+    for overall in range(5):
+        await _grade(backend, seed["alpha"].id, "r1", overall)
+    first = await backend.get_grades(limit=3)
+    last = first[-1]
+    rest = await backend.get_grades(limit=3, before=(last.created_ms, last.id))
+    assert [g.overall_score for g in first + rest] == [4, 3, 2, 1, 0]
+    assert await backend.get_grades(bot_id=seed["beta"].id) == []
+
+
+# ── Bot memory ────────────────────────────────────────────────────────
+
+async def test_bot_memory_is_replaced_on_save(backend: Storage) -> None:
+    seed = await _seed(backend, conversations=2)
+    alpha, convs = seed["alpha"].id, seed["convs"]
+    assert await backend.get_bot_memory(alpha) is None
+    await backend.save_bot_memory(alpha, "likes coffee", convs[0].id)
+    await backend.save_bot_memory(alpha, "likes coffee, haggles", convs[1].id)
+    memory = await backend.get_bot_memory(alpha)
+    assert (memory.summary, memory.last_conversation_id) == ("likes coffee, haggles", convs[1].id)